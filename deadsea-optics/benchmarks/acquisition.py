@@ -0,0 +1,386 @@
+"""End-to-end acquisition benchmarks.
+
+Measures the throughput and latency of acquiring, calibrating, integrating and
+saving spectra, and of trigger round trips as handled by `usb2000zz.py`. By
+default, the benchmarks run against simulated devices without integration
+delays, which measures the overhead of the host code. Run
+
+    python benchmarks/acquisition.py run --output results.json
+
+and compare the results of two versions using
+
+    python benchmarks/acquisition.py compare before.json after.json
+
+Use `--hardware` to benchmark a connected device instead, or `--realtime` to
+simulate integration delays. For each benchmark, the number of frames per
+second, the median (p50) and 99th percentile (p99) latency per frame and the
+peak resident memory of the process so far are reported.
+"""
+
+import json
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from importlib.metadata import version
+from pathlib import Path
+from typing import Annotated, TypeVar
+
+import numpy as np
+import typer
+import usb.util
+from rich import print
+from rich.table import Table
+from scipy.io import savemat
+
+from deadsea_optics import export
+from deadsea_optics.cube import SpectralCubeWriter
+from deadsea_optics.simulation import SimulatedSpectrometer, simulate
+from deadsea_optics.spectroscopy import (
+    DeviceNotFoundError,
+    SpectroscopyExperiment,
+    SpectrumTimeOutError,
+)
+from deadsea_optics.trigger import TriggerClient, TriggerServer
+from deadsea_optics.usb2000 import OceanOpticsUSB2000
+from deadsea_optics.usb2000zz import OceanOpticsUSB2000zz
+
+app = typer.Typer()
+
+T = TypeVar("T")
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    device: str
+    frames: int
+    fps: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float | None
+
+
+def peak_rss_mb() -> float | None:
+    """Return the peak resident memory of the process in MiB, if available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def measure(name: str, device: str, frames: Iterator[object]) -> BenchmarkResult:
+    """Measure the latency of each step of an iterator.
+
+    Args:
+        name: the name of the benchmark.
+        device: the name of the device.
+        frames: an iterator which produces a frame for each step.
+
+    Returns:
+        The benchmark result.
+    """
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        try:
+            next(frames)
+        except StopIteration:
+            break
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    if not latencies:
+        raise RuntimeError(f"Benchmark {name} did not produce any frames.")
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+    return BenchmarkResult(
+        name=name,
+        device=device,
+        frames=len(latencies),
+        fps=len(latencies) / total,
+        p50_ms=float(p50),
+        p99_ms=float(p99),
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def repeat(func: Callable[[], object], count: int) -> Iterator[object]:
+    """Call a function repeatedly, yielding each result."""
+    for _ in range(count):
+        yield func()
+
+
+def skip_timeouts(func: Callable[[], T]) -> Callable[[], T]:
+    """Retry a function until it does not time out."""
+
+    def wrapper() -> T:
+        while True:
+            try:
+                return func()
+            except SpectrumTimeOutError:
+                continue
+
+    return wrapper
+
+
+def benchmark_device(
+    experiment: SpectroscopyExperiment, device: str, frames: int, counts: list[int]
+) -> list[BenchmarkResult]:
+    """Benchmark acquisition, calibration and integration."""
+    dev = experiment.device
+    results = [
+        measure(
+            "get_raw_spectrum",
+            device,
+            repeat(skip_timeouts(dev.get_raw_spectrum), frames),
+        ),
+        measure(
+            "get_spectrum", device, repeat(skip_timeouts(dev.get_spectrum), frames)
+        ),
+    ]
+    raw = skip_timeouts(dev.get_raw_spectrum)()
+    results.append(
+        measure("calibrate", device, repeat(lambda: dev.calibrate(raw), frames))
+    )
+    for count in counts:
+        results.append(
+            measure(
+                f"integrate_spectrum[{count}]",
+                device,
+                experiment.integrate_spectrum(count),
+            )
+        )
+    return results
+
+
+def benchmark_writers(
+    experiment: SpectroscopyExperiment, device: str, frames: int, directory: Path
+) -> list[BenchmarkResult]:
+    """Benchmark saving spectra in the supported file formats."""
+    dev = experiment.device
+    wavelengths, intensities = dev.get_spectrum()
+    raw = dev.get_raw_spectrum().copy()
+
+    def write_csv() -> Iterator[None]:
+        for idx in range(frames):
+            export.save_spectrum(
+                directory / f"spectrum_{idx}.csv", wavelengths, intensities
+            )
+            yield None
+
+    def write_npy() -> Iterator[None]:
+        for idx in range(frames):
+            export.save_spectrum(
+                directory / f"spectrum_{idx}.npy", wavelengths, intensities
+            )
+            yield None
+
+    def write_series_csv() -> Iterator[None]:
+        # a series of `frames` spectra, exported as a matrix in one pass
+        spectra = np.tile(intensities, (frames, 1))
+        export.save_series(directory / "series.csv", wavelengths, spectra)
+        yield None
+
+    def write_mat() -> Iterator[None]:
+        for idx in range(frames):
+            savemat(
+                directory / f"spectrum_{idx}.mat",
+                {
+                    "wavelength": wavelengths,
+                    "spectrum": intensities,
+                    "spectrum_cum": intensities,
+                },
+            )
+            yield None
+
+    def write_cube() -> Iterator[None]:
+        pixels = np.arange(len(raw), dtype=np.float64)
+        with SpectralCubeWriter(directory / "spectra.h5", pixels) as cube:
+            for idx in range(frames):
+                cube.append(raw, idx, time.time(), 1000)
+                yield None
+
+    return [
+        measure("write_csv", device, write_csv()),
+        measure("write_npy", device, write_npy()),
+        measure("write_series_csv", device, write_series_csv()),
+        measure("write_mat", device, write_mat()),
+        measure("write_cube", device, write_cube()),
+    ]
+
+
+def benchmark_trigger(
+    dev: OceanOpticsUSB2000zz, device: str, frames: int, directory: Path
+) -> BenchmarkResult:
+    """Benchmark trigger round trips of the `usb2000zz.py` acquisition loop.
+
+    The loop acquires a spectrum for each trigger, acknowledges it and hands
+    it to a cube writer, like the loop in `usb2000zz.py`.
+    """
+    x, _ = dev.get_spectrum()
+    stop = threading.Event()
+
+    with (
+        TriggerServer(port=0) as server,
+        SpectralCubeWriter(directory / "triggers.h5", x) as cube,
+    ):
+
+        def acquisition_loop() -> None:
+            while not stop.is_set():
+                request = server.get_request(timeout=0.05)
+                if request is None:
+                    continue
+                _, data = dev.get_spectrum()
+                timestamp = time.time()
+                request.acknowledge(request.argument or 0, timestamp)
+                cube.append(data.astype(np.uint16), request.argument or 0, timestamp, 0)
+
+        thread = threading.Thread(target=acquisition_loop, daemon=True)
+        thread.start()
+        try:
+            with TriggerClient(*server.address) as client:
+                client.ping()
+                result = measure(
+                    "usb2000zz_trigger",
+                    device,
+                    (client.trigger(idx) for idx in range(frames)),
+                )
+        finally:
+            stop.set()
+            thread.join()
+    return result
+
+
+def print_results(results: list[BenchmarkResult]) -> None:
+    table = Table(
+        "Benchmark", "Device", "Frames", "Frames/s", "p50 (ms)", "p99 (ms)", "RSS (MiB)"
+    )
+    for result in results:
+        table.add_row(
+            result.name,
+            result.device,
+            str(result.frames),
+            f"{result.fps:.1f}",
+            f"{result.p50_ms:.3f}",
+            f"{result.p99_ms:.3f}",
+            "-" if result.peak_rss_mb is None else f"{result.peak_rss_mb:.1f}",
+        )
+    print(table)
+
+
+@app.command()
+def run(
+    output: Annotated[
+        Path | None,
+        typer.Option("--output", "-o", help="Write the results to a JSON file."),
+    ] = None,
+    hardware: Annotated[
+        bool,
+        typer.Option(
+            "--hardware", help="Benchmark a connected device instead of simulations."
+        ),
+    ] = False,
+    realtime: Annotated[
+        bool, typer.Option(help="Simulate integration delays.")
+    ] = False,
+    int_time: Annotated[
+        int, typer.Option(help="Integration time in microseconds.")
+    ] = 1_000,
+    frames: Annotated[
+        int, typer.Option(help="Number of frames for each benchmark.")
+    ] = 1_000,
+    counts: Annotated[
+        list[int] | None,
+        typer.Option(
+            "--count", help="Integration counts. Defaults to 10, 1000 and 100000."
+        ),
+    ] = None,
+) -> None:
+    """Run all benchmarks."""
+    counts = counts or [10, 1_000, 100_000]
+    results: list[BenchmarkResult] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        if hardware:
+            try:
+                experiment = SpectroscopyExperiment()
+            except DeviceNotFoundError:
+                print("[red]No compatible device found.")
+                raise typer.Abort()
+            experiment.set_integration_time(int_time)
+            device = type(experiment.device).__name__
+            results += benchmark_device(experiment, device, frames, counts)
+            results += benchmark_writers(experiment, device, frames, directory)
+            if isinstance(experiment.device, OceanOpticsUSB2000):
+                usb.util.dispose_resources(experiment.device.device)
+                dev = OceanOpticsUSB2000zz()
+                dev.set_integration_time(int_time)
+                results.append(benchmark_trigger(dev, device, frames, directory))
+        else:
+            for model in "USB2000+", "USB2000":
+                device = f"simulated {model}"
+                simulated = SimulatedSpectrometer(model, realtime=realtime, seed=0)
+                with simulate(simulated):
+                    experiment = SpectroscopyExperiment()
+                    experiment.set_integration_time(int_time)
+                    results += benchmark_device(experiment, device, frames, counts)
+                    if model == "USB2000+":
+                        results += benchmark_writers(
+                            experiment, device, frames, directory
+                        )
+                    else:
+                        dev = OceanOpticsUSB2000zz()
+                        dev.set_integration_time(int_time)
+                        results.append(
+                            benchmark_trigger(dev, device, frames, directory)
+                        )
+
+    print_results(results)
+    if output is not None:
+        report = {
+            "version": version("deadsea-optics"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "hardware": hardware,
+            "realtime": realtime,
+            "integration_time": int_time,
+            "results": [asdict(result) for result in results],
+        }
+        output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to [bold]{output}[/] successfully.")
+
+
+@app.command()
+def compare(
+    before: Annotated[Path, typer.Argument(help="JSON results of the baseline.")],
+    after: Annotated[Path, typer.Argument(help="JSON results to compare.")],
+) -> None:
+    """Compare the frames per second of two benchmark runs."""
+    baseline = {
+        (result["name"], result["device"]): result
+        for result in json.loads(before.read_text())["results"]
+    }
+    table = Table("Benchmark", "Device", "Frames/s before", "Frames/s after", "Speedup")
+    for result in json.loads(after.read_text())["results"]:
+        key = result["name"], result["device"]
+        if key not in baseline:
+            continue
+        fps_before = baseline[key]["fps"]
+        table.add_row(
+            *key,
+            f"{fps_before:.1f}",
+            f"{result['fps']:.1f}",
+            f"{result['fps'] / fps_before:.2f}x",
+        )
+    print(table)
+
+
+if __name__ == "__main__":
+    app()
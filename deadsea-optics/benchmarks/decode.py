@@ -0,0 +1,124 @@
+"""Micro-benchmark for decoding USB2000 spectrum packets.
+
+Packet captures are binary files containing one or more complete spectrum
+transfers, exactly as read from the spectrum endpoint: 64 interleaved packets of
+64 bytes, followed by the 0x69 sync byte. Record a capture from a connected
+device using
+
+    python benchmarks/decode.py record captures.bin --count 100
+
+and measure the decode time per spectrum using
+
+    python benchmarks/decode.py run captures.bin
+
+If no capture file is given, random packet data is used instead.
+"""
+
+import timeit
+from pathlib import Path
+from typing import Annotated
+
+import numpy as np
+import typer
+from numpy.typing import NDArray
+from rich import print
+from rich.table import Table
+
+from deadsea_optics.usb2000 import NUM_PIXELS, PACKET_SIZE, deinterleave_packets
+
+TRANSFER_SIZE = NUM_PIXELS * 2 + 1
+
+app = typer.Typer()
+
+
+def legacy_decode(data: bytes) -> NDArray[np.uint16]:
+    """Decode packets using the original per-pixel loop, for comparison."""
+    packets = [
+        data[idx : idx + PACKET_SIZE] for idx in range(0, len(data), PACKET_SIZE)
+    ]
+    pixels = []
+    for lsb_packet, msb_packet in zip(packets[0::2], packets[1::2]):
+        for lsb, msb in zip(lsb_packet, msb_packet):
+            pixels.append(bytes((lsb, msb)))
+    return np.frombuffer(b"".join(pixels[:-1]), dtype=np.uint16)
+
+
+def load_captures(path: Path | None, count: int) -> list[bytes]:
+    """Load spectrum transfers from a capture file, or generate random ones."""
+    if path is None:
+        rng = np.random.default_rng(0)
+        return [
+            rng.integers(0, 256, TRANSFER_SIZE - 1, dtype=np.uint8).tobytes() + b"\x69"
+            for _ in range(count)
+        ]
+    data = path.read_bytes()
+    captures = [
+        data[idx : idx + TRANSFER_SIZE]
+        for idx in range(0, len(data) - TRANSFER_SIZE + 1, TRANSFER_SIZE)
+    ]
+    for capture in captures:
+        if capture[-1] != 0x69:
+            raise typer.BadParameter(f"{path} contains an invalid capture.")
+    return captures
+
+
+@app.command()
+def run(
+    captures: Annotated[
+        Path | None, typer.Argument(help="Binary file with packet captures.")
+    ] = None,
+    count: Annotated[
+        int, typer.Option(help="Number of random spectra if no captures are given.")
+    ] = 100,
+    repeat: Annotated[int, typer.Option(help="Number of timing runs.")] = 5,
+) -> None:
+    """Measure the time it takes to decode a spectrum."""
+    transfers = [capture[:-1] for capture in load_captures(captures, count)]
+    out = np.zeros(NUM_PIXELS, dtype="<u2")
+
+    for transfer in transfers:
+        expected = legacy_decode(transfer)
+        assert np.array_equal(deinterleave_packets(transfer, out=out)[:-1], expected)
+
+    table = Table("Decoder", "Time per spectrum (µs)")
+    for name, decode in [
+        ("legacy loop", lambda: [legacy_decode(t) for t in transfers]),
+        ("vectorized", lambda: [deinterleave_packets(t, out=out) for t in transfers]),
+    ]:
+        timings = timeit.repeat(decode, number=1, repeat=repeat)
+        table.add_row(name, f"{min(timings) / len(transfers) * 1e6:.1f}")
+    print(f"Decoded {len(transfers)} spectra.")
+    print(table)
+
+
+@app.command()
+def record(
+    output: Annotated[Path, typer.Argument(help="Binary file to write captures to.")],
+    count: Annotated[int, typer.Option(help="Number of spectra to record.")] = 100,
+    int_time: Annotated[
+        int, typer.Option(help="Integration time in microseconds.")
+    ] = 10_000,
+) -> None:
+    """Record packet captures from a connected USB2000."""
+    from deadsea_optics.usb2000 import OceanOpticsUSB2000
+
+    dev = OceanOpticsUSB2000()
+    dev.set_integration_time(int_time)
+    timeout = int_time // 1_000 + 100
+    with output.open("wb") as f:
+        for _ in range(count):
+            dev.device.write(dev._ENDPOINT_OUT, b"\x09")
+            for _ in range(2 * NUM_PIXELS // PACKET_SIZE):
+                f.write(
+                    dev.device.read(
+                        dev._ENDPOINT_IN_SPECTRUM, PACKET_SIZE, timeout
+                    ).tobytes()
+                )
+                timeout = 100
+            f.write(dev.device.read(dev._ENDPOINT_IN_SPECTRUM, 1, 100).tobytes())
+            timeout = int_time // 1_000 + 100
+    print(f"Captures written to [bold]{output}[/] successfully.")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,3 +1,21 @@
+from typing import TYPE_CHECKING
+
 from deadsea_optics.spectroscopy import DeviceNotFoundError, SpectroscopyExperiment
 
-__all__ = ["SpectroscopyExperiment", "DeviceNotFoundError"]
+if TYPE_CHECKING:
+    from deadsea_optics.async_spectroscopy import AsyncSpectroscopyExperiment
+
+__all__ = [
+    "AsyncSpectroscopyExperiment",
+    "SpectroscopyExperiment",
+    "DeviceNotFoundError",
+]
+
+
+def __getattr__(name: str) -> object:
+    # asyncio is only imported when the asyncio interface is used
+    if name == "AsyncSpectroscopyExperiment":
+        from deadsea_optics.async_spectroscopy import AsyncSpectroscopyExperiment
+
+        return AsyncSpectroscopyExperiment
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,156 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from types import TracebackType
+from typing import Self, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+
+from deadsea_optics.spectroscopy import SpectroscopyExperiment, SpectrumTimeOutError
+
+__all__ = ["AsyncSpectroscopyExperiment"]
+
+T = TypeVar("T")
+
+
+class AsyncSpectroscopyExperiment:
+    """Spectroscopy experiment with an asyncio interface.
+
+    All blocking device calls run on a single executor thread which is
+    dedicated to the device, so USB access is serialized while the event loop
+    remains free to handle other tasks, like trigger servers or file writers.
+
+    Use `open()` to connect to a device without blocking the event loop. The
+    experiment can be used as an async context manager, which shuts down the
+    executor thread on exit. Iterating over the experiment using `async for`
+    yields spectra continuously.
+    """
+
+    def __init__(
+        self,
+        experiment: SpectroscopyExperiment,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> None:
+        """Wrap an already opened experiment.
+
+        Args:
+            experiment: the experiment. It should not be used directly while it
+                is wrapped.
+            executor: the single-threaded executor for the device. If not
+                given, a new one is created.
+        """
+        self.experiment = experiment
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="spectrometer"
+            )
+        self._executor = executor
+
+    @classmethod
+    async def open(cls, bulk_read: bool = False) -> Self:
+        """Open the first available spectroscopy device.
+
+        Args:
+            bulk_read: if True, read each spectrum in a single transfer into a
+                preallocated buffer.
+
+        Returns:
+            The experiment.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spectrometer")
+        try:
+            experiment = await loop.run_in_executor(
+                executor, lambda: SpectroscopyExperiment(bulk_read=bulk_read)
+            )
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        return cls(experiment, executor=executor)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        # wait for pending calls in a separate thread, so that the event loop
+        # is not blocked
+        await asyncio.to_thread(self.close)
+
+    def close(self) -> None:
+        """Shut down the executor thread, after pending calls have finished."""
+        self._executor.shutdown(wait=True)
+
+    @property
+    def has_overflow(self) -> bool:
+        """Whether the most recent spectrum was overexposed."""
+        return self.experiment.has_overflow
+
+    async def _run(self, func: Callable[..., T], *args: object) -> T:
+        """Run a blocking call on the device executor thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def set_integration_time(self, integration_time: int) -> None:
+        """Set device integration time.
+
+        Args:
+            integration_time: The desired integration time in microseconds.
+        """
+        await self._run(self.experiment.set_integration_time, integration_time)
+
+    async def get_spectrum(
+        self,
+    ) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+        """Record a spectrum.
+
+        Returns:
+            A tuple of `np.ndarrays` with wavelength, intensity data, like
+            `SpectroscopyExperiment.get_spectrum()`.
+        """
+        return await self._run(self.experiment.get_spectrum)
+
+    async def integrate_spectrum(
+        self, count: int, track_variance: bool = False
+    ) -> AsyncIterator[tuple[NDArray[np.floating], NDArray[np.floating]]]:
+        """Record a spectrum by integrating over multiple measurements.
+
+        This is an async iterator which yields the integrated spectrum after
+        each measurement, like `SpectroscopyExperiment.integrate_spectrum()`.
+        Stop iterating to stop the measurement.
+
+        Args:
+            count: The number of measurements to perform.
+            track_variance: If True, also keep track of the per-pixel mean and
+                variance in the accumulator of the wrapped experiment.
+
+        Yields:
+            A tuple of `np.ndarrays` with wavelength, intensity data.
+        """
+        iterator = self.experiment.integrate_spectrum(count, track_variance)
+        try:
+            while (spectrum := await self._run(next, iterator, None)) is not None:
+                yield spectrum
+        finally:
+            await self._run(iterator.close)
+
+    async def __aiter__(
+        self,
+    ) -> AsyncIterator[tuple[NDArray[np.floating], NDArray[np.floating]]]:
+        """Record spectra continuously.
+
+        Spectra which time out are skipped.
+
+        Yields:
+            A tuple of `np.ndarrays` with wavelength, intensity data.
+        """
+        while True:
+            try:
+                yield await self.get_spectrum()
+            except SpectrumTimeOutError:
+                continue
@@ -1,16 +1,16 @@
-import csv
-from typing import Annotated, TextIO
+import sys
+import time
+from pathlib import Path
+from typing import Annotated
 
-import matplotlib.pyplot as plt
 import numpy as np
-import plotext
 import typer
 from numpy.typing import NDArray
 from rich import print
-from rich.progress import track
-from rich.table import Table
 
-import deadsea_optics.gui
+import deadsea_optics.simulation
+from deadsea_optics import export
+from deadsea_optics.instrumentation import instrumentation
 from deadsea_optics.spectroscopy import (
     AccessError,
     DeviceNotFoundError,
@@ -19,11 +19,59 @@ from deadsea_optics.spectroscopy import (
 
 app = typer.Typer()
 
+# output path which writes CSV to standard output
+STDOUT = Path("-")
+
+
+def check_output_format(path: Path | None) -> Path | None:
+    """Check the format of an output file before taking any data."""
+    if path is not None and path != STDOUT:
+        try:
+            export.check_format(path)
+        except (ValueError, ImportError) as exc:
+            raise typer.BadParameter(str(exc))
+    return path
+
+
+def check_series_format(path: Path) -> Path:
+    """Check the format of a series before taking any data.
+
+    Unlike single spectra, a series can also be written to an HDF5 cube, and
+    files with other extensions are written as CSV.
+    """
+    if path.suffix.lower() in export.FORMATS:
+        check_output_format(path)
+    return path
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    simulate: Annotated[
+        bool,
+        typer.Option(
+            help="Use a simulated USB2000+ instead of a connected device.",
+            envvar="DEADSEA_OPTICS_SIMULATE",
+        ),
+    ] = False,
+) -> None:
+    """Spectroscopy using the Ocean Optics USB2000(+) spectrometer."""
+    if simulate:
+        ctx.with_resource(deadsea_optics.simulation.simulate())
+
 
 @app.command()
-def check() -> None:
+def check(
+    refresh: Annotated[
+        bool,
+        typer.Option(
+            "--refresh",
+            help="Query the full device configuration and update the cache.",
+        ),
+    ] = False,
+) -> None:
     """Check if a compatible device can be found."""
-    open_experiment()
+    open_experiment(use_cache=not refresh)
     print("[green]Device is connected and available.")
 
 
@@ -56,8 +104,15 @@ def spectrum(
         typer.Option(help="Restrict wavelengths to (min, max)."),
     ] = None,
     output: Annotated[
-        typer.FileTextWrite | None,
-        typer.Option("--output", "-o", help="Write the results to a CSV file."),
+        Path | None,
+        typer.Option(
+            "--output",
+            "-o",
+            help="""Write the results to a file. The extension selects the
+                 format: .csv, .npy, .npz or .parquet. Use - to write CSV to
+                 standard output.""",
+            callback=check_output_format,
+        ),
     ] = None,
     quiet: Annotated[
         bool, typer.Option("--quiet", "-q", help="Don't show any console output.")
@@ -83,6 +138,8 @@ def spectrum(
     if not quiet:
         if graph:
             if gui:
+                import matplotlib.pyplot as plt
+
                 if scatter:
                     plt.scatter(wavelengths, intensities, marker=".")
                 else:
@@ -92,6 +149,8 @@ def spectrum(
                 plt.ylabel("Intensity")
                 plt.show()
             else:
+                import plotext
+
                 plotext.theme("clear")
                 if scatter:
                     plotext.scatter(wavelengths, intensities, marker="braille")
@@ -103,6 +162,8 @@ def spectrum(
                 plotext.ylabel("Intensity")
                 plotext.show()
         else:
+            from rich.table import Table
+
             rich_table = Table("Wavelength (nm)", "Intensity")
             for wavelength, intensity in zip(wavelengths, intensities):
                 rich_table.add_row(f"{wavelength:.1f}", f"{intensity:.1f}")
@@ -142,8 +203,15 @@ def integrate(
         typer.Option(help="Restrict wavelengths to (min, max)."),
     ] = None,
     output: Annotated[
-        typer.FileTextWrite | None,
-        typer.Option("--output", "-o", help="Write the results to a CSV file."),
+        Path | None,
+        typer.Option(
+            "--output",
+            "-o",
+            help="""Write the results to a file. The extension selects the
+                 format: .csv, .npy, .npz or .parquet. Use - to write CSV to
+                 standard output.""",
+            callback=check_output_format,
+        ),
     ] = None,
 ) -> None:
     """Record a spectrum by integrating over multiple measurements.
@@ -153,6 +221,9 @@ def integrate(
     results are displayed in a graph in the terminal. There are various options
     for other forms of output. The unit of intensity is arbitrary.
     """
+    import plotext
+    from rich.progress import track
+
     experiment = open_experiment()
     experiment.set_integration_time(int_time)
 
@@ -182,17 +253,362 @@ def integrate(
         save_spectrum(output, wavelengths, intensities)
 
 
+@app.command()
+def record(
+    output: Annotated[
+        Path, typer.Argument(help="Path of the raw spectrum log to write.")
+    ],
+    count: Annotated[
+        int,
+        typer.Option(
+            "--count",
+            "-c",
+            help="Number of spectra to record. Use 0 to record until interrupted.",
+        ),
+    ] = 0,
+    int_time: Annotated[
+        int,
+        typer.Option(
+            "--int-time",
+            "-t",
+            help="Set the integration time of the device in microseconds.",
+        ),
+    ] = 100_000,
+) -> None:
+    """Record raw spectra continuously to a log file.
+
+    All raw spectra are appended to a flat binary log as fast as the device
+    delivers them, until the requested number of spectra is recorded or the
+    recording is interrupted using Ctrl-C. The log can be read using
+    `deadsea_optics.rawlog.RawLog`.
+    """
+    from rich.progress import Progress
+
+    experiment = open_experiment()
+    experiment.set_integration_time(int_time)
+
+    recorded = 0
+    recording = experiment.record(output, count=count or None)
+    try:
+        with Progress() as progress:
+            task = progress.add_task("Recording...", total=count or None)
+            for recorded in recording:
+                progress.update(task, completed=recorded)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recording.close()
+    print(f"Recorded {recorded} spectra to [bold]{output}[/].")
+
+
+@app.command()
+def series(
+    output: Annotated[
+        Path,
+        typer.Argument(
+            help="""Path of the output file. Spectra are written as rows of a CSV
+                 file, appended to an HDF5 cube if the extension is .h5, or
+                 exported as a matrix to a .npy, .npz or .parquet file.""",
+            callback=check_series_format,
+        ),
+    ],
+    count: Annotated[
+        int,
+        typer.Option(
+            "--count",
+            "-c",
+            min=1,
+            help="Number of spectra for each integration time.",
+        ),
+    ] = 1,
+    interval: Annotated[
+        float,
+        typer.Option(
+            "--interval",
+            "-i",
+            help="Time between the starts of measurements in seconds.",
+        ),
+    ] = 0.0,
+    int_times: Annotated[
+        list[int] | None,
+        typer.Option(
+            "--int-time",
+            "-t",
+            help="""Integration time of the device in microseconds. Repeat the
+                 option to measure multiple integration times in turn.""",
+        ),
+    ] = None,
+) -> None:
+    """Record a series of spectra into a single file.
+
+    The device is opened once, after which COUNT spectra are taken for each
+    integration time, at a fixed interval. Each spectrum is written to the output
+    file as soon as it is taken, together with its index, timestamp and
+    integration time.
+    """
+    from rich.progress import track
+
+    int_times = int_times or [100_000]
+    experiment = open_experiment()
+    device = experiment.device
+
+    measurements = [int_time for int_time in int_times for _ in range(count)]
+    writer = export.SeriesWriter(
+        output,
+        device._wavelengths[device._NUM_DARK_PIXELS :],
+        device._intensity_scale,
+    )
+    start = time.monotonic()
+    try:
+        for index, int_time in enumerate(
+            track(measurements, description="Taking data...")
+        ):
+            if interval and (delay := start + index * interval - time.monotonic()) > 0:
+                time.sleep(delay)
+            if int_time != device.get_integration_time():
+                experiment.set_integration_time(int_time)
+            raw = device.get_raw_spectrum()
+            timestamp = time.time()
+            _, intensities = experiment.calibrate(raw)
+            writer.append(
+                index,
+                timestamp,
+                int_time,
+                raw[-len(intensities) :],
+                intensities,
+                experiment.has_overflow,
+            )
+    finally:
+        writer.close()
+    print(f"Data written to [bold]{output}[/] successfully.")
+
+
+@app.command()
+def stats(
+    count: Annotated[
+        int, typer.Option("--count", "-c", help="Number of spectra to acquire.")
+    ] = 100,
+    int_time: Annotated[
+        int,
+        typer.Option(
+            "--int-time",
+            "-t",
+            help="Set the integration time of the device in microseconds.",
+        ),
+    ] = 100_000,
+    bulk_read: Annotated[
+        bool, typer.Option(help="Read each spectrum in a single transfer.")
+    ] = False,
+) -> None:
+    """Show how long each stage of acquiring a spectrum takes.
+
+    Spectra are acquired and calibrated repeatedly while the duration of each
+    stage, like writing the USB command, waiting for the first packet, reading
+    the rest of the spectrum, decoding and calibration, is recorded. The
+    statistics of each stage are shown in a table, in milliseconds.
+    """
+    from rich.progress import track
+    from rich.table import Table
+
+    experiment = open_experiment(bulk_read=bulk_read)
+    experiment.set_integration_time(int_time)
+
+    instrumentation.enable()
+    for _ in track(range(count), description="Taking data..."):
+        experiment.get_spectrum()
+    instrumentation.disable()
+
+    table = Table("Stage", "Count", "Mean", "p50", "p99", "Max")
+    for stage in instrumentation.statistics():
+        table.add_row(
+            stage.stage,
+            str(stage.count),
+            *(
+                f"{value * 1e3:.3f}"
+                for value in (stage.mean, stage.p50, stage.p99, stage.max)
+            ),
+        )
+    print(table)
+
+
+@app.command()
+def reconstruct(
+    directory: Annotated[
+        Path,
+        typer.Argument(
+            help="Directory with the camera images (solar_<n>.png) of the scan."
+        ),
+    ],
+    output: Annotated[
+        Path,
+        typer.Option(
+            "--output",
+            "-o",
+            help="""Path of the .npz file to write the wavelengths, the (y, x,
+                 wavelength) image and the offsets to.""",
+        ),
+    ] = Path("reconstruction.npz"),
+    spectra: Annotated[
+        Path | None,
+        typer.Option(
+            "--spectra",
+            "-s",
+            help="""Cube file, directory of spectrum_<n>.mat files or raw
+                 spectrum log with the spectra. Defaults to spectra.h5 in the
+                 image directory, or the .mat files in that directory.""",
+        ),
+    ] = None,
+    count: Annotated[
+        int | None,
+        typer.Option(
+            "--count",
+            "-c",
+            help="Number of frames. Defaults to the number of images.",
+        ),
+    ] = None,
+    reference: Annotated[int, typer.Option(help="Number of the reference image.")] = 0,
+    num_pixels: Annotated[
+        int, typer.Option(help="Size of the reconstructed image in pixels.")
+    ] = 63,
+    binning: Annotated[
+        int,
+        typer.Option(help="Size of a reconstructed pixel in camera pixels."),
+    ] = 4,
+    roi: Annotated[
+        tuple[int, int, int, int] | None,
+        typer.Option(
+            metavar="Y0 Y1 X0 X1",
+            help="Region of interest of the camera images used for registration.",
+        ),
+    ] = None,
+    downsample: Annotated[
+        int,
+        typer.Option(
+            min=1, help="Downsample the camera images by this factor to register them."
+        ),
+    ] = 1,
+    subpixel: Annotated[
+        bool, typer.Option(help="Register the camera images with sub-pixel precision.")
+    ] = True,
+    batch_size: Annotated[
+        int,
+        typer.Option(
+            min=1, help="Number of camera images each worker registers at once."
+        ),
+    ] = 8,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            "--workers",
+            "-j",
+            min=1,
+            help="""Number of threads reading and registering camera images.
+                 Defaults to the number of CPUs.""",
+        ),
+    ] = None,
+    method: Annotated[
+        str,
+        typer.Option(
+            "--method",
+            "-m",
+            help="""Back-project the spectra (backproject), or solve for the
+                 image using a direct Tikhonov solve (tikhonov), CGLS (cgls),
+                 total variation regularization (tv) or non-negative least
+                 squares (nnls).""",
+        ),
+    ] = "backproject",
+    regularization: Annotated[
+        float | None,
+        typer.Option(
+            min=0.0,
+            help="""Regularization weight of the solver, relative to the
+                 largest eigenvalue of AᵀA.""",
+        ),
+    ] = None,
+    max_iterations: Annotated[
+        int | None,
+        typer.Option(min=1, help="Maximum number of iterations of the solver."),
+    ] = None,
+    initial: Annotated[
+        Path | None,
+        typer.Option(
+            help="""Reconstruction (.npz) to start the iterative solvers from.
+                 Defaults to the normalized back-projection.""",
+        ),
+    ] = None,
+) -> None:
+    """Reconstruct a hyperspectral image from a mosaic scan.
+
+    The camera images are registered against the reference image to find the
+    fiber position of each frame, from which the sparse system matrix is
+    built. The spectra are back-projected onto the image grid, or the image is
+    solved for using a regularized solver.
+    """
+    # SciPy and Pillow take a while to load, so only import them when needed
+    from deadsea_optics.reconstruct import METHODS, SystemModel
+    from deadsea_optics.reconstruct import reconstruct as reconstruct_scan
+
+    if method not in METHODS:
+        raise typer.BadParameter(
+            f"use one of {', '.join(METHODS)}.", param_hint="'--method'"
+        )
+    solver_options: dict[str, float | int] = {}
+    if regularization is not None:
+        solver_options["regularization"] = regularization
+    if max_iterations is not None:
+        solver_options["max_iterations"] = max_iterations
+
+    start = time.perf_counter()
+    try:
+        initial_image = np.load(initial)["image"] if initial is not None else None
+        result = reconstruct_scan(
+            directory,
+            spectra=spectra,
+            count=count,
+            reference=reference,
+            model=SystemModel(num_pixels=num_pixels, binning=binning),
+            roi=roi,
+            downsample=downsample,
+            subpixel=subpixel,
+            batch_size=batch_size,
+            workers=workers,
+            method=method,
+            initial=initial_image,
+            solver_options=solver_options,
+        )
+    except (FileNotFoundError, ValueError) as exc:
+        print(f"[red]{exc}")
+        raise typer.Abort()
+    result.save(output)
+    ny, nx, nwavelengths = result.image.shape
+    print(
+        f"Reconstructed a {ny}x{nx}x{nwavelengths} image from"
+        f" {len(result.offsets)} frames in {time.perf_counter() - start:.1f} s"
+        + (f" ({result.iterations} iterations)." if result.iterations else ".")
+    )
+    print(f"Data written to [bold]{output}[/] successfully.")
+
+
 @app.command()
 def gui() -> None:
     """Run the GUI spectroscopy application."""
+    # Qt and PyQtGraph take a while to load, so only import them when needed
+    import deadsea_optics.gui
+
     deadsea_optics.gui.main()
 
 
-def open_experiment() -> SpectroscopyExperiment:
+def open_experiment(
+    bulk_read: bool = False, use_cache: bool = True
+) -> SpectroscopyExperiment:
     """Open the spectroscopy experiment.
 
     Connect to an available spectropy device.
 
+    Args:
+        bulk_read: read each spectrum in a single transfer.
+        use_cache: use the cached device configuration, if available.
+
     Raises:
         typer.Abort: An error occured opening the experiment.
 
@@ -200,7 +616,7 @@ def open_experiment() -> SpectroscopyExperiment:
         An `deadsea_optics.Spectroscopy` instance.
     """
     try:
-        experiment = SpectroscopyExperiment()
+        experiment = SpectroscopyExperiment(bulk_read=bulk_read, use_cache=use_cache)
     except DeviceNotFoundError:
         print("[red]No compatible device found.")
         raise typer.Abort()
@@ -211,20 +627,28 @@ def open_experiment() -> SpectroscopyExperiment:
 
 
 def save_spectrum(
-    file: TextIO, wavelengths: NDArray[np.floating], intensities: NDArray[np.floating]
+    path: Path, wavelengths: NDArray[np.floating], intensities: NDArray[np.floating]
 ) -> None:
-    """Save spectrum data to a file as CSV.
+    """Save spectrum data to a file.
 
     Args:
-        path: The path of the output file.
+        path: The path of the output file. The extension selects the format.
+            If the path is -, CSV is written to standard output.
         wavelengths: The wavelength values.
         intensities: The intensity data.
+
+    Raises:
+        typer.Abort: An error occured saving the data.
     """
-    writer = csv.writer(file)
-    writer.writerow(["Wavelength (nm)", "Intensity"])
-    for wavelength, intensity in zip(wavelengths, intensities):
-        writer.writerow([wavelength, intensity])
-    print(f"Data written to [bold]{file.name}[/] successfully.")
+    if path == STDOUT:
+        export.write_spectrum(sys.stdout, wavelengths, intensities)
+        return
+    try:
+        export.save_spectrum(path, wavelengths, intensities)
+    except ImportError as exc:
+        print(f"[red]{exc}")
+        raise typer.Abort()
+    print(f"Data written to [bold]{path}[/] successfully.")
 
 
 if __name__ == "__main__":
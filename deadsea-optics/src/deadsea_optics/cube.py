@@ -0,0 +1,222 @@
+"""Appendable, chunked and compressed storage of raw spectra in HDF5 files.
+
+A cube file contains the following datasets:
+
+- `wavelength`: the wavelength axis in nanometers, stored once.
+- `raw`: the raw spectra as a (frames, pixels) array of unsigned 16-bit
+  integers. Multiply by the `scale` attribute of the file to obtain calibrated
+  intensities.
+- `metadata`: one record per frame with the frame index, the acquisition
+  timestamp in seconds since the epoch, the integration time in microseconds
+  and whether the spectrum was overexposed.
+
+Both frame datasets are chunked along the frame axis and compressed, and can
+be sliced without loading the whole file.
+"""
+
+from os import PathLike
+from types import TracebackType
+from typing import Self
+
+import h5py
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+__all__ = ["FRAME_METADATA", "SpectralCube", "SpectralCubeWriter"]
+
+FRAME_METADATA = np.dtype(
+    [
+        ("index", np.int64),
+        ("timestamp", np.float64),
+        ("integration_time", np.int64),
+        ("overflow", np.bool_),
+    ]
+)
+
+
+class SpectralCubeWriter:
+    """Append raw spectra to a cube file.
+
+    Frames are collected in a preallocated block of `chunk_frames` frames,
+    which is written as a single compressed chunk when it is full, so appending
+    a frame takes constant time. Call `flush()` to write a partial block, or
+    use the writer as a context manager to flush and close the file.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike[str],
+        wavelengths: ArrayLike,
+        scale: float = 1.0,
+        chunk_frames: int = 64,
+        compression: str | None = "gzip",
+        append: bool = False,
+    ) -> None:
+        """Create (or open) a cube file.
+
+        Args:
+            path: the path of the file.
+            wavelengths: the wavelength axis in nanometers.
+            scale: the factor which converts raw values to intensities.
+            chunk_frames: the number of frames in a chunk.
+            compression: the HDF5 compression filter, or None.
+            append: if True and the file exists, append to the frames already
+                in the file. Otherwise, the file is overwritten.
+        """
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        num_pixels = len(wavelengths)
+        self._file = h5py.File(path, "a" if append else "w")
+        if "raw" in self._file:
+            self._raw = self._file["raw"]
+            self._metadata = self._file["metadata"]
+            if (file_pixels := self._raw.shape[1]) != num_pixels:
+                self._file.close()
+                raise ValueError(f"{path} contains spectra with {file_pixels} pixels.")
+        else:
+            self._file.attrs["scale"] = scale
+            self._file.create_dataset("wavelength", data=wavelengths)
+            self._raw = self._file.create_dataset(
+                "raw",
+                shape=(0, num_pixels),
+                maxshape=(None, num_pixels),
+                dtype=np.uint16,
+                chunks=(chunk_frames, num_pixels),
+                compression=compression,
+                shuffle=compression is not None,
+            )
+            self._metadata = self._file.create_dataset(
+                "metadata",
+                shape=(0,),
+                maxshape=(None,),
+                dtype=FRAME_METADATA,
+                chunks=(chunk_frames,),
+                compression=compression,
+            )
+        self._block = np.zeros((chunk_frames, num_pixels), dtype=np.uint16)
+        self._block_metadata = np.zeros(chunk_frames, dtype=FRAME_METADATA)
+        self._block_size = 0
+
+    def __len__(self) -> int:
+        return len(self._raw) + self._block_size
+
+    def append(
+        self,
+        raw: NDArray[np.integer],
+        index: int,
+        timestamp: float,
+        integration_time: int,
+        overflow: bool = False,
+    ) -> None:
+        """Append a raw spectrum.
+
+        Args:
+            raw: the raw spectrum, with the same number of pixels as the
+                wavelength axis.
+            index: the frame index, e.g. the index of the corresponding image.
+            timestamp: the acquisition timestamp in seconds since the epoch.
+            integration_time: the integration time in microseconds.
+            overflow: whether the spectrum was overexposed.
+        """
+        self._block[self._block_size] = raw
+        self._block_metadata[self._block_size] = (
+            index,
+            timestamp,
+            integration_time,
+            overflow,
+        )
+        self._block_size += 1
+        if self._block_size == len(self._block):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all appended spectra to the file."""
+        if self._block_size:
+            start = len(self._raw)
+            end = start + self._block_size
+            self._raw.resize(end, axis=0)
+            self._metadata.resize(end, axis=0)
+            self._raw[start:end] = self._block[: self._block_size]
+            self._metadata[start:end] = self._block_metadata[: self._block_size]
+            self._block_size = 0
+        self._file.flush()
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        self.flush()
+        self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+class SpectralCube:
+    """Read spectra from a cube file.
+
+    The wavelength axis and the frame metadata are loaded when the file is
+    opened. Spectra are only read when they are accessed, by indexing or
+    slicing the cube, and only the chunks containing those spectra are
+    decompressed.
+    """
+
+    def __init__(self, path: str | PathLike[str]) -> None:
+        """Open a cube file for reading.
+
+        Args:
+            path: the path of the file.
+        """
+        self._file = h5py.File(path, "r")
+        self.raw: h5py.Dataset = self._file["raw"]
+        self.wavelengths: NDArray[np.float64] = self._file["wavelength"][:]
+        self.metadata: NDArray[np.void] = self._file["metadata"][:]
+        self.scale = float(self._file.attrs["scale"])
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __getitem__(self, key: int | slice | NDArray[np.integer]) -> NDArray[np.uint16]:
+        """Read raw spectra.
+
+        Args:
+            key: a frame number, a slice or an increasing array of frame
+                numbers (not frame indexes, see `metadata`).
+        """
+        return np.asarray(self.raw[key], dtype=np.uint16)
+
+    @property
+    def indexes(self) -> NDArray[np.int64]:
+        """The frame index of each spectrum."""
+        return self.metadata["index"]
+
+    def intensities(
+        self, key: int | slice | NDArray[np.integer] = slice(None)
+    ) -> NDArray[np.float64]:
+        """Read calibrated intensities.
+
+        Args:
+            key: a frame number, a slice or an increasing array of frame
+                numbers. By default, all spectra are read.
+        """
+        return np.asarray(self.raw[key] * self.scale, dtype=np.float64)
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -0,0 +1,378 @@
+"""Export spectra to CSV, NumPy and Parquet files.
+
+The format is chosen by the extension of the path:
+
+- `.csv`: text with a header row. Values are formatted a block at a time using
+  `np.savetxt`, instead of one Python object at a time.
+- `.npy`: a single array. The first row holds the wavelengths, the other rows
+  the intensities of the spectra.
+- `.npz`: named arrays, including the metadata of a series.
+- `.parquet`: a table, written using the optional `pyarrow` package.
+
+A single spectrum is stored in two columns, wavelength and intensity. A series
+of spectra is stored as a matrix with a row for each spectrum, preceded by its
+index, timestamp, integration time and overflow flag. `SeriesWriter` writes a
+series while it is measured, one spectrum at a time.
+"""
+
+from collections.abc import Sequence
+from importlib.util import find_spec
+from os import PathLike
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+if TYPE_CHECKING:
+    from deadsea_optics.cube import SpectralCubeWriter
+
+__all__ = [
+    "FORMATS",
+    "SERIES_COLUMNS",
+    "SeriesWriter",
+    "check_format",
+    "save_series",
+    "save_spectrum",
+    "write_series_header",
+    "write_series_rows",
+    "write_spectrum",
+]
+
+FORMATS = {
+    ".csv": "CSV Files",
+    ".npy": "NumPy Files",
+    ".npz": "NumPy Archives",
+    ".parquet": "Parquet Files",
+}
+
+SPECTRUM_COLUMNS = ["Wavelength (nm)", "Intensity"]
+SERIES_COLUMNS = ["Index", "Timestamp", "Integration time (us)", "Overflow"]
+
+# formats of the metadata columns of a series
+_SERIES_FORMATS = ["%d", "%.6f", "%d", "%d"]
+
+_PYARROW_MISSING = (
+    "Exporting to Parquet requires pyarrow. "
+    "Install it using `pip install deadsea-optics[parquet]`."
+)
+
+
+def save_spectrum(
+    path: str | PathLike[str],
+    wavelengths: NDArray[np.floating],
+    intensities: NDArray[np.floating],
+    fmt: str = "%.10g",
+) -> None:
+    """Save a spectrum.
+
+    Args:
+        path: the path of the file. The extension selects the format.
+        wavelengths: the wavelength values.
+        intensities: the intensity values.
+        fmt: the format of the values in a CSV file.
+
+    Raises:
+        ValueError: the file format is not supported.
+        ImportError: the file format requires a package which is not installed.
+    """
+    path = Path(path)
+    suffix = check_format(path)
+    if suffix == ".csv":
+        with path.open("w", newline="") as f:
+            write_spectrum(f, wavelengths, intensities, fmt)
+    elif suffix == ".npy":
+        np.save(path, np.vstack([wavelengths, intensities]))
+    elif suffix == ".npz":
+        np.savez(path, wavelengths=wavelengths, intensities=intensities)
+    else:
+        _write_parquet(path, SPECTRUM_COLUMNS, [wavelengths, intensities])
+
+
+def save_series(
+    path: str | PathLike[str],
+    wavelengths: NDArray[np.floating],
+    spectra: ArrayLike,
+    index: ArrayLike | None = None,
+    timestamps: ArrayLike | None = None,
+    integration_times: ArrayLike | None = None,
+    overflow: ArrayLike | None = None,
+    fmt: str = "%.10g",
+) -> None:
+    """Save a series of spectra in one pass.
+
+    Args:
+        path: the path of the file. The extension selects the format.
+        wavelengths: the wavelength values, shared by all spectra.
+        spectra: the intensities, with a row for each spectrum.
+        index: the index of each spectrum. Defaults to 0, 1, 2, ...
+        timestamps: the acquisition time of each spectrum in seconds.
+            Defaults to NaN.
+        integration_times: the integration time of each spectrum in
+            microseconds. Defaults to 0.
+        overflow: whether each spectrum was overexposed. Defaults to False.
+        fmt: the format of the values in a CSV file.
+
+    Raises:
+        ValueError: the file format is not supported.
+        ImportError: the file format requires a package which is not installed.
+    """
+    path = Path(path)
+    suffix = check_format(path)
+    matrix: NDArray[np.float64] = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    count = len(matrix)
+    index = np.arange(count) if index is None else np.asarray(index)
+    timestamps = (
+        np.full(count, np.nan) if timestamps is None else np.asarray(timestamps)
+    )
+    integration_times = (
+        np.zeros(count, dtype=np.int64)
+        if integration_times is None
+        else np.asarray(integration_times)
+    )
+    overflow = np.zeros(count, dtype=bool) if overflow is None else np.asarray(overflow)
+
+    if suffix == ".csv":
+        with path.open("w", newline="") as f:
+            write_series_header(f, wavelengths)
+            write_series_rows(
+                f, index, timestamps, integration_times, overflow, matrix, fmt
+            )
+    elif suffix == ".npy":
+        np.save(path, np.vstack([wavelengths, matrix]))
+    elif suffix == ".npz":
+        np.savez(
+            path,
+            wavelengths=wavelengths,
+            intensities=matrix,
+            index=index,
+            timestamps=timestamps,
+            integration_times=integration_times,
+            overflow=overflow,
+        )
+    else:
+        _write_parquet(
+            path,
+            SERIES_COLUMNS + [f"{wavelength:.3f}" for wavelength in wavelengths],
+            [index, timestamps, integration_times, overflow, *matrix.T],
+        )
+
+
+def write_spectrum(
+    file: TextIO,
+    wavelengths: NDArray[np.floating],
+    intensities: NDArray[np.floating],
+    fmt: str = "%.10g",
+) -> None:
+    """Write a spectrum to a CSV file, with a header row.
+
+    Args:
+        file: the CSV file, e.g. `sys.stdout`.
+        wavelengths: the wavelength values.
+        intensities: the intensity values.
+        fmt: the format of the values.
+    """
+    np.savetxt(
+        file,
+        np.column_stack([wavelengths, intensities]),
+        fmt=fmt,
+        delimiter=",",
+        header=",".join(SPECTRUM_COLUMNS),
+        comments="",
+    )
+
+
+def write_series_header(file: TextIO, wavelengths: NDArray[np.floating]) -> None:
+    """Write the header row of a series to a CSV file.
+
+    Args:
+        file: the CSV file.
+        wavelengths: the wavelength values, shared by all spectra.
+    """
+    file.write(
+        ",".join(SERIES_COLUMNS + [f"{wavelength:.3f}" for wavelength in wavelengths])
+        + "\n"
+    )
+
+
+def write_series_rows(
+    file: TextIO,
+    index: ArrayLike,
+    timestamps: ArrayLike,
+    integration_times: ArrayLike,
+    overflow: ArrayLike,
+    spectra: ArrayLike,
+    fmt: str = "%.10g",
+) -> None:
+    """Write rows of a series to a CSV file, in one block.
+
+    Args:
+        file: the CSV file.
+        index: the index of each spectrum.
+        timestamps: the acquisition time of each spectrum in seconds.
+        integration_times: the integration time of each spectrum in
+            microseconds.
+        overflow: whether each spectrum was overexposed.
+        spectra: the intensities, with a row for each spectrum.
+        fmt: the format of the intensities.
+    """
+    matrix: NDArray[np.float64] = np.atleast_2d(np.asarray(spectra, dtype=np.float64))
+    rows = np.column_stack(
+        [
+            np.atleast_1d(index),
+            np.atleast_1d(timestamps),
+            np.atleast_1d(integration_times),
+            np.atleast_1d(overflow),
+            matrix,
+        ]
+    )
+    np.savetxt(
+        file,
+        rows,
+        fmt=_SERIES_FORMATS + [fmt] * matrix.shape[1],
+        delimiter=",",
+    )
+
+
+class SeriesWriter:
+    """Write a series of spectra to a file while they are measured.
+
+    CSV rows and HDF5 cube frames are written as soon as a spectrum is
+    appended. The NumPy and Parquet formats hold a single matrix, so those
+    spectra are collected and exported when the writer is closed. Until then,
+    they are also streamed to a CSV file next to the output, `<name>.csv`,
+    which is removed after a successful export and kept if it fails, so no
+    spectra are lost.
+    """
+
+    def __init__(
+        self, path: str | PathLike[str], wavelengths: NDArray[np.floating], scale: float
+    ) -> None:
+        """Create the output file.
+
+        Args:
+            path: the path of the file. If the extension is .h5, the spectra are
+                stored in a cube and if it is .npy, .npz or .parquet, they are
+                exported in that format. Otherwise, they are written as CSV.
+            wavelengths: the wavelength axis.
+            scale: the factor which converts raw values to intensities.
+
+        Raises:
+            ImportError: the file format requires a package which is not
+                installed.
+        """
+        self.path = Path(path)
+        self._wavelengths = wavelengths
+        self._cube: SpectralCubeWriter | None = None
+        self._file: TextIO | None = None
+        self._sidecar: Path | None = None
+        self._rows: list[tuple[int, float, int, bool, NDArray[np.floating]]] = []
+        suffix = self.path.suffix.lower()
+        if suffix == ".h5":
+            # h5py takes a while to load, so only import it when needed
+            from deadsea_optics import cube
+
+            self._cube = cube.SpectralCubeWriter(self.path, wavelengths, scale=scale)
+            return
+        if suffix in FORMATS.keys() - {".csv"}:
+            check_format(self.path)
+            self._sidecar = self.path.with_name(self.path.name + ".csv")
+        self._file = (self._sidecar or self.path).open("w", newline="")
+        write_series_header(self._file, wavelengths)
+
+    def append(
+        self,
+        index: int,
+        timestamp: float,
+        integration_time: int,
+        raw: NDArray[np.uint16],
+        intensities: NDArray[np.floating],
+        overflow: bool,
+    ) -> None:
+        """Write a spectrum.
+
+        Args:
+            index: the index of the spectrum.
+            timestamp: the acquisition time in seconds.
+            integration_time: the integration time in microseconds.
+            raw: the raw values, without dark pixels, which are stored in a
+                cube.
+            intensities: the calibrated intensities.
+            overflow: whether the spectrum was overexposed.
+        """
+        if self._cube is not None:
+            self._cube.append(raw, index, timestamp, integration_time, overflow)
+            return
+        if self._file is not None:
+            write_series_rows(
+                self._file, index, timestamp, integration_time, overflow, intensities
+            )
+            self._file.flush()
+        if self._sidecar is not None:
+            self._rows.append(
+                (index, timestamp, integration_time, overflow, intensities.copy())
+            )
+
+    def close(self) -> None:
+        """Close the file, exporting collected spectra.
+
+        Raises:
+            Exception: exporting failed. The spectra are kept in the CSV file
+                next to the output.
+        """
+        if self._cube is not None:
+            self._cube.close()
+        if self._file is not None:
+            self._file.close()
+        if self._sidecar is None:
+            return
+        if not self._rows:
+            self._sidecar.unlink()
+            return
+        index, timestamps, integration_times, overflow, spectra = zip(*self._rows)
+        save_series(
+            self.path,
+            self._wavelengths,
+            np.stack(spectra),
+            index=index,
+            timestamps=timestamps,
+            integration_times=integration_times,
+            overflow=overflow,
+        )
+        self._sidecar.unlink()
+
+
+def check_format(path: str | PathLike[str]) -> str:
+    """Check that the format of a file is supported.
+
+    Args:
+        path: the path of the file.
+
+    Returns:
+        The lowercase extension of the path.
+
+    Raises:
+        ValueError: the file format is not supported.
+        ImportError: the file format requires a package which is not installed.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(
+            f"Unsupported file format {path.suffix!r}, use one of {', '.join(FORMATS)}."
+        )
+    if suffix == ".parquet" and find_spec("pyarrow") is None:
+        raise ImportError(_PYARROW_MISSING)
+    return suffix
+
+
+def _write_parquet(
+    path: Path, names: Sequence[str], columns: Sequence[ArrayLike]
+) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError(_PYARROW_MISSING) from exc
+    table = pa.table([np.asarray(column) for column in columns], names=list(names))
+    pq.write_table(table, path)
@@ -1,7 +1,7 @@
-import csv
 import importlib.metadata
 import importlib.resources
 import sys
+import time
 from textwrap import dedent
 from typing import Any
 
@@ -11,27 +11,47 @@ from numpy.typing import NDArray
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import Slot
 
-from spectroscopy import (
+from deadsea_optics import export
+from deadsea_optics.instrumentation import instrumentation
+from deadsea_optics.mailbox import Mailbox
+from deadsea_optics.spectroscopy import (
     AccessError,
     DeviceNotFoundError,
     SpectroscopyExperiment,
-    SpectrumTimeOutError,
 )
-from ui_main_window import Ui_MainWindow
+from deadsea_optics.ui_main_window import Ui_MainWindow
+from deadsea_optics.waterfall import WaterfallBuffer
 
 metadata = importlib.metadata.metadata("deadsea_optics")
 __name__ = metadata["name"]
 __version__ = metadata["version"]
 
+# Interval between updates of the timing readout in the status bar
+TIMING_READOUT_INTERVAL = 1000  # ms
+# Refresh rate used to limit redraws if the screen does not report one
+DEFAULT_REFRESH_RATE = 60  # Hz
+# Number of spectra in the waterfall view
+WATERFALL_ROWS = 1000
+
 # PyQtGraph global options
 pg.setConfigOption("background", "w")
 pg.setConfigOption("foreground", "k")
 
 
+# Wavelengths, intensities and whether the spectrum overflowed
+Spectrum = tuple[NDArray[np.floating], NDArray[np.floating], bool]
+
+
 class MeasurementWorker(QtCore.QThread):
-    new_data = QtCore.Signal(np.ndarray, np.ndarray)
+    # emitted when a spectrum is posted into the empty mailbox
+    new_data = QtCore.Signal()
     stopped = False
 
+    def __init__(self, mailbox: Mailbox[Spectrum], waterfall: WaterfallBuffer) -> None:
+        super().__init__()
+        self.mailbox = mailbox
+        self.waterfall = waterfall
+
     def setup(
         self, experiment: SpectroscopyExperiment, *args: Any, **kwargs: Any
     ) -> None:
@@ -42,6 +62,22 @@ class MeasurementWorker(QtCore.QThread):
     def stop(self) -> None:
         self.stopped = True
 
+    def post(
+        self,
+        wavelengths: NDArray[np.floating],
+        intensities: NDArray[np.floating],
+        history: bool = True,
+    ) -> None:
+        """Hand a spectrum to the user interface, replacing an older one.
+
+        If history is True, the spectrum is also appended to the waterfall, so
+        it is shown there even if it is replaced before it is drawn.
+        """
+        if history:
+            self.waterfall.append(intensities)
+        if self.mailbox.post((wavelengths, intensities, self.experiment.has_overflow)):
+            self.new_data.emit()
+
 
 class IntegrateSpectrumWorker(MeasurementWorker):
     progress = QtCore.Signal(int)
@@ -59,7 +95,8 @@ class IntegrateSpectrumWorker(MeasurementWorker):
         for idx, (wavelengths, intensities) in enumerate(
             self.experiment.integrate_spectrum(self.count), start=1
         ):
-            self.new_data.emit(wavelengths, intensities)
+            # partial integrations are not part of the history
+            self.post(wavelengths, intensities, history=False)
             self.progress.emit(idx)
             if self.stopped:
                 self.experiment.stopped = True
@@ -69,20 +106,25 @@ class SingleSpectrumWorker(MeasurementWorker):
     def run(self) -> None:
         self.stopped = False
         wavelengths, intensities = self.experiment.get_spectrum()
-        self.new_data.emit(wavelengths, intensities)
+        self.post(wavelengths, intensities)
 
 
 class ContinuousSpectrumWorker(MeasurementWorker):
     def run(self) -> None:
         self.stopped = False
-        while True:
-            try:
-                wavelengths, intensities = self.experiment.get_spectrum()
-            except SpectrumTimeOutError:
-                continue
-            self.new_data.emit(wavelengths, intensities)
-            if self.stopped:
-                break
+        acquisition = self.experiment.start_acquisition()
+        sequence = 0
+        try:
+            while not self.stopped:
+                if not acquisition.wait_for_frame(sequence, timeout=0.1):
+                    continue
+                frame = acquisition.latest()
+                assert frame is not None
+                sequence = frame.sequence + 1
+                wavelengths, intensities = self.experiment.calibrate(frame.data)
+                self.post(wavelengths, intensities)
+        finally:
+            self.experiment.stop_acquisition()
 
 
 class UserInterface(QtWidgets.QMainWindow):
@@ -122,7 +164,7 @@ class UserInterface(QtWidgets.QMainWindow):
 
         # Open device
         try:
-            self.experiment = SpectroscopyExperiment()
+            self.experiment = SpectroscopyExperiment(bulk_read=True)
         except (DeviceNotFoundError, AccessError) as exc:
             msg = "Please connect a compatible device. "
             if sys.platform == "win32":
@@ -135,20 +177,76 @@ class UserInterface(QtWidgets.QMainWindow):
             sys.exit()
         self.experiment.set_integration_time(self.ui.integration_time.value())
 
-        # Workers
-        self.integrate_spectrum_worker = IntegrateSpectrumWorker()
+        # Workers hand spectra to the plot through a mailbox, which only keeps
+        # the newest spectrum if they arrive faster than they are drawn
+        self.mailbox: Mailbox[Spectrum] = Mailbox()
+        self.waterfall = WaterfallBuffer(WATERFALL_ROWS)
+        self.integrate_spectrum_worker = IntegrateSpectrumWorker(
+            self.mailbox, self.waterfall
+        )
         self.integrate_spectrum_worker.new_data.connect(self.plot_new_data)
         self.integrate_spectrum_worker.progress.connect(self.update_progress_bar)
         self.integrate_spectrum_worker.finished.connect(self.worker_has_finished)
-        self.single_spectrum_worker = SingleSpectrumWorker()
+        self.single_spectrum_worker = SingleSpectrumWorker(self.mailbox, self.waterfall)
         self.single_spectrum_worker.new_data.connect(self.plot_new_data)
         self.single_spectrum_worker.finished.connect(
             self.single_spectrum_worker_has_finished
         )
-        self.continuous_spectrum_worker = ContinuousSpectrumWorker()
+        self.continuous_spectrum_worker = ContinuousSpectrumWorker(
+            self.mailbox, self.waterfall
+        )
         self.continuous_spectrum_worker.new_data.connect(self.plot_new_data)
         self.continuous_spectrum_worker.finished.connect(self.worker_has_finished)
 
+        # Plot with a single curve, which is updated in place
+        self.ui.plot_widget.setLabel("left", "Intensity")
+        self.ui.plot_widget.setLabel("bottom", "Wavelength (nm)")
+        self.ui.plot_widget.setLimits(yMin=0)
+        self.curve = self.ui.plot_widget.plot()
+        self.curve.setDownsampling(auto=True, method="peak")
+        self.curve.setClipToView(True)
+        self.set_curve_style()
+
+        # Waterfall of recent spectra below the plot, sharing its wavelength
+        # axis. The newest spectrum is at the top.
+        self.waterfall_widget = pg.PlotWidget()
+        self.waterfall_widget.setLabel("left", "Spectra ago")
+        self.waterfall_widget.setLabel("bottom", "Wavelength (nm)")
+        self.waterfall_widget.setXLink(self.ui.plot_widget)
+        self.waterfall_image = pg.ImageItem(axisOrder="row-major")
+        self.waterfall_image.setColorMap(pg.colormap.get("viridis"))
+        self.waterfall_widget.addItem(self.waterfall_image)
+        self._waterfall_max = 0.0
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Orientation.Vertical)
+        self.ui.horizontalLayout.replaceWidget(self.ui.plot_widget, splitter)
+        splitter.addWidget(self.ui.plot_widget)
+        splitter.addWidget(self.waterfall_widget)
+        self.waterfall_checkbox = QtWidgets.QCheckBox()
+        self.waterfall_checkbox.setChecked(True)
+        self.waterfall_checkbox.toggled.connect(self.waterfall_widget.setVisible)
+        self.ui.formLayout.addRow("Show waterfall", self.waterfall_checkbox)
+
+        # Redraw at most once per screen refresh, however fast spectra arrive
+        refresh_rate = self.screen().refreshRate() or DEFAULT_REFRESH_RATE
+        self.redraw_timer = QtCore.QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(int(1000 / refresh_rate))
+        self.redraw_timer.timeout.connect(self.plot_data)
+
+        # Timing readout of the acquisition stages, which is off by default
+        # because instrumentation adds a little overhead to every spectrum
+        self.timing_label = QtWidgets.QLabel()
+        self.timing_label.setVisible(False)
+        self.ui.statusbar.addPermanentWidget(self.timing_label)
+        self._timing_start = time.monotonic()
+        self._skipped = 0
+        self.timing_timer = QtCore.QTimer(self)
+        self.timing_timer.setInterval(TIMING_READOUT_INTERVAL)
+        self.timing_timer.timeout.connect(self.update_timing_readout)
+        self.timing_checkbox = QtWidgets.QCheckBox()
+        self.timing_checkbox.toggled.connect(self.show_timing_readout)
+        self.ui.formLayout.addRow("Show timings", self.timing_checkbox)
+
     def closeEvent(self, event):
         self.single_spectrum_worker.stop()
         self.continuous_spectrum_worker.stop()
@@ -164,6 +262,7 @@ class UserInterface(QtWidgets.QMainWindow):
     @Slot()
     def single_spectrum(self) -> None:
         self.disable_measurement_buttons()
+        self.reset_waterfall()
         self.ui.progress_bar.setMinimum(0)
         self.ui.progress_bar.setMaximum(0)
         self.single_spectrum_worker.setup(experiment=self.experiment)
@@ -172,6 +271,7 @@ class UserInterface(QtWidgets.QMainWindow):
     @Slot()
     def integrate_spectrum(self) -> None:
         self.disable_measurement_buttons()
+        self.reset_waterfall()
         count = self.ui.num_integrations.value()
         self.ui.progress_bar.setRange(0, count)
         self.ui.progress_bar.setValue(0)
@@ -181,6 +281,7 @@ class UserInterface(QtWidgets.QMainWindow):
     @Slot()
     def continuous_spectrum(self) -> None:
         self.disable_measurement_buttons()
+        self.reset_waterfall()
         self.ui.progress_bar.setMinimum(0)
         self.ui.progress_bar.setMaximum(0)
         self.continuous_spectrum_worker.setup(experiment=self.experiment)
@@ -212,66 +313,139 @@ class UserInterface(QtWidgets.QMainWindow):
         self.ui.continuous_button.setEnabled(True)
         self.ui.stop_button.setEnabled(False)
 
-    def plot_data(self) -> None:
-        self.ui.plot_widget.clear()
+    def set_curve_style(self) -> None:
+        """Draw the curve as a line or as markers."""
         if self._show_lines:
-            self.ui.plot_widget.plot(
-                self._wavelengths, self._intensities, pen={"color": "k", "width": 5}
-            )
-
+            self.curve.setSymbol(None)
+            self.curve.setPen({"color": "k", "width": 5})
         else:
-            self.ui.plot_widget.plot(
-                self._wavelengths,
-                self._intensities,
-                symbol="o",
-                symbolSize=3,
-                symbolPen={"color": "k"},
-                symbolBrush="k",
-                pen=None,
-            )
-        self.ui.plot_widget.setLabel("left", "Intensity")
-        self.ui.plot_widget.setLabel("bottom", "Wavelength (nm)")
-        self.ui.plot_widget.setLimits(yMin=0)
+            self.curve.setPen(None)
+            self.curve.setSymbol("o")
+            self.curve.setSymbolSize(3)
+            self.curve.setSymbolPen({"color": "k"})
+            self.curve.setSymbolBrush("k")
 
-    @Slot(tuple)  # type: ignore
-    def plot_new_data(
-        self, wavelengths: NDArray[np.floating], intensities: NDArray[np.floating]
-    ) -> None:
-        self._wavelengths = wavelengths
-        self._intensities = intensities
-        if self.experiment.has_overflow:
+    @Slot()
+    def plot_data(self) -> None:
+        """Plot the newest spectrum in the mailbox, if any."""
+        if (spectrum := self.mailbox.take()) is None:
+            return
+        timer = instrumentation.start()
+        self._wavelengths, self._intensities, overflow = spectrum
+        if overflow:
             self.ui.statusbar.showMessage(
                 "🔴 WARNING: overflow detected, reduce integration time."
             )
         else:
             self.ui.statusbar.showMessage("🟢 Data condition: good.")
-        self.plot_data()
+        self.curve.setData(self._wavelengths, self._intensities, skipFiniteCheck=True)
+        if self.waterfall_widget.isVisible():
+            self.update_waterfall()
+        if timer is not None:
+            timer.mark("gui.plot")
+
+    def reset_waterfall(self) -> None:
+        """Start a new waterfall when a new acquisition starts."""
+        self.waterfall.clear()
+        self._waterfall_max = 0.0
+
+    def update_waterfall(self) -> None:
+        """Show the history of spectra, without copying it."""
+        if (history := self.waterfall.view()) is None or self._wavelengths is None:
+            return
+        assert self._intensities is not None
+        # fixed levels are cheaper than scanning the whole history each frame
+        self._waterfall_max = max(self._waterfall_max, float(self._intensities.max()))
+        self.waterfall_image.setImage(
+            history, autoLevels=False, levels=(0, self._waterfall_max or 1)
+        )
+        first, last = self._wavelengths[0], self._wavelengths[-1]
+        self.waterfall_image.setRect(
+            QtCore.QRectF(first, -len(history), last - first, len(history))
+        )
+
+    @Slot()
+    def plot_new_data(self) -> None:
+        # the spectrum stays in the mailbox until it is drawn, so newer spectra
+        # replace it instead of queueing up
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
+    @Slot(bool)  # type: ignore[arg-type, unused-ignore]
+    def show_timing_readout(self, show: bool) -> None:
+        """Enable or disable timing the stages and the timing readout."""
+        if show:
+            instrumentation.enable()
+            self._timing_start = time.monotonic()
+            self._skipped = self.mailbox.skipped
+            self.timing_timer.start()
+        else:
+            self.timing_timer.stop()
+            instrumentation.disable()
+            # discard the timings, so the next readout starts afresh
+            instrumentation.statistics(reset=True)
+            self.timing_label.clear()
+        self.timing_label.setVisible(show)
+
+    @Slot()
+    def update_timing_readout(self) -> None:
+        """Show the median duration of each stage since the previous update."""
+        now = time.monotonic()
+        elapsed = now - self._timing_start
+        self._timing_start = now
+        statistics = instrumentation.statistics(reset=True)
+        if not statistics:
+            self.timing_label.clear()
+            self.timing_label.setToolTip("")
+            return
+        readout = [f"{stage.stage} {stage.p50 * 1e3:.2f}" for stage in statistics]
+        plots = sum(stage.count for stage in statistics if stage.stage == "gui.plot")
+        skipped = self.mailbox.skipped - self._skipped
+        self._skipped = self.mailbox.skipped
+        self.timing_label.setText(
+            " · ".join(readout) + f" ms · {plots / elapsed:.1f} fps · {skipped} skipped"
+        )
+        self.timing_label.setToolTip(
+            "\n".join(
+                f"{stage.stage}: {stage.count}x, p50 {stage.p50 * 1e3:.3f} ms, "
+                f"p99 {stage.p99 * 1e3:.3f} ms, max {stage.max * 1e3:.3f} ms"
+                for stage in statistics
+            )
+        )
 
     @Slot()
     def toggle_lines_markers(self) -> None:
         self._show_lines = not self._show_lines
-        self.plot_data()
+        self.set_curve_style()
 
-    @Slot(int)  # type: ignore
+    @Slot(int)  # type: ignore[arg-type, unused-ignore]
     def update_progress_bar(self, value: int) -> None:
         self.ui.progress_bar.setValue(value)
 
     @Slot()
     def save_data(self) -> None:
         if self._wavelengths is None or self._intensities is None:
-            QtWidgets.QMessageBox.warning(
+            QtWidgets.QMessageBox.warning(  # type: ignore[call-arg, unused-ignore]
                 self, "No data", "Perform a measurement before saving."
-            )  # type: ignore
+            )
         else:
-            path, _ = QtWidgets.QFileDialog.getSaveFileName(filter="CSV Files (*.csv)")
-            with open(path, mode="w") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Wavelength (nm)", "Intensity"])
-                for wavelength, intensity in zip(self._wavelengths, self._intensities):
-                    writer.writerow([wavelength, intensity])
-            QtWidgets.QMessageBox.information(
-                self, "Data saved", f"Data saved successfully to {path}."
+            path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                filter=";;".join(
+                    f"{name} (*{suffix})" for suffix, name in export.FORMATS.items()
+                )
             )
+            if not path:
+                return
+            try:
+                export.save_spectrum(path, self._wavelengths, self._intensities)
+            except (ValueError, ImportError) as exc:
+                QtWidgets.QMessageBox.warning(  # type: ignore[call-arg, unused-ignore]
+                    self, "Data not saved", str(exc)
+                )
+            else:
+                QtWidgets.QMessageBox.information(
+                    self, "Data saved", f"Data saved successfully to {path}."
+                )
 
     def show_about_dialog(self):
         """Show about application dialog."""
@@ -0,0 +1,183 @@
+"""Optional timing of the stages of acquiring, processing and saving spectra.
+
+Instrumented code asks the global `instrumentation` for a timer and marks the
+end of each stage, e.g.
+
+    timer = instrumentation.start()
+    device.write(...)
+    if timer is not None:
+        timer.mark("usb.write")
+
+Each mark records the time since the previous mark in a fixed-size histogram
+for that stage. When instrumentation is disabled, which is the default,
+`start()` returns None, so the only cost is a few attribute checks.
+"""
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+__all__ = [
+    "Instrumentation",
+    "LatencyHistogram",
+    "StageStatistics",
+    "StageTimer",
+    "instrumentation",
+]
+
+BINS_PER_OCTAVE = 4
+# bins range from 1 µs to about 17 s
+NUM_BINS = 24 * BINS_PER_OCTAVE
+
+
+@dataclass(frozen=True)
+class StageStatistics:
+    """Timing statistics of a stage, in seconds.
+
+    The percentiles are estimated from the histogram, to within 19%.
+    """
+
+    stage: str
+    count: int
+    mean: float
+    p50: float
+    p99: float
+    max: float
+
+
+class LatencyHistogram:
+    """Histogram of durations with logarithmically spaced bins.
+
+    Recording a duration takes constant time and memory. Durations below 1 µs
+    are counted in the first bin, durations above the last bin in the last.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * NUM_BINS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float) -> None:
+        """Record a duration in seconds."""
+        if duration > 1e-6:
+            index = min(int(math.log2(duration * 1e6) * BINS_PER_OCTAVE), NUM_BINS - 1)
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, q: float) -> float:
+        """Estimate a percentile of the recorded durations.
+
+        Args:
+            q: the percentile, between 0 and 100.
+
+        Returns:
+            The upper edge of the bin containing the percentile, in seconds,
+            but at most the longest recorded duration.
+        """
+        if self.count == 0:
+            return math.nan
+        threshold = q / 100 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold and count:
+                break
+        upper_edge = 2 ** ((index + 1) / BINS_PER_OCTAVE) * 1e-6
+        return min(upper_edge, self.max)
+
+
+class StageTimer:
+    """Records the duration of consecutive stages."""
+
+    __slots__ = ("_instrumentation", "_last")
+
+    def __init__(self, instrumentation: "Instrumentation") -> None:
+        self._instrumentation = instrumentation
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        """Mark the end of a stage, which started at the previous mark.
+
+        Args:
+            stage: the name of the stage.
+        """
+        now = time.perf_counter()
+        self._instrumentation.record(stage, now - self._last)
+        self._last = now
+
+
+class Instrumentation:
+    """A collection of stage histograms, which can be enabled and disabled."""
+
+    enabled: bool = False
+
+    def __init__(self) -> None:
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        """Start recording timings."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stop recording timings. Recorded timings are kept."""
+        self.enabled = False
+
+    def start(self) -> StageTimer | None:
+        """Start timing stages.
+
+        Returns:
+            A timer, or None if instrumentation is disabled.
+        """
+        if self.enabled:
+            return StageTimer(self)
+        return None
+
+    def record(self, stage: str, duration: float) -> None:
+        """Record the duration of a stage.
+
+        Args:
+            stage: the name of the stage.
+            duration: the duration in seconds.
+        """
+        with self._lock:
+            if (histogram := self._histograms.get(stage)) is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(duration)
+
+    def statistics(self, reset: bool = False) -> list[StageStatistics]:
+        """Return the statistics of all stages, in the order they were first seen.
+
+        Args:
+            reset: if True, clear all histograms afterwards, so the next call
+                only covers new timings.
+        """
+        with self._lock:
+            statistics = [
+                StageStatistics(
+                    stage=stage,
+                    count=histogram.count,
+                    mean=histogram.total / histogram.count,
+                    p50=histogram.percentile(50),
+                    p99=histogram.percentile(99),
+                    max=histogram.max,
+                )
+                for stage, histogram in self._histograms.items()
+            ]
+            if reset:
+                self._histograms = {}
+        return statistics
+
+    def reset(self) -> None:
+        """Clear all histograms."""
+        with self._lock:
+            self._histograms = {}
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,73 @@
+"""Hand over the latest value from a producer thread to a consumer thread.
+
+A mailbox holds at most one value. Posting a value replaces a value which has
+not been taken yet, so a slow consumer always gets the newest value and never
+falls behind, e.g. when spectra are acquired faster than they can be drawn.
+Replaced values are counted as skipped.
+
+The producer only needs to notify the consumer when it posts into an empty
+mailbox, e.g. by emitting a Qt signal without arguments. At most one
+notification is then pending at any time:
+
+    if mailbox.post(spectrum):
+        new_data.emit()
+
+and the consumer takes the newest value when it handles the notification.
+"""
+
+import threading
+from typing import Generic, TypeVar
+
+__all__ = ["Mailbox"]
+
+T = TypeVar("T")
+
+
+class Mailbox(Generic[T]):
+    """Thread-safe holder of the latest value, counting skipped values."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value: T | None = None
+        self._full = False
+        self.posted = 0
+        self.skipped = 0
+
+    def post(self, value: T) -> bool:
+        """Post a value, replacing a value which has not been taken yet.
+
+        Args:
+            value: the value.
+
+        Returns:
+            True if the mailbox was empty, so the consumer should be notified.
+        """
+        with self._lock:
+            was_empty = not self._full
+            if not was_empty:
+                self.skipped += 1
+            self._value = value
+            self._full = True
+            self.posted += 1
+        return was_empty
+
+    def take(self) -> T | None:
+        """Take the latest value, emptying the mailbox.
+
+        Returns:
+            The latest value, or None if no value was posted since the last
+            call.
+        """
+        with self._lock:
+            value = self._value
+            self._value = None
+            self._full = False
+        return value
+
+    def reset(self) -> None:
+        """Empty the mailbox and reset the counters."""
+        with self._lock:
+            self._value = None
+            self._full = False
+            self.posted = 0
+            self.skipped = 0
@@ -0,0 +1,217 @@
+"""Flat binary log of raw spectra, read back through memory mapping.
+
+A log file starts with a fixed-size header, containing the number of pixels
+and the calibration of the device, followed by fixed-size records. Each record
+holds a sequence number, a timestamp, the integration time, flags and the raw
+spectrum including dark pixels. Because all records have the same size, the
+file can be read as a structured NumPy array using `np.memmap`, so slicing a
+multi-GB log only reads the spectra which are actually used.
+"""
+
+from os import PathLike
+from types import TracebackType
+from typing import BinaryIO, Self
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+__all__ = ["RawLog", "RawLogWriter", "record_dtype"]
+
+MAGIC = b"DSORAW\r\n"
+VERSION = 1
+HEADER_SIZE = 128
+
+FLAG_OVERFLOW = 0x01
+
+HEADER = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("num_pixels", "<u4"),
+        ("num_dark_pixels", "<u4"),
+        ("record_size", "<u4"),
+        ("scale", "<f8"),
+        ("wavelength_coefficients", "<f8", (4,)),
+    ]
+)
+
+
+def record_dtype(num_pixels: int) -> np.dtype[np.void]:
+    """Return the structured data type of a record.
+
+    Args:
+        num_pixels: the number of pixels of each raw spectrum.
+    """
+    return np.dtype(
+        [
+            ("sequence", "<u8"),
+            ("timestamp", "<f8"),
+            ("integration_time", "<u4"),
+            ("flags", "<u4"),
+            ("pixels", "<u2", (num_pixels,)),
+        ]
+    )
+
+
+class RawLogWriter:
+    """Append raw spectra to a log file.
+
+    Each record is assembled in a preallocated structured array and written
+    directly from its buffer, so no objects are allocated per spectrum.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike[str],
+        num_pixels: int,
+        wavelength_coefficients: ArrayLike = (0.0, 1.0, 0.0, 0.0),
+        scale: float = 1.0,
+        num_dark_pixels: int = 0,
+    ) -> None:
+        """Create a log file.
+
+        Args:
+            path: the path of the file. An existing file is overwritten.
+            num_pixels: the number of pixels of each raw spectrum.
+            wavelength_coefficients: the coefficients of the cubic polynomial
+                which converts pixel numbers to wavelengths.
+            scale: the factor which converts raw values to intensities.
+            num_dark_pixels: the number of dark pixels at the start of each
+                raw spectrum.
+        """
+        self._record = np.zeros(1, dtype=record_dtype(num_pixels))
+        header = np.array(
+            [
+                (
+                    MAGIC,
+                    VERSION,
+                    num_pixels,
+                    num_dark_pixels,
+                    self._record.itemsize,
+                    scale,
+                    np.asarray(wavelength_coefficients, dtype=np.float64),
+                )
+            ],
+            dtype=HEADER,
+        )
+        self._file: BinaryIO = open(path, "wb")  # noqa: SIM115
+        self._file.write(header.tobytes().ljust(HEADER_SIZE, b"\x00"))
+        self.count = 0
+
+    def append(
+        self,
+        sequence: int,
+        timestamp: float,
+        integration_time: int,
+        pixels: NDArray[np.integer],
+        overflow: bool = False,
+    ) -> None:
+        """Append a raw spectrum.
+
+        Args:
+            sequence: the sequence number of the spectrum.
+            timestamp: the acquisition time in seconds.
+            integration_time: the integration time in microseconds.
+            pixels: the raw spectrum, including dark pixels.
+            overflow: whether the spectrum was overexposed.
+        """
+        record = self._record[0]
+        record["sequence"] = sequence
+        record["timestamp"] = timestamp
+        record["integration_time"] = integration_time
+        record["flags"] = FLAG_OVERFLOW if overflow else 0
+        record["pixels"][: len(pixels)] = pixels
+        self._file.write(self._record.data)
+        self.count += 1
+
+    def flush(self) -> None:
+        """Flush written records to disk."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+class RawLog:
+    """Read a log of raw spectra without loading it into memory.
+
+    The records are available as a memory-mapped structured array in the
+    `records` attribute. Indexing the log returns (views on) records. An
+    incomplete last record, e.g. from an interrupted recording, is ignored.
+    """
+
+    def __init__(self, path: str | PathLike[str]) -> None:
+        """Open a log file for reading.
+
+        Args:
+            path: the path of the file.
+
+        Raises:
+            ValueError: the file is not a raw spectrum log.
+        """
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a raw spectrum log.")
+        if header["version"][0] != VERSION:
+            raise ValueError(f"Unsupported log version {header['version'][0]}.")
+        self.num_pixels = int(header["num_pixels"][0])
+        self.num_dark_pixels = int(header["num_dark_pixels"][0])
+        self.scale = float(header["scale"][0])
+        self.wavelength_coefficients = header["wavelength_coefficients"][0].copy()
+
+        dtype = record_dtype(self.num_pixels)
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+        count = (size - HEADER_SIZE) // dtype.itemsize
+        if count > 0:
+            self.records: NDArray[np.void] = np.memmap(
+                path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,)
+            )
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, key: int | slice | NDArray[np.integer]) -> NDArray[np.void]:
+        return self.records[key]
+
+    @property
+    def wavelengths(self) -> NDArray[np.float64]:
+        """The calibrated wavelengths of the pixels, excluding dark pixels."""
+        x = np.arange(self.num_pixels, dtype=np.float64)
+        c = self.wavelength_coefficients
+        wavelengths = c[0] + c[1] * x + c[2] * x**2 + c[3] * x**3
+        return np.asarray(wavelengths[self.num_dark_pixels :], dtype=np.float64)
+
+    def pixels(
+        self, key: int | slice | NDArray[np.integer] = slice(None)
+    ) -> NDArray[np.uint16]:
+        """Return raw spectra, including dark pixels, without copying.
+
+        Args:
+            key: a record number, a slice or an array of record numbers.
+        """
+        return self.records["pixels"][key]
+
+    def intensities(
+        self, key: int | slice | NDArray[np.integer] = slice(None)
+    ) -> NDArray[np.floating]:
+        """Return calibrated intensities, excluding dark pixels.
+
+        Args:
+            key: a record number, a slice or an array of record numbers.
+        """
+        return self.pixels(key)[..., self.num_dark_pixels :] * self.scale
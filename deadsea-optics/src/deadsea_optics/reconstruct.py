@@ -0,0 +1,482 @@
+"""Hyperspectral image reconstruction from a mosaic scan.
+
+During a scan, the telescope is moved in a spiral and for each position a
+camera image (`solar_<n>.png`, numbered from 0) and a spectrum through the
+fiber (frame index n + 1) are taken. The reconstruction follows the steps of
+`spectral_imaging.m`:
+
+1. Register each camera image against a reference image using FFT
+   cross-correlation (see `deadsea_optics.registration`). The offset of the
+   correlation peak, converted to reconstruction pixels, is the position of
+   the fiber during that frame.
+2. Build the system matrix A, with a row for each frame. Each row is the
+   fiber acquisition mask, a super-Gaussian centered on the fiber position,
+   restricted to a box of twice its width and normalized, on the
+   reconstruction grid. The masks are only evaluated inside their box and A
+   is built directly in sparse (CSR) form.
+3. Load the spectra of all frames into the IFU matrix, with a row for each
+   frame and a column for each wavelength, and back-project: Aᵀ·ifu, reshaped
+   to a (y, x, wavelength) cube. Alternatively, solve A·X = ifu for all
+   wavelengths at once using one of the regularized solvers of
+   `deadsea_optics.solvers`.
+
+All lengths are in millimeters.
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import scipy.io
+import scipy.sparse
+from numpy.typing import NDArray
+from PIL import Image
+
+from deadsea_optics import solvers
+from deadsea_optics.cube import SpectralCube
+from deadsea_optics.rawlog import RawLog
+from deadsea_optics.registration import ROI, ImageRegistration
+
+__all__ = [
+    "METHODS",
+    "Reconstruction",
+    "SystemModel",
+    "back_project",
+    "count_images",
+    "estimate_image",
+    "find_offsets",
+    "load_spectra",
+    "read_image",
+    "read_images",
+    "reconstruct",
+    "system_matrix",
+]
+
+IMAGE_PREFIX = "solar"
+SPECTRUM_PREFIX = "spectrum"
+CUBE_NAME = "spectra.h5"
+
+# back-projection, like `spectral_imaging.m`, or one of the solvers
+METHODS = ("backproject", *solvers.METHODS)
+
+
+@dataclass(frozen=True)
+class SystemModel:
+    """Parameters of the reconstruction grid and the fiber acquisition mask.
+
+    Attributes:
+        num_pixels: the size of the square reconstruction grid in pixels.
+        pixel_size_native: the pixel size of the camera.
+        binning: the size of a reconstruction pixel in camera pixels.
+        beam_waist: the radius of the fiber core in the image plane.
+        gaussian_order: the order of the super-Gaussian fiber mask.
+    """
+
+    num_pixels: int = 63
+    pixel_size_native: float = 3.45e-3
+    binning: int = 4
+    beam_waist: float = 25e-3
+    gaussian_order: int = 8
+
+    @property
+    def pixel_size(self) -> float:
+        """The size of a reconstruction pixel."""
+        return self.binning * self.pixel_size_native
+
+    @property
+    def sigma(self) -> float:
+        """The width of the fiber mask in reconstruction pixels."""
+        return self.beam_waist / self.pixel_size
+
+    @property
+    def boxing_width(self) -> float:
+        """The half-width of the box to which the fiber mask is restricted."""
+        return 2 * self.sigma
+
+    @property
+    def coordinates(self) -> NDArray[np.int64]:
+        """The pixel coordinates along each axis, centered on zero."""
+        n = self.num_pixels
+        return np.arange(-(n // 2), (n - 1) // 2 + 1)
+
+
+DEFAULT_MODEL = SystemModel()
+
+
+@dataclass(frozen=True)
+class Reconstruction:
+    """The result of a reconstruction.
+
+    Attributes:
+        wavelengths: the wavelength axis in nanometers.
+        image: the hyperspectral image as a (y, x, wavelength) cube.
+        offsets: the (y, x) offset of each frame in reconstruction pixels.
+        system_matrix: the sparse system matrix.
+        iterations: the number of iterations of the solver.
+    """
+
+    wavelengths: NDArray[np.floating]
+    image: NDArray[np.floating]
+    offsets: NDArray[np.float64]
+    system_matrix: scipy.sparse.csr_matrix
+    iterations: int = 0
+
+    def save(self, path: str | PathLike[str]) -> None:
+        """Save the wavelengths, image and offsets to a `.npz` file."""
+        np.savez(
+            path,
+            wavelengths=self.wavelengths,
+            image=self.image,
+            offsets=self.offsets,
+        )
+
+
+def read_image(path: str | PathLike[str]) -> NDArray[np.float64]:
+    """Read a camera image as a grayscale image.
+
+    Args:
+        path: the path of the image file.
+
+    Returns:
+        The image. Color channels are averaged.
+    """
+    with Image.open(path) as image:
+        data = np.asarray(image, dtype=np.float64)
+    if data.ndim == 3:
+        # ignore an alpha channel
+        data = data[..., :3].mean(axis=2)
+    return data
+
+
+def image_path(directory: Path, index: int, prefix: str = IMAGE_PREFIX) -> Path:
+    """Return the path of a camera image of a scan."""
+    return directory / f"{prefix}_{index}.png"
+
+
+def count_images(directory: str | PathLike[str], prefix: str = IMAGE_PREFIX) -> int:
+    """Count the consecutively numbered camera images of a scan.
+
+    Args:
+        directory: the directory containing the images.
+        prefix: the file name prefix of the images.
+    """
+    count = 0
+    while image_path(Path(directory), count, prefix).is_file():
+        count += 1
+    return count
+
+
+def read_images(
+    directory: str | PathLike[str], count: int, prefix: str = IMAGE_PREFIX
+) -> Iterator[NDArray[np.float64]]:
+    """Read the camera images of a scan, one at a time.
+
+    Args:
+        directory: the directory containing the images.
+        count: the number of images.
+        prefix: the file name prefix of the images.
+    """
+    for index in range(count):
+        yield read_image(image_path(Path(directory), index, prefix))
+
+
+def find_offsets(
+    images: Iterable[NDArray[np.floating]],
+    reference: NDArray[np.floating],
+    roi: ROI | None = None,
+    downsample: int = 1,
+    subpixel: bool = True,
+    batch_size: int = 8,
+) -> NDArray[np.float64]:
+    """Find the offset of each image relative to a reference image.
+
+    The offset is the position of the peak of the circular cross-correlation,
+    computed using FFTs in batches of images.
+
+    Args:
+        images: the images, with the same shape as the reference.
+        reference: the reference image.
+        roi: the region of interest as (y_start, y_stop, x_start, x_stop) in
+            camera pixels. By default, the whole image is used.
+        downsample: the factor by which images are downsampled before
+            correlating them.
+        subpixel: if True, refine the offsets to sub-pixel precision.
+        batch_size: the number of images which are transformed at once.
+
+    Returns:
+        A (frames, 2) array with the (y, x) offset of each image in camera
+        pixels.
+    """
+    registration = ImageRegistration(
+        reference,
+        roi=roi,
+        downsample=downsample,
+        subpixel=subpixel,
+        batch_size=batch_size,
+    )
+    return registration.register(images)
+
+
+def system_matrix(
+    offsets: NDArray[np.floating], model: SystemModel = DEFAULT_MODEL
+) -> scipy.sparse.csr_matrix:
+    """Build the sparse system matrix from the fiber positions.
+
+    Row i holds the normalized fiber mask of frame i on the reconstruction
+    grid, flattened in (y, x) order. The masks of all frames are evaluated at
+    once, but only on the grid points inside their box, so the time and
+    memory needed are proportional to the number of nonzero elements instead
+    of the size of the grid.
+
+    Args:
+        offsets: a (frames, 2) array with the (y, x) position of the fiber in
+            reconstruction pixels for each frame.
+        model: the parameters of the grid and the fiber mask.
+
+    Returns:
+        A (frames, num_pixels²) CSR matrix.
+    """
+    n = model.num_pixels
+    width = model.boxing_width
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 2)
+    # the grid coordinates inside the open interval (offset - width, offset +
+    # width) along each axis, starting with the smallest one
+    window = np.arange(int(np.floor(2 * width)) + 1)
+    start = np.floor(offsets - width) + 1
+    y = start[:, 0, None, None] + window[:, None]
+    x = start[:, 1, None, None] + window
+    dy = y - offsets[:, 0, None, None]
+    dx = x - offsets[:, 1, None, None]
+    first = -(n // 2)
+    inside = (
+        (np.abs(dy) < width)
+        & (np.abs(dx) < width)
+        & (y >= first)
+        & (y < first + n)
+        & (x >= first)
+        & (x < first + n)
+    )
+
+    # (frames, window, window) blocks, of which only the inside is stored
+    masks = np.exp(-((np.hypot(dx, dy) / model.sigma) ** model.gaussian_order))
+    masks *= inside
+    totals = masks.sum(axis=(1, 2), keepdims=True)
+    np.divide(masks, totals, out=masks, where=totals > 0)
+
+    counts = inside.sum(axis=(1, 2))
+    indptr = np.zeros(len(offsets) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    columns = (y - first) * n + (x - first)
+    return scipy.sparse.csr_matrix(
+        (masks[inside], columns[inside].astype(np.int64), indptr),
+        shape=(len(offsets), n**2),
+    )
+
+
+def load_spectra(
+    path: str | PathLike[str], count: int
+) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """Load the spectra of a scan into an IFU matrix.
+
+    The spectra can be stored in a cube file written by `usb2000zz.py`
+    (frame indexes 1 to count), in a directory of `spectrum_<index>.mat` files
+    or in a raw spectrum log (one record per frame, in order). Missing frames
+    are left zero.
+
+    Args:
+        path: the cube file, directory or raw spectrum log.
+        count: the number of frames.
+
+    Returns:
+        A tuple of the wavelengths and a (frames, wavelengths) array with the
+        intensities of each frame.
+
+    Raises:
+        ValueError: the file is not a cube or a raw spectrum log.
+        FileNotFoundError: the directory does not contain any spectrum.
+    """
+    path = Path(path)
+    if path.is_dir():
+        wavelengths = None
+        spectra: dict[int, NDArray[np.float64]] = {}
+        for index in range(count):
+            mat_path = path / f"{SPECTRUM_PREFIX}_{index + 1}.mat"
+            if not mat_path.is_file():
+                continue
+            contents = scipy.io.loadmat(mat_path)
+            spectra[index] = np.ravel(contents["spectrum"]).astype(np.float64)
+            wavelengths = np.ravel(contents["wavelength"])
+        if wavelengths is None:
+            raise FileNotFoundError(f"No spectra found in {path}.")
+        ifu = np.zeros((count, len(wavelengths)))
+        for index, spectrum in spectra.items():
+            ifu[index] = spectrum
+        return wavelengths, ifu
+    elif path.suffix == ".h5":
+        with SpectralCube(path) as cube:
+            # read all spectra at once
+            intensities = cube.intensities()
+            frames = cube.indexes - 1
+            wavelengths = cube.wavelengths
+        ifu = np.zeros((count, intensities.shape[1]))
+        valid = (frames >= 0) & (frames < count)
+        ifu[frames[valid]] = intensities[valid]
+        return wavelengths, ifu
+    else:
+        log = RawLog(path)
+        ifu = np.zeros((count, len(log.wavelengths)))
+        recorded = log.intensities(slice(count))
+        ifu[: len(recorded)] = recorded
+        return log.wavelengths, ifu
+
+
+def back_project(
+    matrix: scipy.sparse.csr_matrix,
+    ifu: NDArray[np.floating],
+    model: SystemModel = DEFAULT_MODEL,
+) -> NDArray[np.float64]:
+    """Back-project the spectra onto the reconstruction grid.
+
+    Args:
+        matrix: the system matrix.
+        ifu: a (frames, wavelengths) array with the spectrum of each frame.
+        model: the parameters of the grid.
+
+    Returns:
+        The (y, x, wavelength) cube Aᵀ·ifu.
+    """
+    image = matrix.T @ ifu
+    return np.asarray(image).reshape(model.num_pixels, model.num_pixels, -1)
+
+
+def estimate_image(
+    matrix: scipy.sparse.csr_matrix,
+    ifu: NDArray[np.floating],
+    model: SystemModel = DEFAULT_MODEL,
+) -> NDArray[np.float64]:
+    """Estimate the image by back-projection, normalized by the coverage.
+
+    Each pixel is the weighted mean of the spectra of the frames which cover
+    it, which is a good initial estimate for the iterative solvers. Pixels
+    which are not covered by any frame are zero.
+
+    Args:
+        matrix: the system matrix.
+        ifu: a (frames, wavelengths) array with the spectrum of each frame.
+        model: the parameters of the grid.
+
+    Returns:
+        The (y, x, wavelength) cube.
+    """
+    coverage = np.asarray(matrix.sum(axis=0)).ravel()
+    image = matrix.T @ ifu
+    np.divide(image, coverage[:, None], out=image, where=coverage[:, None] > 0)
+    return np.asarray(image).reshape(model.num_pixels, model.num_pixels, -1)
+
+
+def reconstruct(
+    directory: str | PathLike[str],
+    spectra: str | PathLike[str] | None = None,
+    count: int | None = None,
+    reference: int = 0,
+    model: SystemModel = DEFAULT_MODEL,
+    prefix: str = IMAGE_PREFIX,
+    roi: ROI | None = None,
+    downsample: int = 1,
+    subpixel: bool = True,
+    batch_size: int = 8,
+    workers: int | None = None,
+    method: str = "backproject",
+    initial: NDArray[np.floating] | None = None,
+    solver_options: Mapping[str, Any] | None = None,
+) -> Reconstruction:
+    """Reconstruct a hyperspectral image from a scan.
+
+    Args:
+        directory: the directory containing the camera images.
+        spectra: the cube file, directory of .mat files or raw spectrum log
+            with the spectra. Defaults to `spectra.h5` in the directory, if it
+            exists, or else the .mat files in the directory.
+        count: the number of frames. Defaults to the number of consecutively
+            numbered images.
+        reference: the number of the reference image.
+        model: the parameters of the grid and the fiber mask.
+        prefix: the file name prefix of the images.
+        roi: the region of interest of the registration as (y_start, y_stop,
+            x_start, x_stop) in camera pixels.
+        downsample: the factor by which images are downsampled before they are
+            registered.
+        subpixel: if True, register the images with sub-pixel precision.
+        batch_size: the number of images which each thread registers at once.
+        workers: the number of threads which read and register images.
+            Defaults to the number of CPUs.
+        method: "backproject" to back-project the spectra, or the name of one
+            of the solvers in `deadsea_optics.solvers`.
+        initial: the (y, x, wavelength) initial estimate of the iterative
+            solvers, e.g. the image of a previous reconstruction. Defaults to
+            the back-projection normalized by the coverage.
+        solver_options: further arguments of the solver, e.g.
+            `regularization` or `max_iterations`.
+
+    Returns:
+        The reconstruction.
+
+    Raises:
+        FileNotFoundError: no images or spectra were found.
+        ValueError: the registration parameters or the method are invalid.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, use one of {', '.join(METHODS)}.")
+    directory = Path(directory)
+    if count is None:
+        count = count_images(directory, prefix)
+    if count == 0:
+        raise FileNotFoundError(f"No images found in {directory}.")
+    if spectra is None:
+        cube_path = directory / CUBE_NAME
+        spectra = cube_path if cube_path.is_file() else directory
+
+    registration = ImageRegistration(
+        read_image(image_path(directory, reference, prefix)),
+        roi=roi,
+        downsample=downsample,
+        subpixel=subpixel,
+        batch_size=batch_size,
+    )
+    offsets = np.asarray(
+        registration.register_parallel(
+            lambda index: read_image(image_path(directory, index, prefix)),
+            count,
+            workers=workers,
+        )
+        / model.binning,
+        dtype=np.float64,
+    )
+    matrix = system_matrix(offsets, model)
+    wavelengths, ifu = load_spectra(spectra, count)
+    iterations = 0
+    if method == "backproject":
+        image = back_project(matrix, ifu, model)
+    else:
+        if initial is None:
+            initial = estimate_image(matrix, ifu, model)
+        solution = solvers.solve(
+            method,
+            matrix,
+            ifu,
+            (model.num_pixels, model.num_pixels),
+            x0=np.reshape(initial, (model.num_pixels**2, -1)),
+            **(solver_options or {}),
+        )
+        image = solution.x.reshape(model.num_pixels, model.num_pixels, -1)
+        iterations = solution.iterations
+    return Reconstruction(
+        wavelengths=wavelengths,
+        image=image,
+        offsets=offsets,
+        system_matrix=matrix,
+        iterations=iterations,
+    )
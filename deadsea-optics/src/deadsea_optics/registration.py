@@ -0,0 +1,245 @@
+"""Registration of camera images against a reference image.
+
+The offset of an image is the position of the peak of its circular
+cross-correlation with the reference, computed using FFTs. `ImageRegistration`
+transforms the reference once, when it is created, and processes images in
+batches using real-to-complex FFTs in single precision:
+
+    registration = ImageRegistration(reference, downsample=2)
+    offsets = registration.register(images)
+
+Registering images is independent for each image, so `register_parallel()`
+spreads chunks of images over a pool of threads. Each thread loads its images,
+e.g. by decoding PNG files, and writes their offsets into a shared array. Both
+Pillow and the SciPy FFTs release the GIL while they work, so threads run on
+multiple cores without copying images between processes:
+
+    offsets = registration.register_parallel(load_image, count, workers=8)
+
+The correlation can be restricted to a region of interest and computed on
+downsampled images, which is much faster for large images with small offsets,
+and the peak can be refined to sub-pixel precision by fitting a parabola
+through the peak and its neighbours along each axis.
+"""
+
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.fft
+from numpy.typing import NDArray
+
+__all__ = ["ImageRegistration"]
+
+# (y_start, y_stop, x_start, x_stop) of a region of interest
+ROI = tuple[int, int, int, int]
+
+
+class ImageRegistration:
+    """Find the offsets of images relative to a reference image."""
+
+    def __init__(
+        self,
+        reference: NDArray[np.number],
+        roi: ROI | None = None,
+        downsample: int = 1,
+        subpixel: bool = True,
+        batch_size: int = 8,
+    ) -> None:
+        """Prepare the registration against a reference image.
+
+        Args:
+            reference: the reference image.
+            roi: the region of interest as (y_start, y_stop, x_start, x_stop)
+                in pixels. By default, the whole image is used.
+            downsample: the factor by which images are downsampled, by
+                averaging blocks of pixels, before correlating them.
+            subpixel: if True, refine the offsets to sub-pixel precision.
+            batch_size: the number of images which are transformed at once.
+
+        Raises:
+            ValueError: the region of interest or the downsampling factor is
+                invalid.
+        """
+        if downsample < 1:
+            raise ValueError("The downsampling factor must be at least 1.")
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1.")
+        self.image_shape = reference.shape[:2]
+        self.roi = roi
+        self.downsample = downsample
+        self.subpixel = subpixel
+        self.batch_size = batch_size
+        prepared = self.prepare(reference)
+        if min(prepared.shape) < 3:
+            raise ValueError("The region of interest is too small.")
+        self.shape = prepared.shape
+        self._reference_fft = np.conj(scipy.fft.rfft2(prepared))
+
+    def prepare(self, image: NDArray[np.number]) -> NDArray[np.float32]:
+        """Crop and downsample an image, as it is correlated.
+
+        Args:
+            image: the image, with the shape of the reference image.
+
+        Returns:
+            The prepared image in single precision.
+
+        Raises:
+            ValueError: the image has a different shape than the reference.
+        """
+        if image.shape[:2] != self.image_shape:
+            raise ValueError(
+                f"Expected an image of {self.image_shape[0]}x{self.image_shape[1]}"
+                f" pixels, got {image.shape[0]}x{image.shape[1]}."
+            )
+        if image.ndim == 3:
+            image = image[..., :3].mean(axis=2)
+        if self.roi is not None:
+            y_start, y_stop, x_start, x_stop = self.roi
+            image = image[y_start:y_stop, x_start:x_stop]
+        k = self.downsample
+        if k > 1:
+            height, width = image.shape[0] // k, image.shape[1] // k
+            image = (
+                image[: height * k, : width * k]
+                .reshape(height, k, width, k)
+                .mean(axis=(1, 3))
+            )
+        return np.asarray(image, dtype=np.float32)
+
+    def register(self, images: Iterable[NDArray[np.number]]) -> NDArray[np.float64]:
+        """Find the offsets of images.
+
+        Images are read from the iterable one batch at a time, so only a
+        batch of images is kept in memory.
+
+        Args:
+            images: the images, with the shape of the reference image.
+
+        Returns:
+            A (frames, 2) array with the (y, x) offset of each image in pixels
+            of the original images.
+        """
+        batch = np.empty((self.batch_size, *self.shape), dtype=np.float32)
+        offsets = []
+        count = 0
+        for image in images:
+            batch[count] = self.prepare(image)
+            count += 1
+            if count == self.batch_size:
+                offsets.append(self.register_batch(batch))
+                count = 0
+        if count:
+            offsets.append(self.register_batch(batch[:count]))
+        if not offsets:
+            return np.zeros((0, 2))
+        return np.concatenate(offsets)
+
+    def register_parallel(
+        self,
+        load: Callable[[int], NDArray[np.number]],
+        count: int,
+        workers: int | None = None,
+    ) -> NDArray[np.float64]:
+        """Find the offsets of images using a pool of threads.
+
+        The images are split into chunks of `batch_size` images. Each thread
+        loads and registers a chunk at a time, so at most `workers` chunks of
+        images are kept in memory.
+
+        Args:
+            load: a function which returns the image with the given index.
+            count: the number of images, with indexes 0 to count - 1.
+            workers: the number of threads. Defaults to the number of CPUs.
+
+        Returns:
+            A (count, 2) array with the (y, x) offset of each image in pixels
+            of the original images.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        offsets = np.zeros((count, 2))
+        chunks = range(0, count, self.batch_size)
+        if workers == 1:
+            for start in chunks:
+                self._register_chunk(load, offsets, start)
+        else:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="registration"
+            ) as executor:
+                futures = [
+                    executor.submit(self._register_chunk, load, offsets, start)
+                    for start in chunks
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        return offsets
+
+    def _register_chunk(
+        self,
+        load: Callable[[int], NDArray[np.number]],
+        offsets: NDArray[np.float64],
+        start: int,
+    ) -> None:
+        stop = min(start + self.batch_size, len(offsets))
+        batch = np.empty((stop - start, *self.shape), dtype=np.float32)
+        for index in range(start, stop):
+            batch[index - start] = self.prepare(load(index))
+        offsets[start:stop] = self.register_batch(batch)
+
+    def register_batch(self, batch: NDArray[np.float32]) -> NDArray[np.float64]:
+        """Find the offsets of a batch of prepared images.
+
+        Args:
+            batch: a (frames, height, width) array of images, as returned by
+                `prepare()`.
+
+        Returns:
+            A (frames, 2) array with the (y, x) offset of each image in pixels
+            of the original images.
+        """
+        spectra = scipy.fft.rfft2(batch)
+        spectra *= self._reference_fft
+        correlation = np.abs(scipy.fft.irfft2(spectra, s=self.shape))
+        frames = np.arange(len(batch))
+        flat_peaks = np.argmax(correlation.reshape(len(batch), -1), axis=1)
+        peak_y, peak_x = np.unravel_index(flat_peaks, self.shape)
+        offsets: NDArray[np.float64] = np.column_stack([peak_y, peak_x]).astype(
+            np.float64
+        )
+
+        if self.subpixel:
+            height, width = self.shape
+            center = correlation[frames, peak_y, peak_x]
+            for axis, neighbours in enumerate(
+                [
+                    (
+                        correlation[frames, (peak_y - 1) % height, peak_x],
+                        correlation[frames, (peak_y + 1) % height, peak_x],
+                    ),
+                    (
+                        correlation[frames, peak_y, (peak_x - 1) % width],
+                        correlation[frames, peak_y, (peak_x + 1) % width],
+                    ),
+                ]
+            ):
+                before, after = neighbours
+                curvature = before - 2 * center + after
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    delta = np.where(
+                        curvature < 0, 0.5 * (before - after) / curvature, 0.0
+                    )
+                offsets[:, axis] += np.clip(delta, -0.5, 0.5)
+
+        # wrap circular shifts to [-size / 2, size / 2)
+        shape = np.array(self.shape)
+        offsets = (offsets + shape // 2) % shape - shape // 2
+        offsets *= self.downsample
+        return offsets
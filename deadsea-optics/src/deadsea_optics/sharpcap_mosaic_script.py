@@ -42,25 +42,42 @@ def slewDEC(duration: float = 1.0, rate: int = 1):
 	time.sleep(duration)
 	SharpCap.Mounts.SelectedMount.MoveAxis(1,0)
 
+# Trigger the spectrometer over a single persistent connection (see
+# deadsea_optics/trigger.py for the protocol)
+def wait_for_ack(sock):
+	reply = b""
+	while not reply.endswith(b"\n"):
+		chunk = sock.recv(64)
+		if not chunk:
+			break
+		reply += chunk
+	return reply
+def trigger_spectrometer(sock, index):
+	sock.sendall(f"TRIGGER {index}\n".encode())
+	return wait_for_ack(sock)
+
 # Main function
 step_in_dec_deg = 0.0036 # (25um spacing in 400EFL)
 step_in_ra_hour = 2.4e-4 # (25um spacing in 400EFL)
 spiral_radius = 32
 TRIGGER_HOST = "127.0.0.1"
 TRIGGER_PORT = 5555
+REPLY_TIMEOUT = 60.0 # seconds to wait for a trigger to be acknowledged, like the server
 RA_baseline = SharpCap.Mounts.SelectedMount.RA
 DEC_baseline = SharpCap.Mounts.SelectedMount.Dec
 SharpCap.Mounts.SelectedMount.Tracking = False
 x_coords, y_coords = generate_square_spiral_xy(spiral_radius)
 SharpCap.SelectedCamera.Controls.OutputFormat.Value = 'PNG files (*.png)'
 pwd = os.path.dirname(os.path.abspath(__file__))
+trigger_socket = socket.create_connection((TRIGGER_HOST, TRIGGER_PORT))
+trigger_socket.settimeout(REPLY_TIMEOUT)
+trigger_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 for ind_image in range(len(x_coords)):
 	# Capture an image
 	SharpCap.SelectedCamera.CaptureSingleFrameTo(pwd+'/results/solar_'+str(ind_image)+'.png')
-	# Trigger spectrometer
-	with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-	    s.connect((TRIGGER_HOST, TRIGGER_PORT))
-	    s.sendall(b"TRIGGER")
+	# Trigger spectrometer (spectra are numbered from 1) and wait until the
+	# spectrum is acquired before moving the mount
+	trigger_spectrometer(trigger_socket, ind_image + 1)
 	if ind_image < len(x_coords) -1:
 		delta_x = x_coords[ind_image + 1] - x_coords[ind_image]
 		delta_y = y_coords[ind_image + 1] - y_coords[ind_image]
@@ -68,4 +85,5 @@ for ind_image in range(len(x_coords)):
 			slewRA(rate = delta_x)
 		if delta_y is not 0:
 			slewDEC(rate = delta_y)
+trigger_socket.close()
 SharpCap.Mounts.SelectedMount.Tracking = True
\ No newline at end of file
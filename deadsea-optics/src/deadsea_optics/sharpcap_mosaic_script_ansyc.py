@@ -13,17 +13,35 @@ def slewDEC(duration: float = 1.0, rate: int = 1):
 	time.sleep(duration)
 	SharpCap.Mounts.SelectedMount.MoveAxis(1,0)
 
+# Trigger the spectrometer over a single persistent connection (see
+# deadsea_optics/trigger.py for the protocol)
+def wait_for_ack(sock):
+	reply = b""
+	while not reply.endswith(b"\n"):
+		chunk = sock.recv(64)
+		if not chunk:
+			break
+		reply += chunk
+	return reply
+def trigger_spectrometer(sock, index):
+	sock.sendall(f"TRIGGER {index}\n".encode())
+	return wait_for_ack(sock)
+
 # Main function (Start capture from the bottom left of the FOV)
 row_duration = 32 # 126s row duration will scan across the full solar disk
 num_rows = 64
 snapshot_interval = 0.4
 TRIGGER_HOST = "127.0.0.1"
 TRIGGER_PORT = 5555
+REPLY_TIMEOUT = 60.0 # seconds to wait for a trigger to be acknowledged, like the server
 RA_baseline = SharpCap.Mounts.SelectedMount.RA
 DEC_baseline = SharpCap.Mounts.SelectedMount.Dec
 SharpCap.Mounts.SelectedMount.Tracking = False
 SharpCap.SelectedCamera.Controls.OutputFormat.Value = 'PNG files (*.png)'
 pwd = os.path.dirname(os.path.abspath(__file__))
+trigger_socket = socket.create_connection((TRIGGER_HOST, TRIGGER_PORT))
+trigger_socket.settimeout(REPLY_TIMEOUT)
+trigger_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 ind_image = 0
 for ind_row in range(num_rows):
 	# start row timer
@@ -31,16 +49,15 @@ for ind_row in range(num_rows):
 	# start row scan
 	if ind_row % 2 == 0:
 		SharpCap.Mounts.SelectedMount.MoveAxis(0,2)
-	else
+	else:
 		SharpCap.Mounts.SelectedMount.MoveAxis(0,0)
 	while time.time() - time_start < row_duration:
 		# Capture an image
 		SharpCap.SelectedCamera.CaptureSingleFrameTo(pwd+'/results/solar_'+str(ind_image)+'.png')
-		# Trigger spectrometer
-		with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-		    s.connect((TRIGGER_HOST, TRIGGER_PORT))
-		    s.sendall(b"TRIGGER")
+		# Trigger spectrometer (spectra are numbered from 1)
+		trigger_spectrometer(trigger_socket, ind_image + 1)
 		ind_image = ind_image + 1
 		time.sleep(snapshot_interval)
 	slewDEC()
+trigger_socket.close()
 SharpCap.Mounts.SelectedMount.Tracking = True
\ No newline at end of file
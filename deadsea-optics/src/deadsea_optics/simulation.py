@@ -0,0 +1,361 @@
+"""Simulated Ocean Optics spectrometers for testing without hardware.
+
+`SimulatedSpectrometer` behaves like the PyUSB device of a USB2000 or
+USB2000+. It speaks the same command protocol on the same endpoints and sends
+spectra in the same packets as the real hardware, so the device classes run
+against it unchanged. Use `simulate()` to make `libusb_package.find()` return
+simulated devices:
+
+    with simulate(SimulatedSpectrometer("USB2000+", noise=2.0)):
+        experiment = SpectroscopyExperiment()
+
+Supported commands are initialize (0x01), set integration time (0x02), set
+shutdown mode (0x04), query configuration (0x05, including the saturation level
+at index 0x11) and request spectrum (0x09).
+"""
+
+import array
+import collections
+import errno
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import libusb_package
+import numpy as np
+import usb.core
+from numpy.typing import ArrayLike, NDArray
+
+__all__ = ["MODELS", "SimulatedSpectrometer", "simulate"]
+
+VENDOR_ID = 0x2457
+NUM_PIXELS = 2048
+NUM_DARK_PIXELS = 20
+SYNC_BYTE = b"\x69"
+
+
+@dataclass(frozen=True)
+class _Model:
+    product_id: int
+    endpoint_out: int
+    endpoint_in_cmd: int
+    endpoint_in_spectrum: int
+    spectrum_packet_size: int
+    saturation_level: int
+
+
+MODELS = {
+    # sends pixels as little-endian 16-bit values in 512-byte packets
+    "USB2000+": _Model(0x101E, 0x01, 0x81, 0x82, 512, 65535),
+    # sends 64-byte packets with the low and high bytes of 64 pixels in turn
+    "USB2000": _Model(0x1002, 0x02, 0x87, 0x82, 64, 4095),
+}
+
+CONFIGURATION = {
+    0: "SIM00001",
+    1: "339.5",
+    2: "0.3712",
+    3: "-1.59e-05",
+    4: "-1.02e-09",
+    5: "0",
+    6: "1",
+    7: "0",
+    8: "0",
+    9: "0",
+    10: "0",
+    11: "0",
+    12: "0",
+    13: "0",
+    14: "7",
+    15: "SIMULATED",
+    16: "",
+}
+
+# packets on the command endpoint are at most this large
+_CMD_PACKET_SIZE = 64
+# PyUSB uses this timeout if none is given
+_DEFAULT_TIMEOUT = 1000
+
+
+class SimulatedSpectrometer:
+    """A simulated USB2000 or USB2000+ spectrometer.
+
+    The simulated spectrum consists of a few emission lines on top of a dark
+    level, scaled by the integration time, with Gaussian read noise, and is
+    clipped to the saturation level of the device. Dark pixels only contain
+    the dark level and noise.
+
+    By default, the device is simulated in real time: requested spectra are
+    available after the integration time and reads without data wait for
+    their timeout before raising `usb.core.USBTimeoutError`. Disable
+    `realtime` to skip all waiting, e.g. in tests or to benchmark the host
+    side of the protocol.
+    """
+
+    def __init__(
+        self,
+        model: str = "USB2000+",
+        noise: float = 5.0,
+        latency: float = 0.0,
+        realtime: bool = True,
+        signal: ArrayLike | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Create the simulated device.
+
+        Args:
+            model: the simulated model, see `MODELS`.
+            noise: the standard deviation of the read noise in counts.
+            latency: the time in seconds between the end of the integration
+                and the spectrum becoming available, e.g. to simulate slow USB
+                transfers.
+            realtime: if False, spectra are available immediately and reads
+                time out immediately.
+            signal: the noiseless signal of the 2048 pixels in counts per
+                second. By default, a spectrum with a few emission lines is
+                used.
+            seed: the seed of the random number generator for the noise.
+        """
+        try:
+            self._model = MODELS[model]
+        except KeyError:
+            raise ValueError(f"Unknown model {model!r}.")
+        self.model = model
+        self.idVendor = VENDOR_ID
+        self.idProduct = self._model.product_id
+        # firmware version
+        self.bcdDevice = 0x0100
+        self.noise = noise
+        self.latency = latency
+        self.realtime = realtime
+        self.saturation_level = self._model.saturation_level
+
+        if signal is None:
+            pixels = np.arange(NUM_PIXELS)
+            signal = np.zeros(NUM_PIXELS)
+            for center, width, height in (400, 8, 0.6), (900, 15, 1.0), (1500, 5, 0.3):
+                signal += height * np.exp(-0.5 * ((pixels - center) / width) ** 2)
+            # reach 60% of the saturation level at an integration time of 100 ms
+            signal *= 6 * self.saturation_level
+        self.signal = np.array(signal, dtype=np.float64)
+        self.signal[:NUM_DARK_PIXELS] = 0
+        self.dark_level = 0.02 * self.saturation_level
+
+        self._rng = np.random.default_rng(seed)
+        self._spectrum = np.empty(NUM_PIXELS, dtype=np.float64)
+        self._lock = threading.Lock()
+        self.initialize()
+
+    def initialize(self) -> None:
+        """Reset the device to its power-on state, discarding pending data."""
+        with self._lock:
+            self.integration_time = 100_000
+            self.shutdown = False
+            self.spectra_requested = 0
+            self._cmd_packets: collections.deque[bytes] = collections.deque()
+            self._spectrum_packets: collections.deque[bytes] = collections.deque()
+            # times at which requested spectra become available
+            self._pending: collections.deque[float] = collections.deque()
+            self._busy_until = 0.0
+
+    def write(self, endpoint: int, data: bytes, timeout: int | None = None) -> int:
+        """Send a command to the device.
+
+        Args:
+            endpoint: the OUT endpoint.
+            data: the command bytes.
+            timeout: ignored, writes never time out.
+
+        Returns:
+            The number of bytes written.
+
+        Raises:
+            usb.core.USBError: invalid endpoint or command.
+        """
+        if endpoint != self._model.endpoint_out:
+            raise usb.core.USBError(
+                f"Invalid endpoint {endpoint:#x}", errno=errno.EPIPE
+            )
+        data = bytes(data)
+        command = data[:1]
+        if command == b"\x01":
+            self.initialize()
+        elif command == b"\x02":
+            value = int.from_bytes(data[1:], "little")
+            # the USB2000 accepts the integration time in milliseconds
+            self.integration_time = value * 1000 if self.model == "USB2000" else value
+        elif command == b"\x04":
+            self.shutdown = data[1:] == b"\x00\x00"
+        elif command == b"\x05" and len(data) == 2:
+            self._queue_command_reply(data)
+        elif command == b"\x09":
+            self._request_spectrum()
+        else:
+            raise usb.core.USBError(
+                f"Unsupported command {data.hex()}", errno=errno.EPIPE
+            )
+        return len(data)
+
+    def read(
+        self,
+        endpoint: int,
+        size_or_buffer: "int | array.array[int]",
+        timeout: int | None = None,
+    ) -> "array.array[int] | int":
+        """Read from the device.
+
+        Like PyUSB, a read returns whole packets until the requested size is
+        reached or a short packet is received, which ends a transfer.
+
+        Args:
+            endpoint: the IN endpoint.
+            size_or_buffer: the number of bytes to read, or a buffer to read
+                into.
+            timeout: the timeout in milliseconds.
+
+        Returns:
+            An array with the data, or the number of bytes read if a buffer
+            was given.
+
+        Raises:
+            usb.core.USBTimeoutError: no data was available before the timeout.
+            usb.core.USBError: invalid endpoint, or the first packet does not
+                fit in the requested size.
+        """
+        timeout = _DEFAULT_TIMEOUT if timeout is None else timeout
+        if endpoint == self._model.endpoint_in_cmd:
+            packets = self._cmd_packets
+            packet_size = _CMD_PACKET_SIZE
+            self._wait_for_data(packets, timeout, spectrum=False)
+        elif endpoint == self._model.endpoint_in_spectrum:
+            packets = self._spectrum_packets
+            packet_size = self._model.spectrum_packet_size
+            self._wait_for_data(packets, timeout, spectrum=True)
+        else:
+            raise usb.core.USBError(
+                f"Invalid endpoint {endpoint:#x}", errno=errno.EPIPE
+            )
+
+        if isinstance(size_or_buffer, int):
+            size = size_or_buffer
+        else:
+            size = len(memoryview(size_or_buffer).cast("B"))
+        data = bytearray()
+        with self._lock:
+            while packets and len(data) + len(packets[0]) <= size:
+                packet = packets.popleft()
+                data += packet
+                if len(packet) < packet_size:
+                    break
+            if not data:
+                raise usb.core.USBError("Overflow", errno=errno.EOVERFLOW)
+
+        if isinstance(size_or_buffer, int):
+            return array.array("B", data)
+        memoryview(size_or_buffer).cast("B")[: len(data)] = data
+        return len(data)
+
+    def get_spectrum(self) -> NDArray[np.uint16]:
+        """Generate a raw spectrum, including dark pixels.
+
+        Returns:
+            The raw pixel values, as they are sent by the device.
+        """
+        spectrum = self._spectrum
+        self._rng.standard_normal(out=spectrum)
+        spectrum *= self.noise
+        spectrum += self.dark_level
+        spectrum += self.signal * (self.integration_time / 1e6)
+        np.clip(spectrum, 0, self.saturation_level, out=spectrum)
+        return spectrum.astype(np.uint16)
+
+    def _queue_command_reply(self, command: bytes) -> None:
+        index = command[1]
+        if index == 0x11:
+            value = b"\x00" * 4 + self.saturation_level.to_bytes(2, "little")
+        else:
+            value = CONFIGURATION.get(index, "").encode()
+        with self._lock:
+            self._cmd_packets.append((command + value).ljust(17, b"\x00"))
+
+    def _request_spectrum(self) -> None:
+        now = time.monotonic()
+        ready_at = max(now, self._busy_until)
+        if self.realtime:
+            ready_at += self.integration_time / 1e6 + self.latency
+        with self._lock:
+            self.spectra_requested += 1
+            self._busy_until = ready_at
+            self._pending.append(ready_at)
+
+    def _wait_for_data(
+        self, packets: collections.deque[bytes], timeout: int, spectrum: bool
+    ) -> None:
+        """Wait until packets are available, or raise a timeout error."""
+        if packets:
+            return
+        if spectrum and self._pending:
+            delay = self._pending[0] - time.monotonic()
+            if delay <= timeout / 1000:
+                if delay > 0:
+                    time.sleep(delay)
+                self._pending.popleft()
+                self._queue_spectrum(self.get_spectrum())
+                return
+        if self.realtime:
+            time.sleep(timeout / 1000)
+        raise usb.core.USBTimeoutError(
+            "Operation timed out", error_code=-7, errno=errno.ETIMEDOUT
+        )
+
+    def _queue_spectrum(self, pixels: NDArray[np.uint16]) -> None:
+        if self.model == "USB2000":
+            # each pair of packets holds the low and high bytes of 64 pixels
+            size = self._model.spectrum_packet_size
+            bytes_ = pixels.astype("<u2").view(np.uint8).reshape(-1, size, 2)
+            data = bytes_.transpose(0, 2, 1).tobytes()
+        else:
+            data = pixels.astype("<u2").tobytes()
+        size = self._model.spectrum_packet_size
+        with self._lock:
+            self._spectrum_packets.extend(
+                data[start : start + size] for start in range(0, len(data), size)
+            )
+            self._spectrum_packets.append(SYNC_BYTE)
+
+
+@contextmanager
+def simulate(*devices: SimulatedSpectrometer) -> Iterator[list[SimulatedSpectrometer]]:
+    """Make `libusb_package.find()` return simulated devices.
+
+    Within the context, finding a device by vendor and product ID returns the
+    first simulated device with those IDs, or None.
+
+    Args:
+        devices: the simulated devices. By default, a single USB2000+ is
+            simulated.
+
+    Yields:
+        The list of simulated devices.
+    """
+    simulated = list(devices) or [SimulatedSpectrometer()]
+
+    def find(
+        idVendor: int | None = None, idProduct: int | None = None, **kwargs: object
+    ) -> SimulatedSpectrometer | None:
+        for device in simulated:
+            if idVendor in (None, device.idVendor) and idProduct in (
+                None,
+                device.idProduct,
+            ):
+                return device
+        return None
+
+    original = libusb_package.find
+    libusb_package.find = find
+    try:
+        yield simulated
+    finally:
+        libusb_package.find = original
@@ -0,0 +1,482 @@
+"""Regularized least-squares solvers for the hyperspectral reconstruction.
+
+The reconstruction solves A·X ≈ B for the image X, where A is the sparse
+(frames, pixels) system matrix and B the (frames, wavelengths) IFU matrix.
+Back-projection, X = Aᵀ·B, is fast but blurred. The solvers in this module
+treat all wavelengths as a single block of right-hand sides: a factorization
+or a Krylov iteration is set up once and every step applies A to all
+wavelengths at once, instead of solving each wavelength separately.
+
+- `tikhonov`: minimizes ‖AX - B‖² + λ‖X‖² directly, by factorizing the
+  smaller of AAᵀ + λI and AᵀA + λI once.
+- `cgls`: the same problem using conjugate gradients, which only needs
+  products with A and Aᵀ and so works for large grids.
+- `tv`: minimizes ‖AX - B‖² + λ·TV(X), with the total variation of each
+  wavelength image, which keeps edges sharp. The non-smooth total variation
+  is handled by iteratively reweighted least squares.
+- `nnls`: minimizes ‖AX - B‖² + λ‖X‖² subject to X ≥ 0, using accelerated
+  projected gradients (FISTA).
+
+The regularization parameter λ is given relative to the largest eigenvalue of
+AᵀA, so the same value works for different grids and binnings. The iterative
+solvers accept an initial estimate to start from and stop early when the
+solution of every wavelength has converged.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+from numpy.typing import NDArray
+
+__all__ = [
+    "METHODS",
+    "Solution",
+    "cgls",
+    "largest_eigenvalue",
+    "nnls",
+    "solve",
+    "tikhonov",
+    "tv",
+]
+
+# the largest matrix which `tikhonov` factorizes, AAᵀ or AᵀA
+MAX_DIRECT_SIZE = 8192
+
+
+@dataclass(frozen=True)
+class Solution:
+    """The solution of a least-squares problem.
+
+    Attributes:
+        x: the (pixels, wavelengths) solution.
+        iterations: the number of iterations. Zero for a direct solve.
+    """
+
+    x: NDArray[np.float64]
+    iterations: int = 0
+
+
+def largest_eigenvalue(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    iterations: int = 100,
+    tol: float = 1e-6,
+) -> float:
+    """Estimate the largest eigenvalue of AᵀA using power iteration.
+
+    Args:
+        matrix: the matrix A.
+        iterations: the maximum number of iterations.
+        tol: the relative change of the estimate at which to stop.
+
+    Returns:
+        The largest eigenvalue, i.e. the squared spectral norm of A.
+    """
+    vector = np.ones(matrix.shape[1]) / np.sqrt(matrix.shape[1])
+    eigenvalue = 0.0
+    for _ in range(iterations):
+        product = matrix.T @ (matrix @ vector)
+        estimate = float(np.linalg.norm(product))
+        if estimate == 0:
+            return 0.0
+        vector = product / estimate
+        if abs(estimate - eigenvalue) <= tol * estimate:
+            return estimate
+        eigenvalue = estimate
+    return eigenvalue
+
+
+def tikhonov(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    regularization: float = 1e-2,
+    eigenvalue: float | None = None,
+) -> Solution:
+    """Solve the Tikhonov-regularized problem by a single factorization.
+
+    Args:
+        matrix: the (frames, pixels) system matrix.
+        ifu: the (frames, wavelengths) right-hand sides.
+        regularization: the weight λ of ‖X‖², relative to the largest
+            eigenvalue of AᵀA. Must be positive.
+        eigenvalue: the largest eigenvalue of AᵀA, if it is known.
+
+    Returns:
+        The solution.
+
+    Raises:
+        ValueError: the regularization is not positive or the problem is too
+            large to factorize.
+    """
+    return Solution(_tikhonov_factorized(matrix, regularization, eigenvalue)(ifu))
+
+
+def _tikhonov_factorized(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    regularization: float,
+    eigenvalue: float | None,
+) -> Callable[[NDArray[np.floating]], NDArray[np.float64]]:
+    """Factorize the Tikhonov problem once, for solving many blocks."""
+    if regularization <= 0:
+        raise ValueError("The direct solver needs a positive regularization.")
+    frames, pixels = matrix.shape
+    if min(frames, pixels) > MAX_DIRECT_SIZE:
+        raise ValueError(
+            f"The problem is too large to factorize ({frames} frames and "
+            f"{pixels} pixels), use an iterative solver."
+        )
+    if eigenvalue is None:
+        eigenvalue = largest_eigenvalue(matrix)
+    damping = regularization * eigenvalue
+    if frames <= pixels:
+        # X = Aᵀ(AAᵀ + λI)⁻¹B, factorizing the smaller frames x frames matrix
+        normal = (matrix @ matrix.T).toarray() + damping * np.eye(frames)
+        factor = scipy.linalg.cho_factor(normal)
+
+        def solve_block(ifu: NDArray[np.floating]) -> NDArray[np.float64]:
+            return np.asarray(
+                matrix.T @ scipy.linalg.cho_solve(factor, ifu), dtype=np.float64
+            )
+
+    else:
+        normal = (matrix.T @ matrix).toarray() + damping * np.eye(pixels)
+        factor = scipy.linalg.cho_factor(normal)
+
+        def solve_block(ifu: NDArray[np.floating]) -> NDArray[np.float64]:
+            return np.asarray(
+                scipy.linalg.cho_solve(factor, matrix.T @ ifu), dtype=np.float64
+            )
+
+    return solve_block
+
+
+def cgls(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    regularization: float = 1e-2,
+    x0: NDArray[np.floating] | None = None,
+    tol: float = 1e-4,
+    max_iterations: int = 100,
+    eigenvalue: float | None = None,
+) -> Solution:
+    """Solve the Tikhonov-regularized problem using block CGLS.
+
+    Each wavelength has its own step sizes, but the products with A and Aᵀ
+    are computed for all wavelengths at once. A wavelength stops changing
+    when its residual of the normal equations, relative to ‖AᵀB‖, drops
+    below `tol`, and the iteration stops when all wavelengths have
+    converged. Without regularization, the number of iterations regularizes
+    the solution.
+
+    Args:
+        matrix: the (frames, pixels) system matrix.
+        ifu: the (frames, wavelengths) right-hand sides.
+        regularization: the weight λ of ‖X‖², relative to the largest
+            eigenvalue of AᵀA.
+        x0: the (pixels, wavelengths) initial estimate. Defaults to zero.
+        tol: the relative residual at which to stop.
+        max_iterations: the maximum number of iterations.
+        eigenvalue: the largest eigenvalue of AᵀA, if it is known.
+
+    Returns:
+        The solution.
+    """
+    ifu = np.asarray(ifu, dtype=np.float64)
+    damping = 0.0
+    if regularization:
+        if eigenvalue is None:
+            eigenvalue = largest_eigenvalue(matrix)
+        damping = regularization * eigenvalue
+    x = _initial(matrix, ifu, x0)
+    residual = ifu - matrix @ x
+    gradient = matrix.T @ residual - damping * x
+    direction = gradient.copy()
+    gamma = _column_norms2(gradient)
+    threshold = tol**2 * _column_norms2(matrix.T @ ifu)
+    active = gamma > threshold
+    iterations = 0
+    while iterations < max_iterations and active.any():
+        iterations += 1
+        product = matrix @ direction
+        delta = _column_norms2(product) + damping * _column_norms2(direction)
+        alpha = np.divide(gamma, delta, out=np.zeros_like(gamma), where=delta > 0)
+        alpha[~active] = 0
+        x += alpha * direction
+        residual -= alpha * product
+        gradient = matrix.T @ residual - damping * x
+        gamma_new = _column_norms2(gradient)
+        active &= gamma_new > threshold
+        beta = np.divide(gamma_new, gamma, out=np.zeros_like(gamma), where=gamma > 0)
+        direction = gradient + beta * direction
+        gamma = gamma_new
+    return Solution(x, iterations)
+
+
+def tv(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    shape: tuple[int, int],
+    regularization: float = 1e-2,
+    x0: NDArray[np.floating] | None = None,
+    tol: float = 1e-3,
+    max_iterations: int = 10,
+    inner_iterations: int = 5,
+    epsilon: float = 1e-2,
+    eigenvalue: float | None = None,
+) -> Solution:
+    """Solve the total variation regularized problem.
+
+    The total variation Σ √(|∇x|² + ε²) of each wavelength image is
+    approximated by a weighted quadratic around the current solution (lagged
+    diffusivity), and the weighted problem is solved using a few iterations
+    of block conjugate gradients, started from the current solution. Each
+    wavelength is scaled to unit RMS intensity, so the same regularization
+    applies to all wavelengths. The iteration stops when the relative change
+    of every wavelength image is below `tol`.
+
+    Args:
+        matrix: the (frames, pixels) system matrix.
+        ifu: the (frames, wavelengths) right-hand sides.
+        shape: the (y, x) shape of the image, with y * x pixels.
+        regularization: the weight λ of the total variation, relative to the
+            largest eigenvalue of AᵀA.
+        x0: the (pixels, wavelengths) initial estimate. Defaults to zero.
+        tol: the relative change at which to stop.
+        max_iterations: the maximum number of reweighting iterations.
+        inner_iterations: the number of conjugate gradient iterations for
+            each reweighting.
+        epsilon: the smoothing of the total variation at zero gradient,
+            relative to the RMS intensity.
+        eigenvalue: the largest eigenvalue of AᵀA, if it is known.
+
+    Returns:
+        The solution.
+    """
+    ifu = np.asarray(ifu, dtype=np.float64)
+    scale = np.sqrt(np.mean(ifu**2, axis=0))
+    scale[scale == 0] = 1
+    ifu = ifu / scale
+    if eigenvalue is None:
+        eigenvalue = largest_eigenvalue(matrix)
+    damping = regularization * eigenvalue
+    x = _initial(matrix, ifu, x0 / scale if x0 is not None else None)
+    rhs = matrix.T @ ifu
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        gradient_y, gradient_x = _gradient(x, shape)
+        weights = damping / np.sqrt(gradient_y**2 + gradient_x**2 + epsilon**2)
+
+        def normal(
+            v: NDArray[np.floating], weights: NDArray[np.float64] = weights
+        ) -> NDArray[np.float64]:
+            v_y, v_x = _gradient(v, shape)
+            v_y *= weights
+            v_x *= weights
+            result = np.asarray(matrix.T @ (matrix @ v), dtype=np.float64)
+            result += _divergence(v_y, v_x, shape)
+            return result
+
+        previous = x.copy()
+        x = _conjugate_gradients(normal, rhs, x, inner_iterations)
+        change = _column_norms2(x - previous)
+        if np.all(change <= tol**2 * np.maximum(_column_norms2(x), 1e-30)):
+            break
+    return Solution(x * scale, iterations)
+
+
+def nnls(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    regularization: float = 0.0,
+    x0: NDArray[np.floating] | None = None,
+    tol: float = 1e-3,
+    max_iterations: int = 50,
+    eigenvalue: float | None = None,
+) -> Solution:
+    """Solve the non-negative, optionally regularized, problem using FISTA.
+
+    Each step is a gradient step of size 1/L, with L the largest eigenvalue
+    of AᵀA + λI, followed by clipping negative values, with Nesterov
+    acceleration. The iteration stops when the relative change of every
+    wavelength image is below `tol`. Like CGLS, the iteration is
+    semi-convergent for noisy data: a good initial estimate and a limited
+    number of iterations give a smaller error than the converged solution.
+
+    Args:
+        matrix: the (frames, pixels) system matrix.
+        ifu: the (frames, wavelengths) right-hand sides.
+        regularization: the weight λ of ‖X‖², relative to the largest
+            eigenvalue of AᵀA.
+        x0: the (pixels, wavelengths) initial estimate. Negative values are
+            clipped. Defaults to zero.
+        tol: the relative change at which to stop.
+        max_iterations: the maximum number of iterations.
+        eigenvalue: the largest eigenvalue of AᵀA, if it is known.
+
+    Returns:
+        The solution.
+    """
+    ifu = np.asarray(ifu, dtype=np.float64)
+    if eigenvalue is None:
+        eigenvalue = largest_eigenvalue(matrix)
+    damping = regularization * eigenvalue
+    step = 1 / (1.01 * eigenvalue + damping) if eigenvalue > 0 else 0.0
+    x = np.maximum(_initial(matrix, ifu, x0), 0)
+    y = x.copy()
+    t = 1.0
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        gradient = matrix.T @ (matrix @ y - ifu) + damping * y
+        x_new = np.maximum(y - step * gradient, 0)
+        t_new = (1 + np.sqrt(1 + 4 * t**2)) / 2
+        difference = x_new - x
+        y = x_new + ((t - 1) / t_new) * difference
+        x, t = x_new, t_new
+        change = _column_norms2(difference)
+        if np.all(change <= tol**2 * np.maximum(_column_norms2(x), 1e-30)):
+            break
+    return Solution(x, iterations)
+
+
+METHODS: dict[str, Callable[..., Solution]] = {
+    "tikhonov": tikhonov,
+    "cgls": cgls,
+    "tv": tv,
+    "nnls": nnls,
+}
+
+
+def solve(
+    method: str,
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    shape: tuple[int, int],
+    block_size: int = 512,
+    x0: NDArray[np.floating] | None = None,
+    **kwargs: Any,
+) -> Solution:
+    """Solve for the image using one of the solvers.
+
+    The wavelengths are solved in blocks of `block_size` wavelengths, which
+    bounds the memory needed for large cubes. The largest eigenvalue of AᵀA,
+    and the factorization of the direct solver, are computed once for all
+    blocks.
+
+    Args:
+        method: the name of the solver, one of `METHODS`.
+        matrix: the (frames, pixels) system matrix.
+        ifu: the (frames, wavelengths) right-hand sides.
+        shape: the (y, x) shape of the image.
+        block_size: the number of wavelengths solved at once.
+        x0: the (pixels, wavelengths) initial estimate of the iterative
+            solvers.
+        kwargs: further arguments of the solver. The direct solver only uses
+            the regularization and ignores options of the iterative solvers.
+
+    Returns:
+        The solution. The number of iterations is the largest number used for
+        any block.
+
+    Raises:
+        ValueError: the method is unknown.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown solver {method!r}, use one of {', '.join(METHODS)}.")
+    solver = METHODS[method]
+    kwargs.setdefault("eigenvalue", largest_eigenvalue(matrix))
+    ifu = np.asarray(ifu, dtype=np.float64)
+    x = np.zeros((matrix.shape[1], ifu.shape[1]))
+    if solver is tikhonov:
+        solve_block = _tikhonov_factorized(
+            matrix, kwargs.get("regularization", 1e-2), kwargs["eigenvalue"]
+        )
+        for start in range(0, ifu.shape[1], block_size):
+            block = slice(start, start + block_size)
+            x[:, block] = solve_block(ifu[:, block])
+        return Solution(x)
+
+    if solver is tv:
+        kwargs["shape"] = shape
+    iterations = 0
+    for start in range(0, ifu.shape[1], block_size):
+        block = slice(start, start + block_size)
+        if x0 is not None:
+            kwargs["x0"] = x0[:, block]
+        solution = solver(matrix, ifu[:, block], **kwargs)
+        x[:, block] = solution.x
+        iterations = max(iterations, solution.iterations)
+    return Solution(x, iterations)
+
+
+def _initial(
+    matrix: scipy.sparse.sparray | scipy.sparse.spmatrix,
+    ifu: NDArray[np.floating],
+    x0: NDArray[np.floating] | None,
+) -> NDArray[np.float64]:
+    if x0 is None:
+        return np.zeros((matrix.shape[1], ifu.shape[1]))
+    return np.array(x0, dtype=np.float64).reshape(matrix.shape[1], ifu.shape[1])
+
+
+def _column_norms2(x: NDArray[np.floating]) -> NDArray[np.float64]:
+    return np.asarray(np.einsum("ij,ij->j", x, x), dtype=np.float64)
+
+
+def _gradient(
+    x: NDArray[np.floating], shape: tuple[int, int]
+) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+    """Forward differences of flattened images, zero at the far edges."""
+    image = x.reshape(*shape, -1)
+    gradient_y = np.empty_like(image)
+    gradient_x = np.empty_like(image)
+    np.subtract(image[1:], image[:-1], out=gradient_y[:-1])
+    gradient_y[-1] = 0
+    np.subtract(image[:, 1:], image[:, :-1], out=gradient_x[:, :-1])
+    gradient_x[:, -1] = 0
+    return gradient_y.reshape(x.shape), gradient_x.reshape(x.shape)
+
+
+def _divergence(
+    gradient_y: NDArray[np.floating],
+    gradient_x: NDArray[np.floating],
+    shape: tuple[int, int],
+) -> NDArray[np.floating]:
+    """The adjoint of `_gradient`, i.e. minus the divergence."""
+    g_y = gradient_y.reshape(*shape, -1)
+    g_x = gradient_x.reshape(*shape, -1)
+    result = np.zeros_like(g_y)
+    result[1:] = g_y[:-1]
+    result[:-1] -= g_y[:-1]
+    result[:, 1:] += g_x[:, :-1]
+    result[:, :-1] -= g_x[:, :-1]
+    return result.reshape(gradient_y.shape)
+
+
+def _conjugate_gradients(
+    operator: Callable[[NDArray[np.floating]], NDArray[np.float64]],
+    rhs: NDArray[np.float64],
+    x: NDArray[np.float64],
+    iterations: int,
+) -> NDArray[np.float64]:
+    """Block conjugate gradients, with separate step sizes for each column."""
+    residual = rhs - operator(x)
+    direction = residual.copy()
+    gamma = _column_norms2(residual)
+    for _ in range(iterations):
+        product = operator(direction)
+        curvature = np.einsum("ij,ij->j", direction, product)
+        alpha = np.divide(
+            gamma, curvature, out=np.zeros_like(gamma), where=curvature > 0
+        )
+        x = x + alpha * direction
+        residual -= alpha * product
+        gamma_new = _column_norms2(residual)
+        beta = np.divide(gamma_new, gamma, out=np.zeros_like(gamma), where=gamma > 0)
+        direction = residual + beta * direction
+        gamma = gamma_new
+    return x
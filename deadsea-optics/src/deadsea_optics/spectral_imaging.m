@@ -20,6 +20,7 @@ num_images=1024; % number of images/spectrum acquired
 num_wavelength=2027; % number of wavelength channels in each spectrum from usb2000zz.py
 image_prefix='solar';
 spectrum_prefix='spectrum';
+cube_file='./results/spectra.h5'; % written by usb2000zz.py, if OUTPUT_FORMAT='cube'
 
 %% Build system matrix
 % (xoffSet, yoffSet) denote the plate-solved coordinates in pixels
@@ -71,10 +72,18 @@ title('Sampling points');
 %% Reconstruct hyperspectral image
 % synthesize IFU image
 ifu=zeros(num_images,num_wavelength);
+if isfile(cube_file)
+% load all spectra at once, h5read returns (pixels x frames)
+raw=double(h5read(cube_file,'/raw')).'*h5readatt(cube_file,'/','scale');
+metadata=h5read(cube_file,'/metadata');
+[found,row]=ismember(1:num_images,metadata.index);
+ifu(found,:)=raw(row(found),:);
+else
 for ind_image=1:num_images
 ld=load(['./results/',spectrum_prefix,'_',num2str(ind_image),'.mat']);
 ifu(ind_image,:)=ld.spectrum;
 end
+end
 % image_recon_ifu=A\ifu;
 image_recon_ifu=A.'*ifu;
 image_recon=reshape(image_recon_ifu,length(y),length(x),[]);
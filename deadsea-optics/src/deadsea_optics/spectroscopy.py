@@ -1,8 +1,14 @@
-from typing import Iterator
+import threading
+import time
+from dataclasses import dataclass
+from os import PathLike
+from typing import Generator
 
 import numpy as np
 from numpy.typing import NDArray
 
+from deadsea_optics.instrumentation import instrumentation
+from deadsea_optics.rawlog import RawLogWriter
 from deadsea_optics.usb2000 import OceanOpticsUSB2000
 from deadsea_optics.usb2000plus import (
     AccessError,
@@ -13,21 +19,395 @@ from deadsea_optics.usb2000plus import (
 
 __all__ = [
     "AccessError",
+    "AcquisitionEngine",
     "DeviceNotFoundError",
+    "Frame",
+    "FrameBlock",
     "SpectroscopyExperiment",
+    "SpectrumAccumulator",
+    "SpectrumRingBuffer",
     "SpectrumTimeOutError",
 ]
 
 
+class SpectrumAccumulator:
+    """Running sum of spectra, with optional per-pixel mean and variance.
+
+    Spectra are added to a single preallocated sum, so memory use and the cost
+    of adding a spectrum do not depend on the number of spectra. If requested,
+    the per-pixel mean and variance are updated using Welford's algorithm.
+    """
+
+    count: int = 0
+
+    def __init__(self, track_variance: bool = False) -> None:
+        """Initialize the accumulator.
+
+        Args:
+            track_variance: if True, also keep track of the per-pixel variance.
+        """
+        self.track_variance = track_variance
+        self._sum: NDArray[np.float64] | None = None
+
+    def add(self, intensities: NDArray[np.number]) -> None:
+        """Add a spectrum.
+
+        Args:
+            intensities: the intensity data of the spectrum. All spectra should
+                have the same length.
+        """
+        if self._sum is None:
+            self._sum = np.zeros(len(intensities), dtype=np.float64)
+            if self.track_variance:
+                self._mean = np.zeros_like(self._sum)
+                self._m2 = np.zeros_like(self._sum)
+                self._delta = np.zeros_like(self._sum)
+                self._delta2 = np.zeros_like(self._sum)
+        self.count += 1
+        np.add(self._sum, intensities, out=self._sum)
+        if self.track_variance:
+            np.subtract(intensities, self._mean, out=self._delta)
+            np.divide(self._delta, self.count, out=self._delta2)
+            np.add(self._mean, self._delta2, out=self._mean)
+            np.subtract(intensities, self._mean, out=self._delta2)
+            np.multiply(self._delta, self._delta2, out=self._delta2)
+            np.add(self._m2, self._delta2, out=self._m2)
+
+    @property
+    def sum(self) -> NDArray[np.float64]:
+        """The sum of all spectra.
+
+        This is the accumulator itself, which is updated in place by `add()`.
+        """
+        if self._sum is None:
+            raise ValueError("No spectra were added.")
+        return self._sum
+
+    @property
+    def mean(self) -> NDArray[np.float64]:
+        """The per-pixel mean of all spectra."""
+        return np.divide(self.sum, self.count, dtype=np.float64)
+
+    @property
+    def variance(self) -> NDArray[np.float64]:
+        """The per-pixel (sample) variance of all spectra."""
+        if not self.track_variance:
+            raise ValueError("The variance is not tracked by this accumulator.")
+        if self.count < 2:
+            return np.full_like(self.sum, np.nan)
+        return np.divide(self._m2, self.count - 1, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class Frame:
+    """A single raw spectrum in a ring buffer."""
+
+    sequence: int
+    timestamp: float
+    data: NDArray[np.uint16]
+
+
+@dataclass(frozen=True)
+class FrameBlock:
+    """Consecutive raw spectra in a ring buffer.
+
+    All arrays are views on the ring buffer, with one row per spectrum. `start`
+    is the sequence number of the first spectrum, as it was when the block was
+    read.
+    """
+
+    sequences: NDArray[np.int64]
+    timestamps: NDArray[np.float64]
+    data: NDArray[np.uint16]
+    start: int
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+
+class SpectrumRingBuffer:
+    """Fixed-size ring buffer of raw spectra.
+
+    The buffer is written by a single thread. Spectra are copied into
+    preallocated arrays and published by incrementing `write_count`, so readers
+    never take a lock and never copy data. The buffer has one slot more than
+    its capacity, which the writer fills while the last `capacity` spectra stay
+    readable. Frames returned by the reading methods are views on the buffer
+    and remain valid until the writer wraps around, which happens after
+    `capacity` more spectra are written.
+    """
+
+    write_count: int = 0
+
+    def __init__(self, capacity: int, num_pixels: int) -> None:
+        """Allocate the buffer.
+
+        Args:
+            capacity: the maximum number of spectra in the buffer.
+            num_pixels: the number of pixels of each spectrum.
+        """
+        self.capacity = capacity
+        # one spare slot, which is written while the others are read
+        self._slots = capacity + 1
+        self.frames = np.zeros((self._slots, num_pixels), dtype=np.uint16)
+        self.sequences = np.full(self._slots, -1, dtype=np.int64)
+        self.timestamps = np.zeros(self._slots, dtype=np.float64)
+
+    def write(self, data: NDArray[np.uint16], timestamp: float) -> int:
+        """Copy a spectrum into the buffer, overwriting the oldest spectrum.
+
+        Args:
+            data: the raw spectrum.
+            timestamp: the time at which the spectrum was acquired.
+
+        Returns:
+            The sequence number of the spectrum.
+        """
+        sequence = self.write_count
+        slot = sequence % self._slots
+        # mark the slot as invalid while it is being written
+        self.sequences[slot] = -1
+        self.frames[slot, : len(data)] = data
+        self.timestamps[slot] = timestamp
+        self.sequences[slot] = sequence
+        self.write_count = sequence + 1
+        return sequence
+
+    def latest(self) -> Frame | None:
+        """Return the most recent spectrum.
+
+        Returns:
+            The most recent spectrum, or None if no spectrum was written yet.
+        """
+        if self.write_count == 0:
+            return None
+        slot = (self.write_count - 1) % self._slots
+        return Frame(
+            sequence=int(self.sequences[slot]),
+            timestamp=float(self.timestamps[slot]),
+            data=self.frames[slot],
+        )
+
+    def read(self, start: int) -> FrameBlock:
+        """Return spectra from a sequence number onwards.
+
+        Only consecutive spectra which are stored contiguously in the buffer are
+        returned. When the buffer wraps around, call this method again to read
+        the remaining spectra.
+
+        Args:
+            start: the sequence number of the first spectrum. If it was already
+                overwritten, the oldest available spectrum is used instead.
+
+        Returns:
+            A block of spectra, which is empty if no new spectra are available.
+        """
+        # both ends are computed from a single snapshot of the write count, so
+        # the block never includes the slot which is being written
+        end = self.write_count
+        start = max(start, end - self.capacity)
+        first_slot = start % self._slots
+        last_slot = first_slot + max(0, min(end - start, self._slots - first_slot))
+        return FrameBlock(
+            sequences=self.sequences[first_slot:last_slot],
+            timestamps=self.timestamps[first_slot:last_slot],
+            data=self.frames[first_slot:last_slot],
+            start=start,
+        )
+
+
+class AcquisitionEngine:
+    """Acquire spectra continuously on a dedicated reader thread.
+
+    Raw spectra are written into a `SpectrumRingBuffer`, so consumers are not
+    stalled by USB latency. A consumer can either look at the latest spectrum,
+    or drain all spectra acquired since the previous call. Spectra which were
+    overwritten before they were drained are counted in `dropped_frames`.
+
+    If a `RawLogWriter` is given, the reader thread also appends every raw
+    spectrum to the log, so all spectra are persisted regardless of how fast
+    they are consumed.
+
+    If reading a spectrum fails, e.g. with a USB error, the reader thread
+    stops and keeps the exception in `error`. It is raised once in the
+    consumer, by `wait_for_frame()` or `drain()` when no more spectra are
+    available, or else by `stop()`.
+    """
+
+    dropped_frames: int = 0
+    timeouts: int = 0
+    error: BaseException | None = None
+
+    def __init__(
+        self,
+        device: OceanOpticsUSB2000Plus,
+        capacity: int = 64,
+        log: RawLogWriter | None = None,
+        max_frames: int | None = None,
+    ) -> None:
+        """Initialize the engine.
+
+        Args:
+            device: the spectroscopy device.
+            capacity: the number of spectra in the ring buffer.
+            log: the log to which all raw spectra are appended.
+            max_frames: stop acquiring after this many spectra. By default,
+                spectra are acquired until the engine is stopped.
+        """
+        self.device = device
+        self.log = log
+        self.max_frames = max_frames
+        self.buffer = SpectrumRingBuffer(capacity, device._NUM_PIXELS)
+        self._read_position = 0
+        self._new_frame = threading.Event()
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._error_raised = False
+        self._thread: threading.Thread | None = None
+
+    @property
+    def frames_acquired(self) -> int:
+        """The number of spectra acquired since the engine was started."""
+        return self.buffer.write_count
+
+    def start(self) -> None:
+        """Start acquiring spectra."""
+        self._stop.clear()
+        self._finished.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop acquiring spectra and wait for the reader thread to finish.
+
+        Raises:
+            Exception: the error which stopped the reader thread, if it was not
+                raised by `wait_for_frame()` or `drain()` yet.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        # the error is raised once, after which the acquisition has just ended
+        if self.error is not None and not self._error_raised:
+            self._error_raised = True
+            raise self.error
+
+    def _run(self) -> None:
+        try:
+            self._acquire()
+        except Exception as exc:  # noqa: BLE001 (raised in the consumer thread)
+            self.error = exc
+        finally:
+            self._finished.set()
+            # wake up consumers waiting for a spectrum which will never come
+            self._new_frame.set()
+
+    def _acquire(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data = self.device.get_raw_spectrum()
+            except SpectrumTimeOutError:
+                self.timeouts += 1
+                continue
+            timer = instrumentation.start()
+            sequence = self.buffer.write(data, time.monotonic())
+            if timer is not None:
+                timer.mark("ring_buffer.write")
+            if self.log is not None:
+                self.log.append(
+                    sequence,
+                    time.time(),
+                    self.device.get_integration_time(),
+                    data,
+                    overflow=bool(data.max() >= self.device._config.saturation_level),
+                )
+                if timer is not None:
+                    timer.mark("rawlog.write")
+            self._new_frame.set()
+            if self.max_frames is not None and sequence + 1 >= self.max_frames:
+                break
+
+    def wait_for_frame(self, sequence: int, timeout: float | None = None) -> bool:
+        """Wait until a spectrum with a given sequence number is acquired.
+
+        Args:
+            sequence: the sequence number of the spectrum.
+            timeout: the maximum time to wait in seconds.
+
+        Returns:
+            True if the spectrum was acquired, False if the timeout expired or
+            the acquisition finished before the spectrum was acquired.
+
+        Raises:
+            Exception: the error which stopped the reader thread.
+        """
+        while self.buffer.write_count <= sequence:
+            if self._finished.is_set():
+                self._raise_error()
+                return False
+            self._new_frame.clear()
+            if self.buffer.write_count > sequence or self._finished.is_set():
+                continue
+            if not self._new_frame.wait(timeout):
+                return False
+        return True
+
+    def latest(self) -> Frame | None:
+        """Return the most recent spectrum, without copying.
+
+        Returns:
+            The most recent spectrum, or None if no spectrum was acquired yet.
+        """
+        return self.buffer.latest()
+
+    def drain(self) -> FrameBlock:
+        """Return all spectra acquired since the previous call, without copying.
+
+        If the buffer wrapped around since the previous call, the spectra which
+        were overwritten are added to `dropped_frames`. Because the ring buffer
+        is not contiguous in time, the returned block may not contain all
+        available spectra, so keep calling this method until the block is empty.
+
+        Returns:
+            A block of spectra, which is empty if no new spectra are available.
+
+        Raises:
+            Exception: the error which stopped the reader thread, once all
+                spectra have been drained.
+        """
+        block = self.buffer.read(self._read_position)
+        if len(block):
+            self.dropped_frames += block.start - self._read_position
+            self._read_position = block.start + len(block)
+        elif self._finished.is_set():
+            self._raise_error()
+        return block
+
+
 class SpectroscopyExperiment:
     stopped = True
     has_overflow: bool = False
+    acquisition: AcquisitionEngine | None = None
+
+    def __init__(self, bulk_read: bool = False, use_cache: bool = True) -> None:
+        """Open the first available spectroscopy device.
 
-    def __init__(self) -> None:
+        Args:
+            bulk_read: if True, read each spectrum in a single transfer into a
+                preallocated buffer. This is faster for continuous measurements.
+            use_cache: if True, use the cached configuration of the device, if
+                available, instead of querying all configuration parameters.
+        """
         try:
-            self.device = OceanOpticsUSB2000Plus()
+            self.device = OceanOpticsUSB2000Plus(
+                bulk_read=bulk_read, use_cache=use_cache
+            )
         except (DeviceNotFoundError, AccessError):
-            self.device = OceanOpticsUSB2000()
+            self.device = OceanOpticsUSB2000(bulk_read=bulk_read, use_cache=use_cache)
 
     def get_spectrum(self) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
         """Record a spectrum.
@@ -43,8 +423,8 @@ class SpectroscopyExperiment:
         return data
 
     def integrate_spectrum(
-        self, count: int
-    ) -> Iterator[tuple[NDArray[np.floating], NDArray[np.floating]]]:
+        self, count: int, track_variance: bool = False
+    ) -> Generator[tuple[NDArray[np.floating], NDArray[np.floating]], None, None]:
         """Record a spectrum by integrating over multiple measurements.
 
         Record an integrated spectrum using the spectrometer. This method acts
@@ -56,8 +436,14 @@ class SpectroscopyExperiment:
         the measurement, no further measurements are taken and the iterator will
         finish executing.
 
+        The spectra are summed in a `SpectrumAccumulator`, which is available
+        as the `accumulator` attribute during and after the measurement, so the
+        cost of each step does not depend on the number of measurements.
+
         Args:
             count: The number of measurements to perform.
+            track_variance: If True, also keep track of the per-pixel mean and
+                variance in the accumulator.
 
         Yields:
             A tuple of `np.ndarrays` with wavelength, intensity data. The
@@ -67,16 +453,114 @@ class SpectroscopyExperiment:
         """
         self.stopped = False
         self.has_overflow = False
-        all_spectra = []
+        self.accumulator = SpectrumAccumulator(track_variance=track_variance)
         for _ in range(count):
             wavelengths, intensities = self.device.get_spectrum()
+            timer = instrumentation.start()
             if self.device.has_overflow:
                 self.has_overflow = True
-            all_spectra.append(intensities)
-            yield wavelengths, np.sum(all_spectra, axis=0)
+            self.accumulator.add(intensities)
+            spectrum = self.accumulator.sum.copy()
+            if timer is not None:
+                timer.mark("accumulate")
+            yield wavelengths, spectrum
             if self.stopped:
                 break
 
+    def start_acquisition(
+        self,
+        capacity: int = 64,
+        log_path: str | PathLike[str] | None = None,
+        max_frames: int | None = None,
+    ) -> AcquisitionEngine:
+        """Start acquiring spectra continuously in the background.
+
+        Args:
+            capacity: the number of raw spectra kept in the ring buffer.
+            log_path: if given, append all raw spectra to a raw spectrum log
+                at this path. The log is closed by `stop_acquisition()`.
+            max_frames: stop acquiring after this many spectra.
+
+        Returns:
+            The running acquisition engine, which is also available as the
+            `acquisition` attribute.
+        """
+        self.stop_acquisition()
+        log = None
+        if log_path is not None:
+            config = self.device._config
+            log = RawLogWriter(
+                log_path,
+                num_pixels=self.device._NUM_PIXELS,
+                wavelength_coefficients=config.wavelength_calibration_coefficients,
+                scale=self.device._intensity_scale,
+                num_dark_pixels=self.device._NUM_DARK_PIXELS,
+            )
+        self.acquisition = AcquisitionEngine(
+            self.device, capacity=capacity, log=log, max_frames=max_frames
+        )
+        self.acquisition.start()
+        return self.acquisition
+
+    def stop_acquisition(self) -> None:
+        """Stop acquiring spectra in the background."""
+        if self.acquisition is not None:
+            acquisition, self.acquisition = self.acquisition, None
+            try:
+                acquisition.stop()
+            finally:
+                if acquisition.log is not None:
+                    acquisition.log.close()
+
+    def record(
+        self, path: str | PathLike[str], count: int | None = None, capacity: int = 64
+    ) -> Generator[int, None, None]:
+        """Record raw spectra continuously to a raw spectrum log.
+
+        This method acts as an iterator. Spectra are acquired and written to
+        the log by the acquisition engine, and the number of recorded spectra
+        is yielded as it increases. Stop iterating, or set the `stopped`
+        attribute to `True`, to stop recording. Use
+        `deadsea_optics.rawlog.RawLog` to read the log.
+
+        Args:
+            path: the path of the log. An existing file is overwritten.
+            count: the number of spectra to record. By default, spectra are
+                recorded until the recording is stopped.
+            capacity: the number of raw spectra kept in the ring buffer.
+
+        Yields:
+            The number of spectra recorded so far.
+        """
+        self.stopped = False
+        acquisition = self.start_acquisition(capacity, log_path=path, max_frames=count)
+        try:
+            recorded = 0
+            while count is None or recorded < count:
+                if acquisition.wait_for_frame(recorded, timeout=0.1):
+                    recorded = acquisition.frames_acquired
+                    yield recorded
+                if self.stopped:
+                    break
+        finally:
+            self.stop_acquisition()
+
+    def calibrate(
+        self, data: NDArray[np.uint16]
+    ) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+        """Calibrate a raw spectrum, e.g. from the acquisition engine.
+
+        Args:
+            data: the raw spectrum, including dark pixels.
+
+        Returns:
+            A tuple of `np.ndarrays` with wavelength, intensity data, like
+            `get_spectrum()`.
+        """
+        spectrum = self.device.calibrate(data)
+        self.has_overflow = self.device.has_overflow
+        return spectrum
+
     def set_integration_time(self, integration_time: int) -> None:
         """Set device integration time.
 
@@ -0,0 +1,289 @@
+"""Trigger service for synchronizing spectra with external acquisitions.
+
+Clients keep a TCP connection open and send newline-delimited commands:
+
+- `TRIGGER [index]`: acquire a spectrum. When the spectrum is acquired, the
+  server replies with `ACK <index> <timestamp>`, where the timestamp is the
+  acquisition time in seconds since the epoch. Clients may send multiple
+  triggers without waiting for the acknowledgements.
+- `SET_INTTIME <microseconds>`: set the integration time. The server replies
+  with `OK SET_INTTIME <microseconds>`.
+- `PING`: the server immediately replies with `PONG`.
+
+Invalid commands are answered with `ERR <message>`. For backwards
+compatibility, a connection which sends a bare `TRIGGER` and closes is also
+accepted.
+"""
+
+import queue
+import socket
+import socketserver
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Self
+
+TRIGGER_HOST = "127.0.0.1"
+TRIGGER_PORT = 5555
+# maximum time to wait for replies to queued requests after a client closes
+REPLY_TIMEOUT = 60.0
+
+__all__ = ["TriggerClient", "TriggerRequest", "TriggerServer"]
+
+
+@dataclass
+class TriggerRequest:
+    """A command which should be handled by the acquisition loop.
+
+    Attributes:
+        command: either `TRIGGER` or `SET_INTTIME`.
+        argument: the frame index or the integration time, if given.
+    """
+
+    command: str
+    argument: int | None
+    _send: Callable[[str], None] = field(repr=False)
+
+    def reply(self, message: str) -> None:
+        """Send a reply to the client which sent the request.
+
+        Replies to clients which have disconnected are silently dropped.
+        """
+        self._send(message)
+
+    def acknowledge(self, index: int, timestamp: float) -> None:
+        """Acknowledge a trigger.
+
+        Args:
+            index: the frame index of the acquired spectrum.
+            timestamp: the acquisition time in seconds since the epoch.
+        """
+        self.reply(f"ACK {index} {timestamp:.6f}")
+
+
+class _TriggerHandler(socketserver.StreamRequestHandler):
+    server: "_TCPServer"
+
+    def setup(self) -> None:
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lock = threading.Lock()
+        # number of queued requests which have not been replied to
+        self._pending = 0
+        self._replied = threading.Condition(self._lock)
+
+    def send(self, message: str) -> None:
+        with self._lock:
+            self._write(message)
+
+    def reply(self, message: str) -> None:
+        """Reply to a queued request."""
+        with self._lock:
+            self._write(message)
+            self._pending -= 1
+            self._replied.notify_all()
+
+    def _write(self, message: str) -> None:
+        try:
+            self.wfile.write(message.encode() + b"\n")
+        except (OSError, ValueError):
+            # the client has disconnected
+            pass
+
+    def handle(self) -> None:
+        # iterating stops at EOF, after returning an incomplete last line
+        for line in self.rfile:
+            command, *arguments = line.decode(errors="replace").split() or [""]
+            command = command.upper()
+            if command == "PING":
+                self.send("PONG")
+            elif command in ("TRIGGER", "SET_INTTIME"):
+                try:
+                    argument = int(arguments[0]) if arguments else None
+                except ValueError:
+                    self.send(f"ERR invalid argument for {command}")
+                    continue
+                if command == "SET_INTTIME" and argument is None:
+                    self.send("ERR SET_INTTIME requires an integration time")
+                    continue
+                with self._lock:
+                    self._pending += 1
+                self.server.requests.put(TriggerRequest(command, argument, self.reply))
+            elif command:
+                self.send(f"ERR unknown command {command}")
+        # a client may close its side of the connection and still wait for the
+        # replies, so keep the connection open until they are sent
+        with self._lock:
+            self._replied.wait_for(lambda: self._pending <= 0, timeout=REPLY_TIMEOUT)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    requests: "queue.Queue[TriggerRequest]"
+
+
+class TriggerServer:
+    """Accept trigger commands on persistent TCP connections.
+
+    Each connection is handled on its own thread. Triggers and integration
+    time changes are queued for the acquisition loop, which waits for them
+    using `get_request()` and is woken up as soon as a request arrives.
+    """
+
+    def __init__(self, host: str = TRIGGER_HOST, port: int = TRIGGER_PORT) -> None:
+        """Bind the server to an address.
+
+        Args:
+            host: the host name or IP address to listen on.
+            port: the port to listen on. Use 0 to pick a free port.
+        """
+        self._server = _TCPServer((host, port), _TriggerHandler)
+        self._server.requests = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """The host and port the server is listening on."""
+        host, port = self._server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> None:
+        """Start accepting connections on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop accepting connections and close the server."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.stop()
+
+    def get_request(self, timeout: float | None = None) -> TriggerRequest | None:
+        """Wait for the next request.
+
+        Args:
+            timeout: the maximum time to wait in seconds, or None to wait
+                indefinitely.
+
+        Returns:
+            The request, or None if the timeout expired.
+        """
+        try:
+            return self._server.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class TriggerClient:
+    """Send commands to a trigger server over a persistent connection."""
+
+    def __init__(
+        self,
+        host: str = TRIGGER_HOST,
+        port: int = TRIGGER_PORT,
+        timeout: float | None = 10.0,
+    ) -> None:
+        """Connect to a trigger server.
+
+        Args:
+            host: the host name or IP address of the server.
+            port: the port of the server.
+            timeout: the maximum time to wait for a reply in seconds.
+        """
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile("rb")
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def send(self, command: str) -> None:
+        """Send a command without waiting for the reply."""
+        self._socket.sendall(command.encode() + b"\n")
+
+    def read_reply(self) -> str:
+        """Wait for the next reply.
+
+        Raises:
+            ConnectionError: the server closed the connection.
+            RuntimeError: the server replied with an error.
+        """
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by trigger server.")
+        reply = line.decode().strip()
+        if reply.startswith("ERR"):
+            raise RuntimeError(reply.removeprefix("ERR").strip())
+        return reply
+
+    def send_trigger(self, index: int | None = None) -> None:
+        """Send a trigger without waiting for the acknowledgement.
+
+        Use `read_ack()` to read the acknowledgements, in the order in which
+        the triggers were sent.
+        """
+        self.send("TRIGGER" if index is None else f"TRIGGER {index}")
+
+    def read_ack(self) -> tuple[int, float]:
+        """Wait for the acknowledgement of a trigger.
+
+        Returns:
+            A tuple of the frame index and the acquisition timestamp.
+        """
+        _, index, timestamp = self.read_reply().split()
+        return int(index), float(timestamp)
+
+    def trigger(self, index: int | None = None) -> tuple[int, float]:
+        """Trigger an acquisition and wait until it is acquired.
+
+        Args:
+            index: the frame index. If not given, the server picks the index.
+
+        Returns:
+            A tuple of the frame index and the acquisition timestamp.
+        """
+        self.send_trigger(index)
+        return self.read_ack()
+
+    def set_integration_time(self, integration_time: int) -> None:
+        """Set the integration time in microseconds and wait until it is set."""
+        self.send(f"SET_INTTIME {integration_time}")
+        self.read_reply()
+
+    def ping(self) -> None:
+        """Check that the server is responding.
+
+        The server replies immediately, so don't ping while acknowledgements of
+        triggers are still outstanding.
+        """
+        self.send("PING")
+        self.read_reply()
@@ -1,27 +1,81 @@
 import libusb_package
 import numpy as np
-import matplotlib.pyplot as plt
 import usb.core
+import usb.util
 from numpy.typing import NDArray
 
-from usb2000plus import (
+from deadsea_optics.instrumentation import instrumentation
+from deadsea_optics.usb2000plus import (
     AccessError,
     DeviceNotFoundError,
     OceanOpticsUSB2000Plus,
     SpectrumTimeOutError,
 )
 
+PACKET_SIZE = 64
+NUM_PIXELS = 2048
+
+
+def deinterleave_packets(
+    data: bytes | bytearray | memoryview, out: NDArray[np.uint16] | None = None
+) -> NDArray[np.uint16]:
+    """Decode interleaved spectrum packets into pixel values.
+
+    The USB2000 sends a spectrum as pairs of 64-byte packets. The first packet
+    of each pair contains the least significant bytes of 64 pixels, the second
+    packet the most significant bytes. The bytes are reordered using strided
+    views, so no intermediate objects are created per pixel.
+
+    Args:
+        data: the packet data, without the trailing sync byte. Trailing bytes
+            which do not form a complete pair of packets are ignored.
+        out: an optional preallocated little-endian array which receives the
+            pixel values. It must be large enough to hold all pixels.
+
+    Returns:
+        An array with the pixel values. If `out` was given, this is a view on
+        (the first part of) `out`.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    num_pairs = len(raw) // (2 * PACKET_SIZE)
+    pairs = raw[: num_pairs * 2 * PACKET_SIZE].reshape(num_pairs, 2, PACKET_SIZE)
+    num_pixels = num_pairs * PACKET_SIZE
+    if out is None:
+        out = np.empty(num_pixels, dtype="<u2")
+    pixels = out[:num_pixels]
+    np.copyto(
+        pixels.view(np.uint8).reshape(num_pairs, PACKET_SIZE, 2),
+        pairs.transpose(0, 2, 1),
+    )
+    return pixels
+
 
 class OceanOpticsUSB2000(OceanOpticsUSB2000Plus):
     _ENDPOINT_OUT = 0x02
     _ENDPOINT_IN_CMD = 0x87
     _ENDPOINT_IN_SPECTRUM = 0x82
+    # the last decoded pixel is not part of the spectrum
+    _NUM_PIXELS = NUM_PIXELS - 1
+
+    def __init__(self, bulk_read: bool = False, use_cache: bool = True) -> None:
+        """Open the device.
 
-    def __init__(self) -> None:
+        Args:
+            bulk_read: if True, read the complete spectrum in a single transfer
+                into a preallocated buffer, instead of reading packet by packet.
+            use_cache: if True, use the cached configuration of the device, if
+                available, instead of querying all configuration parameters.
+        """
         self.device = libusb_package.find(idVendor=0x2457, idProduct=0x1002)
         if self.device is None:
             raise DeviceNotFoundError()
 
+        self.bulk_read = bulk_read
+        self._transfer = usb.util.create_buffer(self._TRANSFER_SIZE)
+        self._transfer_data = memoryview(self._transfer)[:-1]
+        # Decoded pixel values are written into this buffer for every spectrum
+        self._pixels = np.zeros(NUM_PIXELS, dtype="<u2")
+
         # Configuration is set automatically and setting it explicitly, as
         # required by the PyUSB documentation, messes up the device on Linux. On
         # that OS the first packet on each IN endpoint disappears into the void
@@ -44,7 +98,7 @@ class OceanOpticsUSB2000(OceanOpticsUSB2000Plus):
         # Set default integration time
         self.set_integration_time(self._integration_time)
 
-        self._config = self.get_configuration()
+        self.update_configuration(use_cache=use_cache)
 
     def set_integration_time(self, integration_time: int) -> None:
         """Set device integration time.
@@ -73,12 +127,18 @@ class OceanOpticsUSB2000(OceanOpticsUSB2000Plus):
     def get_raw_spectrum(self) -> NDArray[np.uint16]:
         """Record a raw spectrum, including dark pixels.
 
+        The returned array is a view on a buffer which is reused by the next
+        call, so copy the data if you need to keep it around.
+
         Returns:
             A tuple of `np.ndarrays` with wavelength, intensity data. The
             wavelengths are in pixels and the intensity is in arbitrary
             uncalibrated units.
         """
+        timer = instrumentation.start()
         self.device.write(self._ENDPOINT_OUT, b"\x09")
+        if timer is not None:
+            timer.mark("usb.write")
         # Don't sleep, because the device will automatically acquire two
         # additional spectra which will be available sooner than acquiring a
         # fresh one.
@@ -86,12 +146,23 @@ class OceanOpticsUSB2000(OceanOpticsUSB2000Plus):
         # microseconds, timeout is in milliseconds. Add 100 ms (default timeout)
         # to be sure.
         timeout = self._integration_time // 1_000 + 100
+        if self.bulk_read:
+            self._read_spectrum_transfer(timeout)
+            if timer is not None:
+                timer.mark("usb.transfer")
+            pixels = deinterleave_packets(self._transfer_data, out=self._pixels)
+            if timer is not None:
+                timer.mark("decode")
+            # the last pixel is not part of the spectrum
+            return pixels[:-1]
         packets = []
         for _ in range(64):
             try:
                 packets.append(
                     self.device.read(self._ENDPOINT_IN_SPECTRUM, 64, timeout).tobytes()
                 )
+                if timer is not None and len(packets) == 1:
+                    timer.mark("usb.first_packet")
                 # after waiting for the first packet, next timeout can be short
                 timeout = 100
             except usb.core.USBTimeoutError:
@@ -100,22 +171,24 @@ class OceanOpticsUSB2000(OceanOpticsUSB2000Plus):
             packets.append(
                 self.device.read(self._ENDPOINT_IN_SPECTRUM, 1, 100).tobytes()
             )
+        if timer is not None:
+            timer.mark("usb.read")
         try:
             assert packets[-1][-1] == 0x69
         except IndexError:
             # there was no data at all
             raise SpectrumTimeOutError("No data was received.")
 
-        pixels = []
-        for lsb_packet, msb_packet in zip(packets[0:-1:2], packets[1:-1:2]):
-            for lsb, msb in zip(lsb_packet, msb_packet):
-                pixels.append(bytes((lsb, msb)))
-
-        data = b"".join(pixels[:-1])
-        return np.frombuffer(data, dtype=np.uint16)
+        pixels = deinterleave_packets(b"".join(packets[:-1]), out=self._pixels)
+        if timer is not None:
+            timer.mark("decode")
+        # the last pixel is not part of the spectrum
+        return pixels[:-1]
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     dev = OceanOpticsUSB2000()
 
     x, data = dev.get_spectrum()
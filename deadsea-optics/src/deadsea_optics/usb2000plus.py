@@ -1,11 +1,18 @@
+import dataclasses
+import json
+import os
+import re
 from dataclasses import dataclass
+from pathlib import Path
 
 import libusb_package
 import numpy as np
-import plotext as plt
 import usb.core
+import usb.util
 from numpy.typing import NDArray
 
+from deadsea_optics.instrumentation import instrumentation
+
 
 class DeviceNotFoundError(Exception):
     """Raised when no compatible device is connected."""
@@ -31,22 +38,55 @@ class DeviceConfiguration:
     saturation_level: np.uint16
 
 
+def configuration_cache_dir() -> Path:
+    """Return the directory in which device configurations are cached.
+
+    The directory is given by the `DEADSEA_OPTICS_CACHE_DIR` environment
+    variable or, by default, `deadsea-optics` in the XDG cache directory.
+    """
+    if path := os.environ.get("DEADSEA_OPTICS_CACHE_DIR"):
+        return Path(path)
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "deadsea-optics"
+
+
 class OceanOpticsUSB2000Plus:
     _integration_time: int = 100
 
     _config: DeviceConfiguration
+    _wavelengths: NDArray[np.float64]
+    _intensity_scale: float
 
     _ENDPOINT_OUT = 0x01
     _ENDPOINT_IN_CMD = 0x81
     _ENDPOINT_IN_SPECTRUM = 0x82
+    # 2048 pixels of two bytes each, followed by the sync byte
+    _TRANSFER_SIZE = 4097
+    _NUM_PIXELS = 2048
+    # the first pixels are dark pixels and are not part of the spectrum
+    _NUM_DARK_PIXELS = 20
 
     has_overflow: bool = False
 
-    def __init__(self) -> None:
+    def __init__(self, bulk_read: bool = False, use_cache: bool = True) -> None:
+        """Open the device.
+
+        Args:
+            bulk_read: if True, read the complete spectrum in a single transfer
+                into a preallocated buffer, instead of reading packet by packet.
+            use_cache: if True, use the cached configuration of the device, if
+                available, instead of querying all configuration parameters.
+        """
         self.device = libusb_package.find(idVendor=0x2457, idProduct=0x101E)
         if self.device is None:
             raise DeviceNotFoundError()
 
+        self.bulk_read = bulk_read
+        self._transfer = usb.util.create_buffer(self._TRANSFER_SIZE)
+        self._transfer_pixels = np.frombuffer(
+            self._transfer, dtype="<u2", count=self._TRANSFER_SIZE // 2
+        )
+
         # Configuration is set automatically and setting it explicitly, as
         # required by the PyUSB documentation, messes up the device on Linux. On
         # that OS the first packet on each IN endpoint disappears into the void
@@ -70,7 +110,7 @@ class OceanOpticsUSB2000Plus:
         self.set_integration_time(self._integration_time)
 
         self.set_shutdown_mode()
-        self._config = self.get_configuration()
+        self.update_configuration(use_cache=use_cache)
 
     def set_integration_time(self, integration_time: int) -> None:
         """Set device integration time.
@@ -137,6 +177,77 @@ class OceanOpticsUSB2000Plus:
             saturation_level=saturation_level,
         )
 
+    def update_configuration(self, use_cache: bool = False) -> None:
+        """Query the configuration parameters and update the calibration.
+
+        The calibrated wavelength axis and the intensity scale factor are
+        computed once and reused for all spectra, until the configuration is
+        queried again.
+
+        Args:
+            use_cache: if True, only query the serial number and use the cached
+                configuration of the device with that serial number and
+                firmware version, if available. Queried configurations are
+                always cached.
+        """
+        config = None
+        if use_cache:
+            serial_number = self._query_configuration_parameter(0)
+            config = self._load_cached_configuration(serial_number)
+        if config is None:
+            config = self.get_configuration()
+            self._save_cached_configuration(config)
+        self._config = config
+        x = np.arange(self._NUM_PIXELS, dtype=np.float64)
+        c = self._config.wavelength_calibration_coefficients
+        wavelengths = c[0] + c[1] * x + c[2] * x**2 + c[3] * x**3
+        wavelengths.flags.writeable = False
+        self._wavelengths = wavelengths
+        # scale data, described as 'autonulling' in the manual.
+        self._intensity_scale = float(65535 / self._config.saturation_level)
+
+    def _configuration_cache_path(self, serial_number: str) -> Path:
+        """Return the path of the cached configuration of this device."""
+        firmware = int(getattr(self.device, "bcdDevice", 0))
+        serial_number = re.sub(r"[^\w.-]", "_", serial_number)
+        filename = f"{type(self).__name__}-{serial_number}-{firmware:04x}.json"
+        return configuration_cache_dir() / filename
+
+    def _load_cached_configuration(
+        self, serial_number: str
+    ) -> DeviceConfiguration | None:
+        """Load the cached configuration of this device.
+
+        Args:
+            serial_number: the serial number of the device.
+
+        Returns:
+            The configuration, or None if it is not cached or the cache is
+            invalid.
+        """
+        try:
+            with self._configuration_cache_path(serial_number).open() as f:
+                data = json.load(f)
+            config = DeviceConfiguration(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+        if config.serial_number != serial_number:
+            return None
+        config.saturation_level = np.uint16(config.saturation_level)
+        return config
+
+    def _save_cached_configuration(self, config: DeviceConfiguration) -> None:
+        """Cache the configuration of this device, if possible."""
+        data = dataclasses.asdict(config)
+        data["saturation_level"] = int(config.saturation_level)
+        path = self._configuration_cache_path(config.serial_number)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(data, indent=2))
+        except OSError:
+            # the cache is an optimization, the device works fine without it
+            pass
+
     def _query_configuration_parameter(self, index: int) -> str:
         """Query a configuration parameter.
 
@@ -181,24 +292,48 @@ class OceanOpticsUSB2000Plus:
             the resolution of the intensity 16 bits. The number of possible
             different intensity levels is the so-called 'saturation level'.
         """
-        data = self.get_raw_spectrum()
-        x = np.arange(len(data), dtype=np.float64)
-        c = self._config.wavelength_calibration_coefficients
-        x = c[0] + c[1] * x + c[2] * x**2 + c[3] * x**3
-        # scale data, described as 'autonulling' in the manual.
-        intensity = data * (65535 / self._config.saturation_level)
+        return self.calibrate(self.get_raw_spectrum())
+
+    def calibrate(
+        self, data: NDArray[np.uint16]
+    ) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+        """Calibrate a raw spectrum.
+
+        Args:
+            data: the raw spectrum, including dark pixels, as returned by
+                `get_raw_spectrum()`.
+
+        Returns:
+            A tuple of `np.ndarrays` with wavelength, intensity data, like
+            `get_spectrum()`. The wavelength array is shared between spectra
+            and is read-only.
+        """
+        timer = instrumentation.start()
+        intensity = data * self._intensity_scale
         self.has_overflow = bool(intensity.max() == 65535)
-        return x[20:], intensity[20:]
+        wavelengths = self._wavelengths[: len(data)]
+        if timer is not None:
+            timer.mark("calibrate")
+        return (
+            wavelengths[self._NUM_DARK_PIXELS :],
+            intensity[self._NUM_DARK_PIXELS :],
+        )
 
     def get_raw_spectrum(self) -> NDArray[np.uint16]:
         """Record a raw spectrum, including dark pixels.
 
+        When reading in bulk, the returned array is a view on a buffer which is
+        reused by the next call, so copy the data if you need to keep it around.
+
         Returns:
             A tuple of `np.ndarrays` with wavelength, intensity data. The
             wavelengths are in pixels and the intensity is in arbitrary
             uncalibrated units.
         """
+        timer = instrumentation.start()
         self.device.write(self._ENDPOINT_OUT, b"\x09")
+        if timer is not None:
+            timer.mark("usb.write")
         # Don't sleep, because the device will automatically acquire two
         # additional spectra which will be available sooner than acquiring a
         # fresh one.
@@ -206,12 +341,19 @@ class OceanOpticsUSB2000Plus:
         # microseconds, timeout is in milliseconds. Add 100 ms (default timeout)
         # to be sure.
         timeout = self._integration_time // 1_000 + 100
+        if self.bulk_read:
+            self._read_spectrum_transfer(timeout)
+            if timer is not None:
+                timer.mark("usb.transfer")
+            return self._transfer_pixels
         packets = []
         for _ in range(8):
             try:
                 packets.append(
                     self.device.read(self._ENDPOINT_IN_SPECTRUM, 512, timeout).tobytes()
                 )
+                if timer is not None and len(packets) == 1:
+                    timer.mark("usb.first_packet")
                 # after waiting for the first packet, next timeout can be short
                 timeout = 100
             except usb.core.USBTimeoutError:
@@ -220,10 +362,37 @@ class OceanOpticsUSB2000Plus:
             packets.append(
                 self.device.read(self._ENDPOINT_IN_SPECTRUM, 1, 100).tobytes()
             )
+        if timer is not None:
+            timer.mark("usb.read")
         assert packets[-1][-1] == 0x69
 
         data = b"".join(packets[:-1])
-        return np.frombuffer(data, dtype=np.uint16)
+        pixels = np.frombuffer(data, dtype=np.uint16)
+        if timer is not None:
+            timer.mark("decode")
+        return pixels
+
+    def _read_spectrum_transfer(self, timeout: int) -> None:
+        """Read a complete spectrum into the preallocated transfer buffer.
+
+        The device sends the spectrum, followed by the sync byte, as a single
+        bulk transfer. Reading it in one go avoids allocating new objects for
+        each packet.
+
+        Args:
+            timeout: the timeout for the transfer in milliseconds.
+
+        Raises:
+            SpectrumTimeOutError: no (complete) spectrum was received.
+        """
+        try:
+            num_bytes = self.device.read(
+                self._ENDPOINT_IN_SPECTRUM, self._transfer, timeout
+            )
+        except usb.core.USBTimeoutError:
+            raise SpectrumTimeOutError("No data was received.")
+        if num_bytes != self._TRANSFER_SIZE or self._transfer[-1] != 0x69:
+            raise SpectrumTimeOutError("Incomplete spectrum received.")
 
     def set_shutdown_mode(self) -> None:
         """Set shutdown (low power) mode."""
@@ -231,6 +400,8 @@ class OceanOpticsUSB2000Plus:
 
 
 if __name__ == "__main__":
+    import plotext as plt
+
     dev = OceanOpticsUSB2000Plus()
 
     x, data = dev.get_spectrum()
@@ -1,19 +1,24 @@
 from dataclasses import dataclass
-import socket
-import threading
+import time
 
 import libusb_package
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
 import usb.core
 from numpy.typing import NDArray
 from scipy.io import savemat
 
+from deadsea_optics.cube import SpectralCubeWriter
+from deadsea_optics.trigger import TriggerServer
+from deadsea_optics.usb2000 import NUM_PIXELS, deinterleave_packets
+from deadsea_optics.writer import FrameWriter
+
 TRIGGER_HOST = "127.0.0.1"
 TRIGGER_PORT = 5555
 EXPOSURE_TIME = 5000  # in microseconds, for solar observation
+REDRAW_INTERVAL = 1.0  # in seconds, redraw at least this often while busy
+# "cube" appends all spectra to CUBE_PATH, "mat" writes one .mat file per trigger
+OUTPUT_FORMAT = "mat"
+CUBE_PATH = "./results/spectra.h5"
 
 class DeviceNotFoundError(Exception):
     """Raised when no compatible device is connected."""
@@ -55,6 +60,9 @@ class OceanOpticsUSB2000zz:
         if self.device is None:
             raise DeviceNotFoundError()
 
+        # Decoded pixel values are written into this buffer for every spectrum
+        self._pixels = np.zeros(NUM_PIXELS, dtype="<u2")
+
         # Configuration is set automatically and setting it explicitly, as
         # required by the PyUSB documentation, messes up the device on Linux. On
         # that OS the first packet on each IN endpoint disappears into the void
@@ -199,6 +207,9 @@ class OceanOpticsUSB2000zz:
     def get_raw_spectrum(self) -> NDArray[np.uint16]:
         """Record a raw spectrum, including dark pixels.
 
+        The returned array is a view on a buffer which is reused by the next
+        call, so copy the data if you need to keep it around.
+
         Returns:
             A tuple of `np.ndarrays` with wavelength, intensity data. The
             wavelengths are in pixels and the intensity is in arbitrary
@@ -232,13 +243,9 @@ class OceanOpticsUSB2000zz:
             # there was no data at all
             raise SpectrumTimeOutError("No data was received.")
 
-        pixels = []
-        for lsb_packet, msb_packet in zip(packets[0:-1:2], packets[1:-1:2]):
-            for lsb, msb in zip(lsb_packet, msb_packet):
-                pixels.append(bytes((lsb, msb)))
-
-        data = b"".join(pixels[:-1])
-        return np.frombuffer(data, dtype=np.uint16)
+        pixels = deinterleave_packets(b"".join(packets[:-1]), out=self._pixels)
+        # the last pixel is not part of the spectrum
+        return pixels[:-1]
 
     def set_shutdown_mode(self) -> None:
         """Set shutdown (low power) mode."""
@@ -246,6 +253,12 @@ class OceanOpticsUSB2000zz:
 
 
 if __name__ == "__main__":
+    # Only needed for the live plot, so the device class can be imported on
+    # machines without a display
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+
     dev = OceanOpticsUSB2000zz()
     data_cum = np.zeros((2027,), dtype='float64')
     plt.ion()
@@ -253,30 +266,14 @@ if __name__ == "__main__":
     plt.xlabel('wavelength (nm)')
     plt.ylabel('intensity (a.u.)')
 
-    trigger_event = threading.Event()
-    stop_event = threading.Event()
-    x = np.empty(0)
-    data = np.empty(0)
-
-    def _trigger_server() -> None:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
-            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            srv.bind((TRIGGER_HOST, TRIGGER_PORT))
-            srv.listen()
-            srv.settimeout(1.0)
-            print(f"Listening for triggers on {TRIGGER_HOST}:{TRIGGER_PORT}")
-            while not stop_event.is_set():
-                try:
-                    conn, _ = srv.accept()
-                    with conn:
-                        msg = conn.recv(1024)
-                        if msg.strip() == b"TRIGGER":
-                            trigger_event.set()
-                except socket.timeout:
-                    continue
-
-    server_thread = threading.Thread(target=_trigger_server, daemon=True)
-    server_thread.start()
+    x: NDArray[np.floating] = np.empty(0)
+    data: NDArray[np.floating] = np.empty(0)
+
+    # Triggers are acknowledged as soon as the spectrum is acquired, so clients
+    # can keep a single connection open and pipeline their triggers.
+    server = TriggerServer(TRIGGER_HOST, TRIGGER_PORT)
+    server.start()
+    print(f"Listening for triggers on {TRIGGER_HOST}:{TRIGGER_PORT}")
 
     # Acquire and display an initial spectrum before waiting for triggers
     x, data = dev.get_spectrum()
@@ -287,24 +284,74 @@ if __name__ == "__main__":
     fig.canvas.draw()
     ind_image = 0 # index synced with SharpCap image index
 
+    # Spectra are saved on background threads, and the plot is redrawn after
+    # the trigger is acknowledged, so acquisition never waits for disk or plot.
+    if OUTPUT_FORMAT == "cube":
+        # The wavelength axis is stored once, the raw spectra (which this
+        # device does not scale) and per-frame metadata are appended
+        cube = SpectralCubeWriter(CUBE_PATH, x)
+
+        def save_spectrum(frame: tuple[int, float, int, NDArray[np.floating], NDArray[np.floating], NDArray[np.floating], bool]) -> None:
+            ind, timestamp, int_time, _wavelength, spectrum, _spectrum_cum, overflow = frame
+            cube.append(spectrum.astype(np.uint16), ind, timestamp, int_time, overflow)
+
+        # HDF5 files must be appended to in order, by a single thread
+        writer = FrameWriter(save_spectrum, workers=1)
+    else:
+
+        def save_spectrum(frame: tuple[int, float, int, NDArray[np.floating], NDArray[np.floating], NDArray[np.floating], bool]) -> None:
+            ind, _timestamp, _int_time, wavelength, spectrum, spectrum_cum, _overflow = frame
+            savemat(f"./results/spectrum_{ind}.mat", {"wavelength": wavelength, "spectrum": spectrum, "spectrum_cum": spectrum_cum})
+
+        writer = FrameWriter(save_spectrum, workers=2)
+
+    stalls = 0
+    plot_is_stale = False
+    last_redraw = time.monotonic()
+
     try:
         while True:
-            if trigger_event.is_set():
-                trigger_event.clear()
-                ind_image = ind_image + 1
+            # Wakes up as soon as a request arrives
+            request = server.get_request(timeout=0.05)
+            if request is not None and request.command == "SET_INTTIME":
+                # the server rejects SET_INTTIME without an integration time
+                assert request.argument is not None
+                dev.set_integration_time(request.argument)
+                request.reply(f"OK SET_INTTIME {request.argument}")
+            elif request is not None:
+                if request.argument is not None:
+                    ind_image = request.argument
+                else:
+                    ind_image = ind_image + 1
                 x, data = dev.get_spectrum()
+                timestamp = time.time()
+                request.acknowledge(ind_image, timestamp)
                 data_cum += data
-                line.set_data(x, data)
-                ax.relim()
-                ax.autoscale_view()
-                fig.canvas.draw()
-                savemat(f"./results/spectrum_{ind_image}.mat", {"wavelength": x, "spectrum": data, "spectrum_cum": data_cum})
-            fig.canvas.flush_events()
-            plt.pause(0.05)
+                writer.submit((ind_image, timestamp, dev.get_integration_time(), x, data, data_cum.copy(), dev.has_overflow))
+                plot_is_stale = True
+                if (stats := writer.statistics()).stalls > stalls:
+                    stalls = stats.stalls
+                    print(f"Saving spectra is falling behind, {stats.pending} spectra are waiting to be written.")
+            # Keep the plot responsive while waiting, but redraw at least every
+            # REDRAW_INTERVAL seconds while triggers keep coming in.
+            if request is None or time.monotonic() - last_redraw > REDRAW_INTERVAL:
+                if plot_is_stale:
+                    line.set_data(x, data)
+                    ax.relim()
+                    ax.autoscale_view()
+                    fig.canvas.draw_idle()
+                    plot_is_stale = False
+                fig.canvas.flush_events()
+                last_redraw = time.monotonic()
     except KeyboardInterrupt:
         print("Plotting stopped by user.")
     finally:
-        stop_event.set()
+        server.stop()
+        writer.close()
+        if OUTPUT_FORMAT == "cube":
+            cube.close()
+        stats = writer.statistics()
+        print(f"Saved {stats.written} spectra ({stats.failed} failed, at most {stats.max_pending} waiting).")
         plt.ioff()
         plt.close('all')
         if x.size > 0:
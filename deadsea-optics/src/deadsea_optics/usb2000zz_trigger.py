@@ -1,11 +1,10 @@
 """Send a software trigger to a running usb2000zz.py instance."""
 
-import socket
+from deadsea_optics.trigger import TriggerClient
 
 TRIGGER_HOST = "127.0.0.1"
 TRIGGER_PORT = 5555
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.connect((TRIGGER_HOST, TRIGGER_PORT))
-    s.sendall(b"TRIGGER")
-    # print("Trigger sent.")
\ No newline at end of file
+with TriggerClient(TRIGGER_HOST, TRIGGER_PORT) as client:
+    index, timestamp = client.trigger()
+    # print(f"Trigger {index} acquired at {timestamp}.")
@@ -0,0 +1,84 @@
+"""Fixed-size history of spectra for a waterfall view.
+
+`WaterfallBuffer` is a ring buffer with a row for each spectrum. Every row is
+stored twice, in a buffer of twice the number of rows, so the history from
+oldest to newest is always a contiguous slice of the buffer. Appending a
+spectrum writes two rows in place and showing the history needs no copy,
+however many rows there are.
+"""
+
+import threading
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+__all__ = ["WaterfallBuffer"]
+
+
+class WaterfallBuffer:
+    """Thread-safe ring buffer of the most recent spectra."""
+
+    def __init__(self, rows: int, dtype: DTypeLike = np.float32) -> None:
+        """Create an empty buffer.
+
+        The buffer is allocated when the first spectrum is appended, because
+        the number of pixels depends on the device.
+
+        Args:
+            rows: the number of spectra to keep.
+            dtype: the data type of the stored intensities.
+        """
+        if rows < 1:
+            raise ValueError("A waterfall buffer needs at least one row.")
+        self.rows = rows
+        self.dtype = np.dtype(dtype)
+        self._data: NDArray[np.generic] | None = None
+        self._head = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, spectrum: NDArray[np.number]) -> None:
+        """Append a spectrum, replacing the oldest one if the buffer is full.
+
+        Args:
+            spectrum: the intensities of the spectrum.
+
+        Raises:
+            ValueError: the spectrum has a different number of pixels than
+                the spectra in the buffer.
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = np.zeros((2 * self.rows, len(spectrum)), self.dtype)
+            elif len(spectrum) != self._data.shape[1]:
+                raise ValueError(
+                    f"Expected a spectrum of {self._data.shape[1]} pixels, "
+                    f"got {len(spectrum)}."
+                )
+            self._data[self._head] = spectrum
+            self._data[self._head + self.rows] = spectrum
+            self._head = (self._head + 1) % self.rows
+            self.count = min(self.count + 1, self.rows)
+
+    def view(self) -> NDArray[np.generic] | None:
+        """Return the history, from oldest to newest spectrum, without copying.
+
+        Rows which have not been filled yet are zero. The returned array is a
+        view on the buffer, so appending a spectrum overwrites its oldest row.
+
+        Returns:
+            An array with a row for each spectrum, or None if no spectrum was
+            appended yet.
+        """
+        with self._lock:
+            if self._data is None:
+                return None
+            return self._data[self._head : self._head + self.rows]
+
+    def clear(self) -> None:
+        """Remove all spectra, keeping the buffer."""
+        with self._lock:
+            if self._data is not None:
+                self._data[:] = 0
+            self._head = 0
+            self.count = 0
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Generic, Self, TypeVar
+
+from deadsea_optics.instrumentation import instrumentation
+
+__all__ = ["FrameWriter", "WriterStatistics"]
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class WriterStatistics:
+    """Statistics of a `FrameWriter`.
+
+    Attributes:
+        submitted: the number of frames handed to the writer.
+        written: the number of frames written successfully.
+        failed: the number of frames for which writing raised an exception.
+        dropped: the number of frames dropped because the queue was full.
+        pending: the number of frames waiting to be written.
+        max_pending: the highest number of frames waiting at the same time.
+        stalls: the number of times `submit()` had to wait for a full queue.
+        stall_time: the total time spent waiting for a full queue in seconds.
+    """
+
+    submitted: int
+    written: int
+    failed: int
+    dropped: int
+    pending: int
+    max_pending: int
+    stalls: int
+    stall_time: float
+
+
+class FrameWriter(Generic[T]):
+    """Persist frames on a pool of background threads.
+
+    Frames are handed over through a bounded queue, so the acquisition loop
+    does not have to wait for the disk. Only when the queue is full, because
+    writing is slower than acquiring for a prolonged time, `submit()` either
+    waits for a free slot or drops the frame. Both are counted, see
+    `statistics()`, so backpressure can be reported.
+
+    Frames are written in parallel, so they may be written out of order. The
+    write function should not depend on the order of the frames and should not
+    modify shared state.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[T], None],
+        workers: int = 2,
+        max_pending: int = 256,
+        drop_when_full: bool = False,
+    ) -> None:
+        """Start the writer threads.
+
+        Args:
+            write: the function which persists a single frame.
+            workers: the number of writer threads.
+            max_pending: the maximum number of frames waiting to be written.
+            drop_when_full: if True, drop frames when the queue is full instead
+                of waiting for a free slot.
+        """
+        self._write = write
+        self._drop_when_full = drop_when_full
+        self._queue: queue.Queue[T | None] = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._submitted = self._written = self._failed = self._dropped = 0
+        self._max_pending = self._stalls = 0
+        self._stall_time = 0.0
+        self.last_exception: Exception | None = None
+        self._threads = [
+            threading.Thread(target=self._run, name=f"writer-{idx}", daemon=True)
+            for idx in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, frame: T) -> bool:
+        """Queue a frame for writing.
+
+        Args:
+            frame: the frame. It should not be modified after submitting it.
+
+        Returns:
+            True if the frame was queued, False if it was dropped.
+        """
+        with self._lock:
+            self._submitted += 1
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            if self._drop_when_full:
+                with self._lock:
+                    self._dropped += 1
+                return False
+            # wait without holding the lock, so the statistics stay available
+            t0 = time.monotonic()
+            self._queue.put(frame)
+            with self._lock:
+                self._stalls += 1
+                self._stall_time += time.monotonic() - t0
+        with self._lock:
+            self._max_pending = max(self._max_pending, self._queue.qsize())
+        return True
+
+    def _run(self) -> None:
+        while (frame := self._queue.get()) is not None:
+            timer = instrumentation.start()
+            try:
+                self._write(frame)
+            except Exception as exc:  # noqa: BLE001 (failures are counted and kept)
+                with self._lock:
+                    self._failed += 1
+                    self.last_exception = exc
+            else:
+                if timer is not None:
+                    timer.mark("writer.write")
+                with self._lock:
+                    self._written += 1
+
+    def statistics(self) -> WriterStatistics:
+        """Return the statistics of the writer."""
+        with self._lock:
+            return WriterStatistics(
+                submitted=self._submitted,
+                written=self._written,
+                failed=self._failed,
+                dropped=self._dropped,
+                pending=self._queue.qsize(),
+                max_pending=self._max_pending,
+                stalls=self._stalls,
+                stall_time=self._stall_time,
+            )
+
+    def close(self) -> None:
+        """Write all pending frames and stop the writer threads."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
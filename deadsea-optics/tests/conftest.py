@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def configuration_cache_dir(tmp_path_factory, monkeypatch):
+    """Cache device configurations in a temporary directory."""
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("DEADSEA_OPTICS_CACHE_DIR", str(path))
+    return path
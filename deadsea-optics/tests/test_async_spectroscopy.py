@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from deadsea_optics.async_spectroscopy import AsyncSpectroscopyExperiment
+from deadsea_optics.spectroscopy import SpectroscopyExperiment
+
+
+class FakeDevice:
+    has_overflow = False
+
+    def __init__(self):
+        self.threads = set()
+
+    def get_spectrum(self):
+        self.threads.add(threading.get_ident())
+        return np.arange(4.0), np.ones(4)
+
+
+def make_experiment():
+    experiment = SpectroscopyExperiment.__new__(SpectroscopyExperiment)
+    experiment.device = FakeDevice()
+    return experiment
+
+
+def test_get_spectrum_runs_on_device_thread():
+    async def measure(experiment):
+        async with experiment:
+            return await asyncio.gather(*[experiment.get_spectrum() for _ in range(10)])
+
+    experiment = make_experiment()
+    spectra = asyncio.run(measure(AsyncSpectroscopyExperiment(experiment)))
+    assert len(spectra) == 10
+    assert len(experiment.device.threads) == 1
+    assert threading.get_ident() not in experiment.device.threads
+
+
+def test_integrate_spectrum():
+    async def integrate(experiment):
+        async with experiment:
+            return [y async for _, y in experiment.integrate_spectrum(5)]
+
+    spectra = asyncio.run(integrate(AsyncSpectroscopyExperiment(make_experiment())))
+    assert [y[0] for y in spectra] == [1, 2, 3, 4, 5]
+
+
+def test_continuous_spectra():
+    async def stream(experiment):
+        async with experiment:
+            spectra = []
+            async for spectrum in experiment:
+                spectra.append(spectrum)
+                if len(spectra) == 3:
+                    break
+            return spectra
+
+    assert len(asyncio.run(stream(AsyncSpectroscopyExperiment(make_experiment())))) == 3
@@ -0,0 +1,82 @@
+import csv
+import sys
+
+import numpy as np
+from typer.testing import CliRunner
+
+from deadsea_optics.cli import app
+
+runner = CliRunner()
+
+
+def test_series_csv(tmp_path):
+    path = tmp_path / "series.csv"
+    result = runner.invoke(
+        app,
+        ["--simulate", "series", str(path), "-c", "2", "-t", "1000", "-t", "2000"],
+    )
+    assert result.exit_code == 0, result.output
+
+    with path.open() as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:4] == ["Index", "Timestamp", "Integration time (us)", "Overflow"]
+    assert [row[0] for row in rows[1:]] == ["0", "1", "2", "3"]
+    assert [row[2] for row in rows[1:]] == ["1000", "1000", "2000", "2000"]
+    assert len({len(row) for row in rows}) == 1
+
+
+def test_series_npz(tmp_path):
+    path = tmp_path / "series.npz"
+    result = runner.invoke(app, ["--simulate", "series", str(path), "-c", "3"])
+    assert result.exit_code == 0, result.output
+
+    data = np.load(path)
+    assert data["intensities"].shape == (3, len(data["wavelengths"]))
+    np.testing.assert_array_equal(data["index"], [0, 1, 2])
+
+
+def test_spectrum_output(tmp_path):
+    path = tmp_path / "spectrum.csv"
+    result = runner.invoke(app, ["--simulate", "spectrum", "-q", "-o", str(path)])
+    assert result.exit_code == 0, result.output
+    assert np.loadtxt(path, delimiter=",", skiprows=1).shape == (2028, 2)
+
+    result = runner.invoke(app, ["--simulate", "spectrum", "-q", "-o", "data.xlsx"])
+    assert result.exit_code != 0
+    assert not (tmp_path / "data.xlsx").exists()
+
+
+def test_spectrum_stdout():
+    result = runner.invoke(app, ["--simulate", "spectrum", "-q", "-o", "-"])
+    assert result.exit_code == 0, result.output
+    lines = result.stdout.splitlines()
+    assert lines[0] == "Wavelength (nm),Intensity"
+    assert len(lines) == 2029
+
+
+def test_series_other_extension(tmp_path):
+    """Spectra are written as CSV unless the extension selects another format."""
+    path = tmp_path / "series.txt"
+    result = runner.invoke(app, ["--simulate", "series", str(path), "-c", "2"])
+    assert result.exit_code == 0, result.output
+    with path.open() as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == "Index"
+    assert len(rows) == 3
+
+
+def test_series_checks_format_before_measuring(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    path = tmp_path / "series.parquet"
+    result = runner.invoke(app, ["--simulate", "series", str(path)])
+    assert result.exit_code != 0
+    assert "pyarrow" in result.output
+    assert not list(tmp_path.iterdir())
+
+
+def test_series_requires_a_spectrum(tmp_path):
+    path = tmp_path / "series.csv"
+    result = runner.invoke(app, ["--simulate", "series", str(path), "-c", "0"])
+    assert result.exit_code != 0
+    assert "successfully" not in result.output
+    assert not path.exists()
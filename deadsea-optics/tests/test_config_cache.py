@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from deadsea_optics.simulation import SimulatedSpectrometer, simulate
+from deadsea_optics.usb2000 import OceanOpticsUSB2000
+from deadsea_optics.usb2000plus import OceanOpticsUSB2000Plus
+
+
+class CountingSpectrometer(SimulatedSpectrometer):
+    """Simulated device which counts configuration queries."""
+
+    queries = 0
+
+    def write(self, endpoint, data, timeout=None):
+        if bytes(data[:1]) == b"\x05":
+            self.queries += 1
+        return super().write(endpoint, data, timeout)
+
+
+def count_queries(simulated, open_device):
+    simulated.queries = 0
+    device = open_device()
+    return simulated.queries, device
+
+
+@pytest.mark.parametrize(
+    "model, device_class",
+    [("USB2000+", OceanOpticsUSB2000Plus), ("USB2000", OceanOpticsUSB2000)],
+)
+def test_cached_configuration(model, device_class, configuration_cache_dir):
+    simulated = CountingSpectrometer(model, noise=0, realtime=False)
+    with simulate(simulated):
+        uncached, queried = count_queries(
+            simulated, lambda: device_class(use_cache=False)
+        )
+        cached, device = count_queries(simulated, device_class)
+
+    assert uncached > 10
+    assert cached == 1
+    assert device._config == queried._config
+    assert isinstance(device._config.saturation_level, np.uint16)
+    assert len(list(configuration_cache_dir.iterdir())) == 1
+
+
+def test_cache_is_keyed_by_firmware():
+    simulated = CountingSpectrometer(noise=0, realtime=False)
+    with simulate(simulated):
+        uncached, _ = count_queries(simulated, OceanOpticsUSB2000Plus)
+        simulated.bcdDevice = 0x0200
+        assert count_queries(simulated, OceanOpticsUSB2000Plus)[0] == uncached
+        assert count_queries(simulated, OceanOpticsUSB2000Plus)[0] == 1
+
+
+def test_invalid_cache_is_ignored(configuration_cache_dir):
+    simulated = CountingSpectrometer(noise=0, realtime=False)
+    with simulate(simulated):
+        uncached, _ = count_queries(simulated, OceanOpticsUSB2000Plus)
+        for path in configuration_cache_dir.iterdir():
+            path.write_text("{not json")
+        queries, device = count_queries(simulated, OceanOpticsUSB2000Plus)
+        assert queries == uncached
+        assert count_queries(simulated, OceanOpticsUSB2000Plus)[0] == 1
+    assert device._config.serial_number == "SIM00001"
+
+
+def test_update_configuration(configuration_cache_dir):
+    simulated = CountingSpectrometer(noise=0, realtime=False)
+    with simulate(simulated):
+        device = OceanOpticsUSB2000Plus(use_cache=False)
+        saturation_level = simulated.saturation_level
+        simulated.saturation_level = saturation_level // 2
+
+        # a cache hit keeps the cached configuration
+        simulated.queries = 0
+        device.update_configuration(use_cache=True)
+        assert simulated.queries == 1
+        assert device._config.saturation_level == saturation_level
+
+        # refreshing queries the device and updates the cache and calibration
+        simulated.queries = 0
+        device.update_configuration()
+        assert simulated.queries > 10
+        assert device._config.saturation_level == saturation_level // 2
+        _, intensities = device.calibrate(np.full(2048, 100, dtype=np.uint16))
+        np.testing.assert_allclose(intensities, 100 * 65535 / (saturation_level // 2))
+        cached = count_queries(simulated, OceanOpticsUSB2000Plus)[1]
+        assert cached._config == device._config
+
+        # without a cached configuration, it is queried
+        for path in configuration_cache_dir.iterdir():
+            path.unlink()
+        simulated.queries = 0
+        device.update_configuration(use_cache=True)
+        assert simulated.queries > 10
+        assert len(list(configuration_cache_dir.iterdir())) == 1
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from deadsea_optics.cube import SpectralCube, SpectralCubeWriter
+
+
+@pytest.fixture
+def spectra():
+    return np.random.default_rng(0).integers(0, 4096, size=(100, 32), dtype=np.uint16)
+
+
+def test_write_and_read(tmp_path, spectra):
+    path = tmp_path / "spectra.h5"
+    wavelengths = np.linspace(340, 1020, 32)
+    with SpectralCubeWriter(path, wavelengths, scale=2.0, chunk_frames=16) as writer:
+        for idx, spectrum in enumerate(spectra):
+            writer.append(spectrum, idx + 1, 1000.0 + idx, 5000, overflow=idx == 3)
+        assert len(writer) == 100
+
+    with SpectralCube(path) as cube:
+        assert len(cube) == 100
+        np.testing.assert_array_equal(cube.wavelengths, wavelengths)
+        np.testing.assert_array_equal(cube[10:20], spectra[10:20])
+        np.testing.assert_array_equal(cube.intensities(5), spectra[5] * 2.0)
+        np.testing.assert_array_equal(cube.indexes, np.arange(1, 101))
+        assert cube.metadata["overflow"].sum() == 1
+        assert cube.metadata["integration_time"][0] == 5000
+
+
+def test_append_to_existing_file(tmp_path, spectra):
+    path = tmp_path / "spectra.h5"
+    wavelengths = np.arange(32.0)
+    with SpectralCubeWriter(path, wavelengths) as writer:
+        for idx, spectrum in enumerate(spectra[:30]):
+            writer.append(spectrum, idx, 0.0, 1000)
+    with SpectralCubeWriter(path, wavelengths, append=True) as writer:
+        for idx, spectrum in enumerate(spectra[30:], start=30):
+            writer.append(spectrum, idx, 0.0, 1000)
+
+    with SpectralCube(path) as cube:
+        np.testing.assert_array_equal(cube[:], spectra)
+
+    with pytest.raises(ValueError):
+        SpectralCubeWriter(path, np.arange(16.0), append=True)
@@ -0,0 +1,120 @@
+import sys
+
+import numpy as np
+import pytest
+
+from deadsea_optics import export
+
+wavelengths = np.linspace(340.0, 1020.0, 5)
+intensities = np.array([1.5, 2.25, 1e-3, 4096.0, 0.0])
+
+
+def test_save_spectrum_csv(tmp_path):
+    path = tmp_path / "spectrum.csv"
+    export.save_spectrum(path, wavelengths, intensities)
+    lines = path.read_text().splitlines()
+    assert lines[0] == "Wavelength (nm),Intensity"
+    data = np.loadtxt(path, delimiter=",", skiprows=1)
+    np.testing.assert_array_equal(data, np.column_stack([wavelengths, intensities]))
+
+
+@pytest.mark.parametrize("suffix", [".npy", ".npz"])
+def test_save_spectrum_numpy(tmp_path, suffix):
+    path = tmp_path / f"spectrum{suffix}"
+    export.save_spectrum(path, wavelengths, intensities)
+    data = np.load(path)
+    if suffix == ".npy":
+        np.testing.assert_array_equal(data, [wavelengths, intensities])
+    else:
+        np.testing.assert_array_equal(data["wavelengths"], wavelengths)
+        np.testing.assert_array_equal(data["intensities"], intensities)
+
+
+def test_save_series(tmp_path):
+    spectra = np.stack([intensities, 2 * intensities, 3 * intensities])
+    metadata = {
+        "index": [0, 1, 2],
+        "timestamps": [1.5, 2.5, 3.5],
+        "integration_times": [1000, 1000, 2000],
+        "overflow": [False, True, False],
+    }
+
+    export.save_series(tmp_path / "series.csv", wavelengths, spectra, **metadata)
+    data = np.loadtxt(tmp_path / "series.csv", delimiter=",", skiprows=1)
+    np.testing.assert_array_equal(data[:, 0], metadata["index"])
+    np.testing.assert_array_equal(data[:, 2], metadata["integration_times"])
+    np.testing.assert_array_equal(data[:, 3], metadata["overflow"])
+    np.testing.assert_array_equal(data[:, 4:], spectra)
+
+    export.save_series(tmp_path / "series.npz", wavelengths, spectra, **metadata)
+    archive = np.load(tmp_path / "series.npz")
+    np.testing.assert_array_equal(archive["intensities"], spectra)
+    np.testing.assert_array_equal(archive["timestamps"], metadata["timestamps"])
+
+    export.save_series(tmp_path / "series.npy", wavelengths, spectra)
+    np.testing.assert_array_equal(
+        np.load(tmp_path / "series.npy"), np.vstack([wavelengths, spectra])
+    )
+
+
+def test_save_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    export.save_spectrum(tmp_path / "spectrum.parquet", wavelengths, intensities)
+    table = pq.read_table(tmp_path / "spectrum.parquet")
+    assert table.column_names == ["Wavelength (nm)", "Intensity"]
+    np.testing.assert_array_equal(table["Intensity"].to_numpy(), intensities)
+
+
+def test_save_parquet_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        export.save_spectrum(tmp_path / "spectrum.parquet", wavelengths, intensities)
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported file format"):
+        export.save_spectrum(tmp_path / "spectrum.xlsx", wavelengths, intensities)
+
+
+def write_series(path, count=3):
+    writer = export.SeriesWriter(path, wavelengths, scale=1.0)
+    try:
+        for idx in range(count):
+            raw = np.full(len(wavelengths), idx, dtype=np.uint16)
+            writer.append(idx, 1.5 + idx, 1000, raw, idx * intensities, False)
+    finally:
+        writer.close()
+
+
+def test_series_writer_export(tmp_path):
+    path = tmp_path / "series.npz"
+    write_series(path)
+    archive = np.load(path)
+    np.testing.assert_array_equal(archive["index"], [0, 1, 2])
+    np.testing.assert_array_equal(archive["intensities"][2], 2 * intensities)
+    # the CSV file which was written while measuring is removed
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_series_writer_keeps_csv_if_export_fails(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(export, "save_series", fail)
+    path = tmp_path / "series.npy"
+    with pytest.raises(OSError, match="disk full"):
+        write_series(path)
+    assert not path.exists()
+    data = np.loadtxt(tmp_path / "series.npy.csv", delimiter=",", skiprows=1)
+    np.testing.assert_array_equal(data[:, 0], [0, 1, 2])
+    np.testing.assert_array_equal(data[:, 4:], np.outer([0, 1, 2], intensities))
+
+
+def test_series_writer_cube(tmp_path):
+    from deadsea_optics.cube import SpectralCube
+
+    path = tmp_path / "series.H5"
+    write_series(path)
+    with SpectralCube(path) as cube:
+        assert len(cube) == 3
+    assert list(tmp_path.iterdir()) == [path]
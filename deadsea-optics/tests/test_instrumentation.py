@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from deadsea_optics.instrumentation import Instrumentation, LatencyHistogram
+from deadsea_optics.simulation import SimulatedSpectrometer, simulate
+from deadsea_optics.usb2000plus import OceanOpticsUSB2000Plus
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    durations = np.random.default_rng(0).uniform(1e-3, 2e-3, size=1000)
+    for duration in durations:
+        histogram.record(duration)
+    assert histogram.count == 1000
+    assert histogram.max == durations.max()
+    assert histogram.percentile(50) == pytest.approx(np.median(durations), rel=0.2)
+    assert histogram.percentile(99) <= durations.max()
+
+
+def test_disabled_by_default():
+    instrumentation = Instrumentation()
+    assert instrumentation.start() is None
+    instrumentation.enable()
+    timer = instrumentation.start()
+    assert timer is not None
+    timer.mark("first")
+    timer.mark("second")
+    assert [stage.stage for stage in instrumentation.statistics()] == [
+        "first",
+        "second",
+    ]
+    assert instrumentation.statistics(reset=True)[0].count == 1
+    assert instrumentation.statistics() == []
+
+
+@pytest.mark.parametrize("bulk_read", [False, True])
+def test_device_stages(monkeypatch, bulk_read):
+    instrumentation = Instrumentation()
+    instrumentation.enable()
+    monkeypatch.setattr("deadsea_optics.usb2000plus.instrumentation", instrumentation)
+    with simulate(SimulatedSpectrometer(realtime=False)):
+        device = OceanOpticsUSB2000Plus(bulk_read=bulk_read)
+        device.get_spectrum()
+    stages = {stage.stage for stage in instrumentation.statistics()}
+    if bulk_read:
+        assert stages == {"usb.write", "usb.transfer", "calibrate"}
+    else:
+        assert stages == {
+            "usb.write",
+            "usb.first_packet",
+            "usb.read",
+            "decode",
+            "calibrate",
+        }
@@ -0,0 +1,44 @@
+import threading
+
+from deadsea_optics.mailbox import Mailbox
+
+
+def test_mailbox_keeps_latest_value():
+    mailbox: Mailbox[int] = Mailbox()
+    assert mailbox.take() is None
+    assert mailbox.post(1)
+    assert not mailbox.post(2)
+    assert not mailbox.post(3)
+    assert mailbox.take() == 3
+    assert mailbox.take() is None
+    assert mailbox.post(4)
+    assert (mailbox.posted, mailbox.skipped) == (4, 2)
+
+    mailbox.reset()
+    assert mailbox.take() is None
+    assert (mailbox.posted, mailbox.skipped) == (0, 0)
+
+
+def test_mailbox_between_threads():
+    mailbox: Mailbox[int] = Mailbox()
+    notified = threading.Semaphore(0)
+    count = 10_000
+
+    def produce():
+        for value in range(count):
+            if mailbox.post(value):
+                notified.release()
+        notified.release()
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    taken = []
+    while not taken or taken[-1] != count - 1:
+        notified.acquire()
+        if (value := mailbox.take()) is not None:
+            taken.append(value)
+    thread.join()
+
+    assert taken == sorted(taken)
+    assert mailbox.posted == count
+    assert mailbox.skipped == count - len(taken)
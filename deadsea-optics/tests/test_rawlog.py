@@ -0,0 +1,80 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from deadsea_optics.rawlog import RawLog, RawLogWriter
+from deadsea_optics.spectroscopy import AcquisitionEngine
+
+
+def test_write_and_read(tmp_path):
+    path = tmp_path / "spectra.raw"
+    spectra = np.arange(5 * 16, dtype=np.uint16).reshape(5, 16)
+    with RawLogWriter(
+        path,
+        num_pixels=16,
+        wavelength_coefficients=[300.0, 0.5, 0.0, 0.0],
+        scale=2.0,
+        num_dark_pixels=4,
+    ) as log:
+        for idx, spectrum in enumerate(spectra):
+            log.append(idx, 100.0 + idx, 1000, spectrum, overflow=idx == 3)
+
+    raw_log = RawLog(path)
+    assert len(raw_log) == 5
+    assert isinstance(raw_log.records, np.memmap)
+    np.testing.assert_array_equal(raw_log.pixels(), spectra)
+    np.testing.assert_array_equal(raw_log.pixels(slice(1, 3)), spectra[1:3])
+    assert list(raw_log[2:4]["sequence"]) == [2, 3]
+    assert list(raw_log[:]["flags"]) == [0, 0, 0, 1, 0]
+    np.testing.assert_allclose(raw_log.wavelengths, 300.0 + 0.5 * np.arange(4, 16))
+    np.testing.assert_allclose(raw_log.intensities(1), spectra[1, 4:] * 2.0)
+
+
+def test_incomplete_last_record_is_ignored(tmp_path):
+    path = tmp_path / "spectra.raw"
+    with RawLogWriter(path, num_pixels=8) as log:
+        for idx in range(3):
+            log.append(idx, 0.0, 1000, np.full(8, idx, dtype=np.uint16))
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+    assert len(RawLog(path)) == 2
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / "spectra.raw"
+    path.write_bytes(b"not a log")
+    with pytest.raises(ValueError):
+        RawLog(path)
+
+
+class LoggingDevice:
+    _NUM_PIXELS = 8
+    _config = SimpleNamespace(saturation_level=100)
+
+    def __init__(self):
+        self.count = 0
+
+    def get_integration_time(self):
+        return 1000
+
+    def get_raw_spectrum(self):
+        self.count += 1
+        time.sleep(0.001)
+        return np.full(self._NUM_PIXELS, self.count, dtype=np.uint16)
+
+
+def test_acquisition_engine_writes_log(tmp_path):
+    path = tmp_path / "spectra.raw"
+    with RawLogWriter(path, num_pixels=8) as log:
+        engine = AcquisitionEngine(LoggingDevice(), log=log, max_frames=120)
+        engine.start()
+        assert engine.wait_for_frame(119, timeout=5)
+        engine.stop()
+
+    raw_log = RawLog(path)
+    assert len(raw_log) == 120
+    assert list(raw_log[:]["sequence"]) == list(range(120))
+    np.testing.assert_array_equal(raw_log.pixels()[:, 0], np.arange(1, 121))
+    assert list(np.flatnonzero(raw_log[:]["flags"])) == list(range(99, 120))
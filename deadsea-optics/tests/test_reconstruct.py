@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+from PIL import Image
+from scipy.io import savemat
+from typer.testing import CliRunner
+
+from deadsea_optics import reconstruct
+from deadsea_optics.cli import app
+from deadsea_optics.cube import SpectralCubeWriter
+from deadsea_optics.rawlog import RawLogWriter
+
+SHIFTS = np.array([(0, 0), (4, 0), (0, -8), (-12, 4), (8, 8), (-4, -16)])
+WAVELENGTHS = np.linspace(400.0, 700.0, 7)
+
+
+def make_scan(directory, shifts=SHIFTS):
+    """Write shifted copies of a random texture and return their spectra."""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 256, size=(64, 96)).astype(np.uint8)
+    for index, (dy, dx) in enumerate(shifts):
+        shifted = np.roll(texture, (dy, dx), axis=(0, 1))
+        Image.fromarray(shifted).save(directory / f"solar_{index}.png")
+    return rng.integers(0, 1000, size=(len(shifts), len(WAVELENGTHS)))
+
+
+def test_find_offsets(tmp_path):
+    make_scan(tmp_path)
+    count = reconstruct.count_images(tmp_path)
+    assert count == len(SHIFTS)
+    reference = reconstruct.read_image(tmp_path / "solar_0.png")
+    offsets = reconstruct.find_offsets(
+        reconstruct.read_images(tmp_path, count), reference
+    )
+    np.testing.assert_allclose(offsets, SHIFTS, atol=1e-3)
+
+
+def test_system_matrix():
+    model = reconstruct.SystemModel(num_pixels=15)
+    offsets = np.array([(0.0, 0.0), (2.5, -1.0), (40.0, 40.0)])
+    matrix = reconstruct.system_matrix(offsets, model)
+    assert matrix.shape == (3, 15**2)
+    row_sums = np.asarray(matrix.sum(axis=1)).ravel()
+    np.testing.assert_allclose(row_sums, [1, 1, 0])
+
+    # the mask of the first frame is centered on the middle of the grid
+    mask = matrix[0].toarray().reshape(15, 15)
+    assert np.unravel_index(np.argmax(mask), mask.shape) == (7, 7)
+    np.testing.assert_allclose(mask, mask.T)
+
+    # compare with evaluating the mask on the full grid
+    y, x = np.meshgrid(model.coordinates, model.coordinates, indexing="ij")
+    dy, dx = y - 2.5, x + 1.0
+    full = np.exp(-((np.hypot(dx, dy) / model.sigma) ** model.gaussian_order))
+    full *= (np.abs(dx) < model.boxing_width) & (np.abs(dy) < model.boxing_width)
+    np.testing.assert_allclose(matrix[1].toarray().ravel(), full.ravel() / full.sum())
+
+
+def test_system_matrix_edges():
+    """Masks which are cut off by the edge of the grid are evaluated locally."""
+    model = reconstruct.SystemModel(num_pixels=41, binning=2)
+    offsets = np.array([(-20.0, 0.0), (19.5, 19.5), (-25.3, 3.7), (7.0, -22.9)])
+    matrix = reconstruct.system_matrix(offsets, model)
+    assert matrix.has_sorted_indices
+    y, x = np.meshgrid(model.coordinates, model.coordinates, indexing="ij")
+    for row, (y_offset, x_offset) in enumerate(offsets):
+        dy, dx = y - y_offset, x - x_offset
+        full = np.exp(-((np.hypot(dx, dy) / model.sigma) ** model.gaussian_order))
+        full *= (np.abs(dx) < model.boxing_width) & (np.abs(dy) < model.boxing_width)
+        np.testing.assert_allclose(
+            matrix[row].toarray().ravel(), full.ravel() / full.sum()
+        )
+
+
+@pytest.mark.parametrize("source", ["cube", "mat", "rawlog"])
+def test_load_spectra(tmp_path, source):
+    spectra = np.arange(4 * len(WAVELENGTHS)).reshape(4, -1)
+    if source == "cube":
+        path = tmp_path / "spectra.h5"
+        with SpectralCubeWriter(path, WAVELENGTHS, scale=0.5) as cube:
+            # frames are numbered from 1, frame 3 is missing
+            for index in 4, 1, 2:
+                cube.append(spectra[index - 1], index, 0.0, 1000)
+        expected = 0.5 * spectra
+        expected[2] = 0
+    elif source == "mat":
+        path = tmp_path
+        for index in 1, 2, 4:
+            savemat(
+                path / f"spectrum_{index}.mat",
+                {"wavelength": WAVELENGTHS, "spectrum": spectra[index - 1]},
+            )
+        expected = spectra.copy()
+        expected[2] = 0
+    else:
+        path = tmp_path / "spectra.raw"
+        with RawLogWriter(path, len(WAVELENGTHS) + 2, num_dark_pixels=2) as log:
+            for index in range(3):
+                log.append(index, 0.0, 1000, np.r_[0, 0, spectra[index]])
+        expected = spectra.copy()
+        expected[3] = 0
+
+    wavelengths, ifu = reconstruct.load_spectra(path, 4)
+    assert len(wavelengths) == len(WAVELENGTHS)
+    np.testing.assert_allclose(ifu, expected)
+
+
+def test_reconstruct(tmp_path):
+    spectra = make_scan(tmp_path)
+    with SpectralCubeWriter(tmp_path / "spectra.h5", WAVELENGTHS) as cube:
+        for index, spectrum in enumerate(spectra, start=1):
+            cube.append(spectrum, index, 0.0, 1000)
+
+    model = reconstruct.SystemModel(num_pixels=31)
+    result = reconstruct.reconstruct(tmp_path, model=model)
+    np.testing.assert_allclose(result.offsets, SHIFTS / model.binning, atol=1e-3)
+    assert result.image.shape == (31, 31, len(WAVELENGTHS))
+    expected = result.system_matrix.T @ spectra
+    np.testing.assert_allclose(result.image.reshape(31 * 31, -1), expected)
+
+
+def test_reconstruct_command(tmp_path):
+    spectra = make_scan(tmp_path)
+    for index, spectrum in enumerate(spectra, start=1):
+        savemat(
+            tmp_path / f"spectrum_{index}.mat",
+            {"wavelength": WAVELENGTHS, "spectrum": spectrum},
+        )
+    output = tmp_path / "reconstruction.npz"
+    result = CliRunner().invoke(
+        app,
+        [
+            "reconstruct",
+            str(tmp_path),
+            "-o",
+            str(output),
+            "--num-pixels",
+            "21",
+            "--workers",
+            "2",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    data = np.load(output)
+    assert data["image"].shape == (21, 21, len(WAVELENGTHS))
+    np.testing.assert_allclose(data["offsets"], SHIFTS / 4, atol=1e-3)
+    np.testing.assert_array_equal(data["wavelengths"], WAVELENGTHS)
+
+
+@pytest.mark.parametrize("method", ["tikhonov", "cgls", "tv", "nnls"])
+def test_reconstruct_solvers(tmp_path, method):
+    spectra = make_scan(tmp_path)
+    with SpectralCubeWriter(tmp_path / "spectra.h5", WAVELENGTHS) as cube:
+        for index, spectrum in enumerate(spectra, start=1):
+            cube.append(spectrum, index, 0.0, 1000)
+
+    model = reconstruct.SystemModel(num_pixels=15)
+    result = reconstruct.reconstruct(
+        tmp_path, model=model, method=method, solver_options={"max_iterations": 20}
+    )
+    assert result.image.shape == (15, 15, len(WAVELENGTHS))
+    # the solution explains the spectra better than the initial estimate
+    matrix = result.system_matrix
+    estimate = reconstruct.estimate_image(matrix, spectra, model)
+    assert np.linalg.norm(
+        matrix @ result.image.reshape(15 * 15, -1) - spectra
+    ) < np.linalg.norm(matrix @ estimate.reshape(15 * 15, -1) - spectra)
+
+
+def test_reconstruct_command_solver(tmp_path):
+    spectra = make_scan(tmp_path)
+    with SpectralCubeWriter(tmp_path / "spectra.h5", WAVELENGTHS) as cube:
+        for index, spectrum in enumerate(spectra, start=1):
+            cube.append(spectrum, index, 0.0, 1000)
+    first = tmp_path / "first.npz"
+    args = ["reconstruct", str(tmp_path), "--num-pixels", "15", "-m", "cgls"]
+    result = CliRunner().invoke(app, [*args, "-o", str(first)])
+    assert result.exit_code == 0, result.output
+    assert "iterations" in result.output
+
+    # continue from the previous reconstruction
+    second = tmp_path / "second.npz"
+    result = CliRunner().invoke(
+        app, [*args, "-o", str(second), "--initial", str(first)]
+    )
+    assert result.exit_code == 0, result.output
+    np.testing.assert_allclose(
+        np.load(second)["image"], np.load(first)["image"], rtol=1e-3, atol=1e-6
+    )
+
+    result = CliRunner().invoke(app, [*args[:-1], "lsqr"])
+    assert result.exit_code != 0
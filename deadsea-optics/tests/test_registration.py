@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from deadsea_optics.registration import ImageRegistration
+
+SHIFTS = np.array([(0, 0), (4, 0), (0, -8), (-12, 4), (8, 8), (-4, -16)])
+
+
+def smooth_image(shape=(64, 96), shift=(0.0, 0.0)):
+    """Return a smooth periodic image, shifted by a fraction of a pixel."""
+    y, x = np.meshgrid(
+        np.arange(shape[0]) - shift[0], np.arange(shape[1]) - shift[1], indexing="ij"
+    )
+    return np.exp(
+        -((y - shape[0] / 2) ** 2 + (x - shape[1] / 2) ** 2) / 50
+    ) + 0.5 * np.sin(2 * np.pi * y / shape[0]) * np.cos(4 * np.pi * x / shape[1])
+
+
+@pytest.fixture
+def texture():
+    return np.random.default_rng(0).random((64, 96))
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 8])
+def test_register(texture, batch_size):
+    images = (np.roll(texture, shift, axis=(0, 1)) for shift in SHIFTS)
+    registration = ImageRegistration(texture, subpixel=False, batch_size=batch_size)
+    offsets = registration.register(images)
+    assert offsets.shape == (len(SHIFTS), 2)
+    np.testing.assert_array_equal(offsets, SHIFTS)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_register_parallel(texture, workers):
+    images = [np.roll(texture, shift, axis=(0, 1)) for shift in SHIFTS]
+    registration = ImageRegistration(texture, batch_size=4)
+    offsets = registration.register_parallel(
+        images.__getitem__, len(images), workers=workers
+    )
+    np.testing.assert_array_equal(offsets, registration.register(images))
+    np.testing.assert_allclose(offsets, SHIFTS, atol=1e-3)
+
+
+def test_register_parallel_error(texture):
+    def load(index):
+        if index == 5:
+            raise OSError("Unreadable image")
+        return texture
+
+    registration = ImageRegistration(texture, batch_size=2)
+    with pytest.raises(OSError, match="Unreadable"):
+        registration.register_parallel(load, 8, workers=2)
+
+
+def test_register_roi_and_downsample(texture):
+    # the shifts are multiples of the downsampling factor
+    images = [np.roll(texture, shift, axis=(0, 1)) for shift in SHIFTS]
+    registration = ImageRegistration(
+        texture, roi=(8, 56, 0, 96), downsample=4, subpixel=False
+    )
+    assert registration.shape == (12, 24)
+    np.testing.assert_array_equal(registration.register(images), SHIFTS)
+
+
+def test_register_subpixel():
+    reference = smooth_image()
+    shifts = [(0.3, -0.25), (2.5, 1.2), (-3.6, 0.0)]
+    images = [smooth_image(shift=shift) for shift in shifts]
+    offsets = ImageRegistration(reference).register(images)
+    np.testing.assert_allclose(offsets, shifts, atol=0.15)
+    integer = ImageRegistration(reference, subpixel=False).register(images)
+    assert np.all(np.abs(offsets - shifts) <= np.abs(integer - shifts))
+
+
+def test_register_empty(texture):
+    assert ImageRegistration(texture).register([]).shape == (0, 2)
+
+
+def test_invalid_images(texture):
+    with pytest.raises(ValueError):
+        ImageRegistration(texture, downsample=0)
+    with pytest.raises(ValueError):
+        ImageRegistration(texture, roi=(0, 2, 0, 96))
+    with pytest.raises(ValueError):
+        ImageRegistration(texture).register([texture[:32]])
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import usb.core
+
+from deadsea_optics.simulation import SimulatedSpectrometer, simulate
+from deadsea_optics.usb2000 import OceanOpticsUSB2000
+from deadsea_optics.usb2000plus import (
+    DeviceNotFoundError,
+    OceanOpticsUSB2000Plus,
+    SpectrumTimeOutError,
+)
+
+
+@pytest.mark.parametrize("bulk_read", [False, True])
+@pytest.mark.parametrize(
+    "model, device_class, num_pixels",
+    [("USB2000+", OceanOpticsUSB2000Plus, 2048), ("USB2000", OceanOpticsUSB2000, 2047)],
+)
+def test_device_classes(model, device_class, num_pixels, bulk_read):
+    simulated = SimulatedSpectrometer(model, noise=0, realtime=False)
+    with simulate(simulated):
+        device = device_class(bulk_read=bulk_read)
+        device.set_integration_time(50_000)
+        raw = device.get_raw_spectrum()
+
+    assert simulated.integration_time == 50_000
+    assert device._config.serial_number == "SIM00001"
+    assert device._config.saturation_level == simulated.saturation_level
+    expected = simulated.dark_level + simulated.signal * 0.05
+    np.testing.assert_array_equal(raw, expected.astype(np.uint16)[:num_pixels])
+
+
+def test_usb2000zz():
+    usb2000zz = pytest.importorskip("deadsea_optics.usb2000zz")
+    simulated = SimulatedSpectrometer("USB2000", noise=0, realtime=False)
+    with simulate(simulated):
+        device = usb2000zz.OceanOpticsUSB2000zz()
+        wavelengths, intensities = device.get_spectrum()
+    assert simulated.integration_time == usb2000zz.EXPOSURE_TIME
+    assert len(wavelengths) == len(intensities) == 2027
+
+
+def test_overflow():
+    simulated = SimulatedSpectrometer(realtime=False)
+    with simulate(simulated):
+        device = OceanOpticsUSB2000Plus()
+        device.set_integration_time(10_000_000)
+        device.get_spectrum()
+    assert device.has_overflow
+
+
+def test_calibrate():
+    simulated = SimulatedSpectrometer(noise=0, realtime=False)
+    with simulate(simulated):
+        device = OceanOpticsUSB2000Plus()
+    raw = np.arange(2048, dtype=np.uint16)
+
+    wavelengths, intensities = device.calibrate(raw)
+    assert len(wavelengths) == len(intensities) == 2028
+    c = device._config.wavelength_calibration_coefficients
+    x = np.arange(20, 2048)
+    np.testing.assert_allclose(wavelengths, c[0] + c[1] * x + c[2] * x**2 + c[3] * x**3)
+    np.testing.assert_allclose(intensities, x * 65535 / simulated.saturation_level)
+    assert not device.has_overflow
+
+    # the wavelength axis is computed once and shared between spectra
+    raw[-1] = simulated.saturation_level
+    other_wavelengths, _ = device.calibrate(raw)
+    assert np.shares_memory(wavelengths, other_wavelengths)
+    assert not wavelengths.flags.writeable
+    assert device.has_overflow
+
+
+def test_timeouts():
+    simulated = SimulatedSpectrometer(latency=0.5)
+    with simulate(simulated):
+        device = OceanOpticsUSB2000Plus(bulk_read=True)
+        device.set_integration_time(1_000)
+        with pytest.raises(SpectrumTimeOutError):
+            device.get_raw_spectrum()
+    with pytest.raises(usb.core.USBTimeoutError):
+        simulated.read(0x81, 17, timeout=10)
+
+
+def test_device_not_found():
+    with simulate(SimulatedSpectrometer("USB2000")), pytest.raises(DeviceNotFoundError):
+        OceanOpticsUSB2000Plus()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from deadsea_optics import reconstruct, solvers
+
+MODEL = reconstruct.SystemModel(num_pixels=15, binning=8)
+SHAPE = (MODEL.num_pixels, MODEL.num_pixels)
+
+
+@pytest.fixture
+def problem():
+    """A scan of a disc with two spectra, covering the grid more than once."""
+    rng = np.random.default_rng(0)
+    offsets = rng.uniform(-7, 7, size=(300, 2))
+    matrix = reconstruct.system_matrix(offsets, MODEL)
+    y, x = np.meshgrid(MODEL.coordinates, MODEL.coordinates, indexing="ij")
+    disc = (np.hypot(y, x) < 4).ravel()
+    image = np.column_stack([disc * 2.0, 1 + disc, np.ones_like(disc)]).astype(float)
+    return matrix, image, matrix @ image
+
+
+def test_largest_eigenvalue(problem):
+    matrix, _, _ = problem
+    expected = np.linalg.norm(matrix.toarray(), 2) ** 2
+    assert solvers.largest_eigenvalue(matrix) == pytest.approx(expected, rel=1e-4)
+
+
+def test_tikhonov(problem):
+    matrix, _, ifu = problem
+    dense = matrix.toarray()
+    damping = 1e-2 * solvers.largest_eigenvalue(matrix)
+    expected = np.linalg.solve(
+        dense.T @ dense + damping * np.eye(dense.shape[1]), dense.T @ ifu
+    )
+    solution = solvers.tikhonov(matrix, ifu, regularization=1e-2)
+    np.testing.assert_allclose(solution.x, expected, atol=1e-8)
+    # the frames x frames factorization gives the same solution
+    solution = solvers.tikhonov(matrix[:100], ifu[:100], regularization=1e-2)
+    damping = 1e-2 * solvers.largest_eigenvalue(matrix[:100])
+    expected = dense[:100].T @ np.linalg.solve(
+        dense[:100] @ dense[:100].T + damping * np.eye(100), ifu[:100]
+    )
+    np.testing.assert_allclose(solution.x, expected, atol=1e-8)
+    with pytest.raises(ValueError):
+        solvers.tikhonov(matrix, ifu, regularization=0)
+
+
+def test_cgls(problem):
+    matrix, _, ifu = problem
+    expected = solvers.tikhonov(matrix, ifu, regularization=1e-2).x
+    solution = solvers.cgls(
+        matrix, ifu, regularization=1e-2, tol=1e-10, max_iterations=500
+    )
+    np.testing.assert_allclose(solution.x, expected, atol=1e-6)
+    # starting from the solution, there is nothing left to do
+    warm = solvers.cgls(matrix, ifu, regularization=1e-2, x0=solution.x, tol=1e-6)
+    assert warm.iterations == 0
+
+
+def test_tv(problem):
+    matrix, image, ifu = problem
+    noisy = ifu + np.random.default_rng(1).normal(0, 0.01, size=ifu.shape)
+    solution = solvers.tv(matrix, noisy, SHAPE, regularization=1e-3)
+    tikhonov = solvers.tikhonov(matrix, noisy, regularization=1e-3)
+    assert np.linalg.norm(solution.x - image) < np.linalg.norm(tikhonov.x - image)
+
+
+def test_gradient_adjoint():
+    rng = np.random.default_rng(0)
+    x = rng.random((15 * 15, 3))
+    g_y, g_x = rng.random((2, 15 * 15, 3))
+    d_y, d_x = solvers._gradient(x, SHAPE)
+    np.testing.assert_allclose(
+        np.sum(d_y * g_y + d_x * g_x), np.sum(x * solvers._divergence(g_y, g_x, SHAPE))
+    )
+
+
+def test_nnls(problem):
+    matrix, _, ifu = problem
+    solution = solvers.nnls(matrix, ifu, max_iterations=2000, tol=1e-8)
+    assert solution.x.min() >= 0
+    np.testing.assert_allclose(matrix @ solution.x, ifu, atol=1e-2)
+
+
+@pytest.mark.parametrize("method", list(solvers.METHODS))
+def test_solve_blocks(problem, method):
+    matrix, image, ifu = problem
+    whole = solvers.solve(method, matrix, ifu, SHAPE, x0=image)
+    blocks = solvers.solve(method, matrix, ifu, SHAPE, block_size=2, x0=image)
+    np.testing.assert_allclose(blocks.x, whole.x, atol=1e-10)
+
+
+@pytest.mark.parametrize("method", list(solvers.METHODS))
+def test_solve_blocks_share_setup(problem, method, monkeypatch):
+    """The eigenvalue and factorization are computed once for all blocks."""
+    matrix, _, ifu = problem
+    calls = {"largest_eigenvalue": 0, "cho_factor": 0}
+
+    def counting(name, function):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(
+        solvers,
+        "largest_eigenvalue",
+        counting("largest_eigenvalue", solvers.largest_eigenvalue),
+    )
+    monkeypatch.setattr(
+        solvers.scipy.linalg,
+        "cho_factor",
+        counting("cho_factor", solvers.scipy.linalg.cho_factor),
+    )
+    solvers.solve(method, matrix, ifu, SHAPE, block_size=1)
+    assert calls["largest_eigenvalue"] == 1
+    assert calls["cho_factor"] == (method == "tikhonov")
+
+
+def test_solve_unknown_method(problem):
+    matrix, _, ifu = problem
+    with pytest.raises(ValueError, match="Unknown solver"):
+        solvers.solve("lsqr", matrix, ifu, SHAPE)
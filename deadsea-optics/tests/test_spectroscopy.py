@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+import pytest
+
+from deadsea_optics.spectroscopy import (
+    AcquisitionEngine,
+    SpectrumAccumulator,
+    SpectrumRingBuffer,
+)
+
+
+def test_accumulator_sum_and_mean():
+    spectra = np.random.default_rng(0).normal(100, 5, size=(50, 16))
+    accumulator = SpectrumAccumulator()
+    for spectrum in spectra:
+        accumulator.add(spectrum)
+    assert accumulator.count == 50
+    np.testing.assert_allclose(accumulator.sum, spectra.sum(axis=0))
+    np.testing.assert_allclose(accumulator.mean, spectra.mean(axis=0))
+
+
+def test_accumulator_variance():
+    spectra = np.random.default_rng(1).normal(1e4, 3, size=(200, 16))
+    accumulator = SpectrumAccumulator(track_variance=True)
+    for spectrum in spectra:
+        accumulator.add(spectrum)
+    np.testing.assert_allclose(accumulator.variance, spectra.var(axis=0, ddof=1))
+
+
+def test_accumulator_without_variance():
+    accumulator = SpectrumAccumulator()
+    accumulator.add(np.ones(4, dtype=np.uint16))
+    with pytest.raises(ValueError):
+        _ = accumulator.variance
+
+
+def test_ring_buffer_latest_and_read():
+    buffer = SpectrumRingBuffer(capacity=4, num_pixels=3)
+    assert buffer.latest() is None
+    for idx in range(6):
+        buffer.write(np.full(3, idx, dtype=np.uint16), timestamp=float(idx))
+
+    frame = buffer.latest()
+    assert frame is not None
+    assert frame.sequence == 5
+    assert np.shares_memory(frame.data, buffer.frames)
+
+    # sequence 0 and 1 were overwritten, 2 to 4 are at the end of the buffer
+    block = buffer.read(0)
+    assert block.start == 2
+    assert list(block.sequences) == [2, 3, 4]
+    block = buffer.read(5)
+    assert list(block.sequences) == [5]
+    assert list(block.data[:, 0]) == [5]
+    assert len(buffer.read(6)) == 0
+
+
+def test_ring_buffer_read_excludes_slot_being_written():
+    buffer = SpectrumRingBuffer(capacity=4, num_pixels=3)
+    for idx in range(8):
+        buffer.write(np.full(3, idx, dtype=np.uint16), timestamp=float(idx))
+    # the writer has started writing sequence 8, but has not published it yet
+    buffer.sequences[8 % (buffer.capacity + 1)] = -1
+
+    sequences = []
+    start = 0
+    while len(block := buffer.read(start)):
+        sequences.extend(block.sequences)
+        start = block.start + len(block)
+    assert sequences == [4, 5, 6, 7]
+
+
+class CountingDevice:
+    _NUM_PIXELS = 8
+
+    def __init__(self):
+        self.count = 0
+
+    def get_raw_spectrum(self):
+        self.count += 1
+        time.sleep(0.001)
+        return np.full(self._NUM_PIXELS, self.count, dtype=np.uint16)
+
+
+def test_acquisition_engine():
+    engine = AcquisitionEngine(CountingDevice(), capacity=1000)
+    engine.start()
+    try:
+        assert engine.wait_for_frame(9, timeout=5)
+    finally:
+        engine.stop()
+
+    frame = engine.latest()
+    assert frame is not None
+    assert frame.sequence == engine.frames_acquired - 1
+    drained = 0
+    while len(block := engine.drain()):
+        drained += len(block)
+    assert drained == engine.frames_acquired
+    assert engine.dropped_frames == 0
+
+
+def test_acquisition_engine_counts_dropped_frames():
+    engine = AcquisitionEngine(CountingDevice(), capacity=4)
+    engine.start()
+    try:
+        assert engine.wait_for_frame(9, timeout=5)
+    finally:
+        engine.stop()
+
+    drained = 0
+    while len(block := engine.drain()):
+        drained += len(block)
+    assert drained == 4
+    assert engine.dropped_frames == engine.frames_acquired - 4
+
+
+class FailingDevice(CountingDevice):
+    def get_raw_spectrum(self):
+        if self.count == 3:
+            raise OSError("device disconnected")
+        return super().get_raw_spectrum()
+
+
+def test_acquisition_engine_raises_reader_error():
+    engine = AcquisitionEngine(FailingDevice(), capacity=16)
+    engine.start()
+    with pytest.raises(OSError, match="disconnected"):
+        engine.wait_for_frame(3, timeout=5)
+    engine.stop()
+
+    drained = 0
+    while len(block := engine.drain()):
+        drained += len(block)
+    assert drained == 3
+
+
+def test_acquisition_engine_drain_raises_reader_error():
+    engine = AcquisitionEngine(FailingDevice(), capacity=16)
+    engine.start()
+    with pytest.raises(OSError):
+        while True:
+            engine.drain()
+    assert engine.frames_acquired == 3
+    engine.stop()
+
+
+def test_acquisition_engine_stop_raises_reader_error():
+    engine = AcquisitionEngine(FailingDevice(), capacity=16)
+    engine.start()
+    deadline = time.monotonic() + 5
+    while engine.error is None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    with pytest.raises(OSError):
+        engine.stop()
+    # the error is only raised once
+    assert len(engine.drain()) == 3
+    assert len(engine.drain()) == 0
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+import pytest
+
+# Packages which take long to import and are only needed by some commands
+HEAVY_MODULES = ["PySide6", "pyqtgraph", "matplotlib", "plotext", "h5py", "scipy"]
+
+
+def imported_modules(module: str) -> set[str]:
+    """Import a module in a fresh interpreter and return all imported modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines look like 'import time:  self [us] | cumulative | imported package'
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+@pytest.mark.parametrize("module", ["deadsea_optics", "deadsea_optics.cli"])
+def test_no_heavy_imports(module):
+    modules = imported_modules(module)
+    assert module in modules
+    for heavy_module in HEAVY_MODULES:
+        assert heavy_module not in modules
@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import pytest
+
+from deadsea_optics.trigger import TriggerClient, TriggerServer
+
+
+@pytest.fixture
+def server():
+    with TriggerServer("127.0.0.1", 0) as server:
+        stop = threading.Event()
+
+        def acquisition_loop():
+            index = 0
+            while not stop.is_set():
+                request = server.get_request(timeout=0.01)
+                if request is None:
+                    continue
+                if request.command == "SET_INTTIME":
+                    request.reply(f"OK SET_INTTIME {request.argument}")
+                else:
+                    index = (
+                        request.argument if request.argument is not None else index + 1
+                    )
+                    request.acknowledge(index, 1234.5)
+
+        thread = threading.Thread(target=acquisition_loop)
+        thread.start()
+        yield server
+        stop.set()
+        thread.join()
+
+
+def test_pipelined_triggers(server):
+    with TriggerClient(*server.address) as client:
+        client.ping()
+        for index in range(10, 20):
+            client.send_trigger(index)
+        assert [client.read_ack() for _ in range(10)] == [
+            (index, 1234.5) for index in range(10, 20)
+        ]
+        assert client.trigger() == (20, 1234.5)
+        client.set_integration_time(5000)
+
+
+def test_invalid_command(server):
+    with TriggerClient(*server.address) as client:
+        client.send("FOO")
+        with pytest.raises(RuntimeError):
+            client.read_reply()
+
+
+def test_legacy_trigger(server):
+    with socket.create_connection(server.address) as s:
+        s.sendall(b"TRIGGER")
+        s.shutdown(socket.SHUT_WR)
+        assert s.makefile("rb").readline() == b"ACK 1 1234.500000\n"
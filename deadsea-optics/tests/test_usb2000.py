@@ -0,0 +1,29 @@
+import numpy as np
+
+from deadsea_optics.usb2000 import NUM_PIXELS, PACKET_SIZE, deinterleave_packets
+
+
+def make_packets(pixels: np.ndarray) -> bytes:
+    """Interleave pixel values into LSB/MSB packets like the USB2000 does."""
+    lsb = (pixels & 0xFF).astype(np.uint8).reshape(-1, PACKET_SIZE)
+    msb = (pixels >> 8).astype(np.uint8).reshape(-1, PACKET_SIZE)
+    return np.stack([lsb, msb], axis=1).tobytes()
+
+
+def test_deinterleave_packets():
+    pixels = np.arange(NUM_PIXELS, dtype=np.uint16) * 31
+    assert np.array_equal(deinterleave_packets(make_packets(pixels)), pixels)
+
+
+def test_deinterleave_packets_into_buffer():
+    pixels = np.arange(NUM_PIXELS, dtype=np.uint16)
+    out = np.zeros(NUM_PIXELS, dtype="<u2")
+    decoded = deinterleave_packets(make_packets(pixels), out=out)
+    assert np.shares_memory(decoded, out)
+    assert np.array_equal(out, pixels)
+
+
+def test_deinterleave_packets_ignores_incomplete_pair():
+    pixels = np.arange(2 * PACKET_SIZE, dtype=np.uint16)
+    data = make_packets(pixels) + bytes(PACKET_SIZE)
+    assert np.array_equal(deinterleave_packets(data), pixels)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from deadsea_optics.waterfall import WaterfallBuffer
+
+
+def test_waterfall_order():
+    waterfall = WaterfallBuffer(rows=3)
+    assert waterfall.view() is None
+
+    waterfall.append(np.array([1.0, 1.0]))
+    np.testing.assert_array_equal(waterfall.view()[:, 0], [0, 0, 1])
+    for value in range(2, 6):
+        waterfall.append(np.full(2, value))
+    history = waterfall.view()
+    np.testing.assert_array_equal(history[:, 0], [3, 4, 5])
+    assert history.flags.c_contiguous
+    assert waterfall.count == 3
+
+
+def test_waterfall_view_is_not_a_copy():
+    waterfall = WaterfallBuffer(rows=100)
+    for value in range(250):
+        waterfall.append(np.full(4, value))
+    assert np.shares_memory(waterfall.view(), waterfall.view())
+    np.testing.assert_array_equal(waterfall.view()[:, 0], np.arange(150, 250))
+
+
+def test_waterfall_clear_and_size_mismatch():
+    waterfall = WaterfallBuffer(rows=2)
+    waterfall.append(np.ones(3))
+    with pytest.raises(ValueError):
+        waterfall.append(np.ones(4))
+    waterfall.clear()
+    assert waterfall.count == 0
+    np.testing.assert_array_equal(waterfall.view(), 0)
@@ -0,0 +1,40 @@
+import threading
+
+from deadsea_optics.writer import FrameWriter
+
+
+def test_all_frames_are_written():
+    written = []
+    with FrameWriter(written.append, workers=3) as writer:
+        for frame in range(100):
+            assert writer.submit(frame)
+    assert sorted(written) == list(range(100))
+    stats = writer.statistics()
+    assert stats.written == stats.submitted == 100
+    assert stats.pending == 0
+
+
+def test_backpressure_is_reported():
+    release = threading.Event()
+
+    def slow_write(frame):
+        release.wait()
+
+    writer = FrameWriter(slow_write, workers=1, max_pending=2, drop_when_full=True)
+    results = [writer.submit(frame) for frame in range(10)]
+    release.set()
+    writer.close()
+    stats = writer.statistics()
+    assert not all(results)
+    assert stats.dropped == results.count(False)
+    assert stats.written == results.count(True)
+
+
+def test_failures_are_counted():
+    def failing_write(frame):
+        raise OSError("disk full")
+
+    with FrameWriter(failing_write) as writer:
+        writer.submit(1)
+    assert writer.statistics().failed == 1
+    assert isinstance(writer.last_exception, OSError)